@@ -1,15 +1,114 @@
 import os
 
-# Paths to the data files
-INDEX_FILE_PATH = os.path.join('app', 'data', 'final_index.faiss')
-ID_MAP_FILE_PATH = os.path.join('app', 'data', 'final_id_map.json')
-ASR_BACKUP_FILE_PATH = os.path.join('app', 'data', 'asr_backup.json')
-OCR_BACKUP_FILE_PATH = os.path.join('app', 'data', 'ocr_backup_merge.json')
-OBJECT_BACKUP_FILE_PATH = os.path.join('app', 'data', 'object_backup_merge.json')
-CLIENT_SECRETS = os.path.join('app', 'data', 'client_secrets.json')
-META_DATA = os.path.join('app', 'data', 'metadata')
-CREDENTIALS_PATH = os.path.join('app', 'data', 'credentials.json')
-FILE_LIST = os.path.join('app', 'data', 'file_list.json')
-FILE_VIDEO_LIST = os.path.join('app', 'data', 'file_video_list.json')
-FILE_FPS_LIST = os.path.join('app', 'data', 'file_fps_list.json')
-FILE_NAME_FRAME = os.path.join('app', 'data', 'file_name_frame.json')
\ No newline at end of file
+# Paths to the data files; AIC_DATA_DIR points the service at another data directory (e.g. a benchmark corpus)
+DATA_DIR = os.environ.get('AIC_DATA_DIR', os.path.join('app', 'data'))
+INDEX_FILE_PATH = os.path.join(DATA_DIR, 'final_index.faiss')
+ID_MAP_FILE_PATH = os.path.join(DATA_DIR, 'final_id_map.json')
+ASR_BACKUP_FILE_PATH = os.path.join(DATA_DIR, 'asr_backup.json')
+OCR_BACKUP_FILE_PATH = os.path.join(DATA_DIR, 'ocr_backup_merge.json')
+OBJECT_BACKUP_FILE_PATH = os.path.join(DATA_DIR, 'object_backup_merge.json')
+CLIENT_SECRETS = os.path.join(DATA_DIR, 'client_secrets.json')
+META_DATA = os.path.join(DATA_DIR, 'metadata')
+META_DATA_SNAPSHOT = os.path.join(DATA_DIR, 'metadata_snapshot.npz')  # Compiled columnar copy of META_DATA
+META_DATA_CHECK_INTERVAL = 5.0  # Seconds between checks of META_DATA for changes
+CREDENTIALS_PATH = os.path.join(DATA_DIR, 'credentials.json')
+FILE_LIST = os.path.join(DATA_DIR, 'file_list.json')
+FILE_VIDEO_LIST = os.path.join(DATA_DIR, 'file_video_list.json')
+FILE_FPS_LIST = os.path.join(DATA_DIR, 'file_fps_list.json')
+FILE_NAME_FRAME = os.path.join(DATA_DIR, 'file_name_frame.json')
+
+# Elasticsearch
+ES_HOST = os.environ.get('AIC_ES_HOST', 'http://localhost:9200')
+ES_MAX_CONNECTIONS = 32  # Size of the async client's connection pool
+ES_REQUEST_TIMEOUT = 10.0  # Seconds
+ES_HEALTH_INTERVAL = 5.0  # Seconds between background pings
+ES_HEALTH_TIMEOUT = 1.0  # Seconds a ping may take before Elasticsearch counts as down
+ES_FAILURE_THRESHOLD = 3  # Consecutive connection errors that open the circuit breaker
+ES_RESET_TIMEOUT = 10.0  # Seconds the breaker stays open before a probe request is let through
+OCR_INDEX = 'ocr'
+ASR_INDEX = 'asr'
+OBJECT_INDEX = 'object_detection'
+FRAME_KEY_FIELD = 'frame_key'  # Keyword field '{video_id}_{frame_id}', added by `python -m app.services.es_maintenance`
+OBJECT_FILTER_MODE = 'terms'  # 'terms': separate frame/video id lists; 'frame_key': exact CLIP (video, frame) pairs, once the field is found mapped at startup
+OBJECT_FILTER_BATCH_SIZE = 1000  # CLIP candidates per Elasticsearch request in 'frame_key' mode
+
+# Offline fuzzy search in the backup files, used when Elasticsearch is unavailable.
+# 'scorer' is any rapidfuzz.fuzz scorer name; entries scoring below 'threshold' (0-100) are dropped.
+BACKUP_SEARCH = {
+    'ocr': {'path': OCR_BACKUP_FILE_PATH, 'field': 'text', 'scorer': 'partial_ratio', 'threshold': 70},
+    'asr': {'path': ASR_BACKUP_FILE_PATH, 'field': 'text', 'scorer': 'partial_ratio', 'threshold': 70},
+}
+BACKUP_SEARCH_LIMIT = 300  # Best-scoring backup entries returned per query
+BACKUP_SEARCH_WORKERS = os.cpu_count() or 1  # Threads scoring chunks of backup lines in parallel
+BACKUP_SEARCH_MIN_CHUNK = 20000  # Fewest lines per chunk; smaller corpora are scored in one call
+
+# Local full-text engine for OCR/ASR when Elasticsearch is unavailable: 'bm25' (inverted index
+# over the backup files, persisted next to them) or 'fuzzy' (BACKUP_SEARCH scan)
+LOCAL_TEXT_ENGINE = 'bm25'
+TEXT_INDEXES = {
+    'ocr': {'path': OCR_BACKUP_FILE_PATH, 'field': 'text', 'snapshot': os.path.join(DATA_DIR, 'ocr_bm25.npz')},
+    'asr': {'path': ASR_BACKUP_FILE_PATH, 'field': 'text', 'snapshot': os.path.join(DATA_DIR, 'asr_bm25.npz')},
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# ASR segment -> keyframe alignment: 'after' (first keyframe after start_frame), 'before' or 'nearest'
+ASR_ALIGNMENT_MODE = 'after'
+
+# Server-side fusion of /app/search results (fusion='rrf' or 'score')
+FUSION_WEIGHTS = {'clip': 1.0, 'image': 1.0, 'ocr': 0.7, 'asr': 0.5, 'object': 0.5}
+FUSION_RRF_K = 60  # Reciprocal rank fusion constant: a hit at rank r adds weight / (k + r)
+FUSION_WINDOW_SECONDS = 2.0  # OCR/ASR hits also vote for keyframes of the same video this close in time
+FUSION_TOP_K = 500  # Length of the fused list
+DEFAULT_FPS = 25.0  # Used when a video has no fps in file_fps_list.json
+
+# Depth and paging of /app/search
+FAISS_TOP_K = 400  # Keyframes fetched per CLIP/image query
+TEXT_SEARCH_SIZE = 300  # Hits fetched per OCR/ASR/object query (Elasticsearch or local index)
+RESULT_CACHE_SIZE = 256  # Full ranked result sets kept for paging
+RESULT_CACHE_TTL = 300.0  # Seconds a cached result set is served before the search is run again
+DEGRADED_RESULT_CACHE_TTL = 3 * ES_RESET_TIMEOUT  # TTL of result sets with a timed-out or fallen-back modality
+MAX_PAGE_SIZE = 500  # Largest accepted `limit`
+STREAM_CHUNK_SIZE = 100  # Results per event of /app/search/stream
+BATCH_SEARCH_MAX_ITEMS = 64  # Searches per /app/search/batch request
+TEMPORAL_TOP_K = 2000  # FAISS candidates per step of /app/search/temporal
+TEMPORAL_MAX_GAP_SECONDS = 20.0  # Default max time between consecutive steps of a temporal search
+TEMPORAL_MAX_STEPS = 8
+TEMPORAL_RESULT_SIZE = 100  # Ranked segments returned by a temporal search
+
+# Concurrency of /app/search
+SEARCH_WORKERS = 4  # Threads for CLIP inference, FAISS and other CPU-bound work
+LOCAL_SEARCH_WORKERS = 2  # Separate threads for the local OCR/ASR/object engines used when Elasticsearch is down
+MODALITY_TIMEOUTS = {  # Seconds
+    'clip': 10.0,
+    'image': 20.0,
+    'ocr': 5.0,
+    'asr': 5.0,
+    'object': 5.0,
+}
+
+# CLIP
+CLIP_MODEL_NAME = 'ViT-B/32'
+EMBEDDING_CACHE_SIZE = 4096  # Text embeddings kept in memory
+EMBEDDING_CACHE_PATH = None  # e.g. os.path.join(DATA_DIR, 'embedding_cache.sqlite3') to persist them
+IMAGE_EMBEDDING_CACHE_SIZE = 1024  # Image query embeddings kept in memory, by content hash and by URL
+IMAGE_URL_CACHE_TTL = 60.0  # Seconds an image URL's embedding is reused before the image is downloaded again
+IMAGE_FETCH_TIMEOUT = 5.0  # Seconds to download a query image
+IMAGE_FETCH_MAX_BYTES = 10 * 2 ** 20  # Larger query images are rejected
+IMAGE_FETCH_MAX_CONNECTIONS = 16  # Pooled connections of the image download client
+INDEX_MMAP = True  # Memory-map the FAISS index so all workers share it through the page cache
+FRAME_VECTORS_PATH = os.path.join(DATA_DIR, 'frame_vectors.npy')  # Optional float32 copy of the index vectors for "more like this frame", memory-mapped; without it vectors are reconstructed from the index
+FAISS_NPROBE = None  # Default IVF lists probed per query (None keeps the index setting)
+FAISS_EF_SEARCH = None  # Default HNSW efSearch (None keeps the index setting)
+GPU_FILTER_OVERSAMPLE = 10  # GPU indexes have no ID selectors: fetch top_k * this, then filter
+
+# Micro-batching of concurrent CLIP encodes and FAISS searches
+BATCHING_ENABLED = True
+BATCH_MAX_SIZE = 32
+BATCH_MAX_WAIT_MS = 5.0
+
+# Query translation
+TRANSLATOR_BACKEND = 'google'  # 'google', 'marian' (offline, needs transformers) or 'identity'
+TRANSLATION_CACHE_PATH = os.path.join(DATA_DIR, 'translation_cache.sqlite3')
+TRANSLATION_CACHE_SIZE = 4096  # Translations kept in memory (all of them stay in TRANSLATION_CACHE_PATH)
+TRANSLATION_TIMEOUT = 2.0  # Seconds to wait for the translator before using the original query
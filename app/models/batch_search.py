@@ -0,0 +1,24 @@
+from datetime import date
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from app.config import ASR_ALIGNMENT_MODE
+
+
+class BatchSearchItem(BaseModel):
+    """One search of /app/search/batch: the parameters of /app/search, with an optional page size."""
+    queries: Dict[str, Optional[str]]
+    operator: Optional[str] = "gte"
+    value: Optional[int] = 1
+    publish_day: Optional[int] = None
+    publish_month: Optional[int] = None
+    publish_year: Optional[int] = None
+    publish_date_from: Optional[date] = None
+    publish_date_to: Optional[date] = None
+    object_as_filter: Optional[bool] = False
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    asr_alignment: str = ASR_ALIGNMENT_MODE
+    fusion: Optional[str] = None
+    limit: Optional[int] = None
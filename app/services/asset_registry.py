@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import FILE_LIST, FILE_VIDEO_LIST, FILE_FPS_LIST, FILE_NAME_FRAME, OBJECT_BACKUP_FILE_PATH
+from app.services.keyframe_index import KeyframeIndex
+from app.services.object_index import ObjectIndex
+
+BASE_IMAGE_URL = "https://drive.google.com/thumbnail?export=view&sz=w160-h160&id="
+BASE_VIDEO_URL = "https://drive.google.com/file/d/"
+
+
+def load_json_file(file_path: str) -> List[Dict]:
+    """Load data from a JSON file and return it as a list of dictionaries."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Error loading JSON file {file_path}: {e}")
+        return []
+
+
+def title_map(items: List[Dict], value_key: str = 'id') -> Dict[str, Any]:
+    """Build a {title: value} dictionary from a Drive file listing."""
+    return {
+        item['title']: item[value_key]
+        for item in items
+        if item.get('title') and item.get(value_key) is not None
+    }
+
+
+class PathLookup:
+    """
+    Image/video URLs and fps, keyed by image file name and video id.
+
+    Image URLs are formatted on lookup from the shared {file name: Drive id} dictionary;
+    the per-video URLs and fps are precomputed.
+    """
+
+    def __init__(self, file_list: Dict[str, str], file_video_list: Dict[str, str], file_fps_list: Dict[str, float]):
+        self.file_ids = file_list
+        self.videos: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+        for video_name in set(file_video_list) | set(file_fps_list):
+            video_file_id = file_video_list.get(video_name)
+            video_path = f"{BASE_VIDEO_URL}{video_file_id}/preview" if video_file_id else None
+            self.videos[os.path.splitext(video_name)[0]] = (video_path, file_fps_list.get(video_name))
+
+    def image_path(self, image_name: str) -> Optional[str]:
+        """Drive thumbnail URL of an image file name, or None if it is not in the file list."""
+        file_id = self.file_ids.get(image_name)
+        return f"{BASE_IMAGE_URL}{file_id}" if file_id else None
+
+    def construct_paths(self, image_info: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """
+        Look up the image path, video path and FPS of a frame.
+
+        :param image_info: Image information including 'frame_id', 'video_id', and 'video_folder'.
+        :return: A dictionary containing image path, video path, and FPS.
+        """
+        frame_id = image_info.get('frame_id')
+        video_id = image_info.get('video_id')
+        video_folder = image_info.get('video_folder')
+
+        # Keyframe 0 is a real frame: only a missing frame_id counts
+        if frame_id is None or frame_id == '' or not (video_id and video_folder):
+            return {'image_path': None, 'video_path': None, 'fps': None}
+
+        video_path, fps = self.videos.get(video_id, (None, None))
+        return {
+            'image_path': self.image_path(f"{video_id}_{frame_id}.jpg"),
+            'video_path': video_path,
+            'fps': fps,
+        }
+
+
+class AssetRegistry:
+    """
+    Process-wide cache of the JSON assets under app/data.
+
+    Every asset remembers the mtimes of the files it was built from and is rebuilt
+    only when one of them changes on disk. Only the built asset is kept, not the
+    parsed source files.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._assets: Dict[str, Tuple[Tuple[Optional[int], ...], Any]] = {}
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def derived(self, name: str, paths: Sequence[str], build: Callable[..., Any], load: bool = True) -> Any:
+        """
+        Return asset `name`, calling build(*json_contents) if any source file changed.
+
+        With `load` False, build() takes no arguments and gets what it needs from other
+        assets; `paths` then only decide when it is rebuilt.
+        """
+        mtimes = tuple(self._mtime(path) for path in paths)
+        cached = self._assets.get(name)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+        with self._lock:
+            cached = self._assets.get(name)
+            if cached is not None and cached[0] == mtimes:
+                return cached[1]
+            value = build(*(load_json_file(path) for path in paths)) if load else build()
+            self._assets[name] = (mtimes, value)
+            return value
+
+    def file_dict(self) -> Dict[str, str]:
+        return self.derived('file_dict', (FILE_LIST,), title_map)
+
+    def video_dict(self) -> Dict[str, str]:
+        return self.derived('video_dict', (FILE_VIDEO_LIST,), title_map)
+
+    def fps_dict(self) -> Dict[str, float]:
+        return self.derived('fps_dict', (FILE_FPS_LIST,), lambda items: title_map(items, 'fps'))
+
+    def keyframe_index(self) -> KeyframeIndex:
+        return self.derived('keyframe_index', (FILE_NAME_FRAME,), KeyframeIndex.from_frames)
+
+    def object_index(self) -> ObjectIndex:
+        return self.derived('object_index', (OBJECT_BACKUP_FILE_PATH,), ObjectIndex.from_entries)
+
+    def path_lookup(self) -> PathLookup:
+        # Shares file_dict instead of holding a second copy of the file list
+        return self.derived(
+            'path_lookup', (FILE_LIST, FILE_VIDEO_LIST, FILE_FPS_LIST),
+            lambda: PathLookup(self.file_dict(), self.video_dict(), self.fps_dict()), load=False
+        )
+
+    def construct_paths(self, image_info: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        return self.path_lookup().construct_paths(image_info)
+
+
+asset_registry = AssetRegistry()
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from rapidfuzz import fuzz, process  # type: ignore
+
+from app.config import BACKUP_SEARCH, BACKUP_SEARCH_LIMIT, BACKUP_SEARCH_MIN_CHUNK, BACKUP_SEARCH_WORKERS
+from app.services.asset_registry import asset_registry
+
+# rapidfuzz only parallelizes cdist across query rows and a search has one query, so the lines
+# are split into chunks scored on this pool instead; cdist releases the GIL while it runs
+_scoring_pool = ThreadPoolExecutor(max_workers=BACKUP_SEARCH_WORKERS, thread_name_prefix='backup-scoring')
+
+
+class BackupCorpus:
+    """
+    Text lines of a backup JSON file, lowercased and flattened once.
+
+    `line_starts[i]` is the first line of `entry_rows[i]`; entries without text are
+    left out, so per-entry scores are one np.maximum.reduceat over the line scores.
+    """
+
+    def __init__(self, entries: List[Dict], lines: List[str], entry_rows: np.ndarray, line_starts: np.ndarray):
+        self.entries = entries
+        self.lines = lines
+        self.entry_rows = entry_rows
+        self.line_starts = line_starts
+
+    @classmethod
+    def from_entries(cls, entries: List[Dict], field: str) -> 'BackupCorpus':
+        lines, entry_rows, line_starts = [], [], []
+        for row, entry in enumerate(entries):
+            texts = entry.get(field, [])
+            if isinstance(texts, str):
+                texts = [texts]
+            texts = [text.lower() for text in texts if isinstance(text, str)] if isinstance(texts, list) else []
+            if texts:
+                entry_rows.append(row)
+                line_starts.append(len(lines))
+                lines.extend(texts)
+        return cls(entries, lines, np.array(entry_rows, dtype=np.int64), np.array(line_starts, dtype=np.int64))
+
+    def search(self, query: str, scorer: str = 'partial_ratio', threshold: float = 70,
+               limit: int = BACKUP_SEARCH_LIMIT) -> List[Dict]:
+        """
+        The `limit` best entries whose best line scores at least `threshold`, best first.
+
+        Lines are scored with rapidfuzz.process.cdist, in chunks on BACKUP_SEARCH_WORKERS
+        threads; every returned entry is a copy of the backup entry with its 'score' added.
+        """
+        if not self.lines or limit <= 0:
+            return []
+        line_scores = self.score_lines(query.lower(), getattr(fuzz, scorer), threshold)
+        scores = np.maximum.reduceat(line_scores, self.line_starts)
+        matched = np.flatnonzero(scores >= threshold) if threshold > 0 else np.flatnonzero(scores > 0)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        # Best score first; ties keep the order of the backup file
+        matched = matched[np.lexsort((matched, -scores[matched]))]
+        return [
+            {**self.entries[row], 'score': float(score)}
+            for row, score in zip(self.entry_rows[matched].tolist(), scores[matched].tolist())
+        ]
+
+
+    def score_lines(self, query: str, scorer: Any, threshold: float) -> np.ndarray:
+        """Score of every line against `query` (0 below `threshold`)."""
+        chunk = max(BACKUP_SEARCH_MIN_CHUNK, -(-len(self.lines) // BACKUP_SEARCH_WORKERS))
+
+        def score(start: int) -> np.ndarray:
+            return process.cdist([query], self.lines[start:start + chunk], scorer=scorer,
+                                 score_cutoff=threshold, dtype=np.float32, workers=1)[0]
+
+        if len(self.lines) <= chunk:
+            return score(0)
+        return np.concatenate(list(_scoring_pool.map(score, range(0, len(self.lines), chunk))))
+
+
+def backup_corpus(path: str, field: str) -> BackupCorpus:
+    """Corpus of one backup file, rebuilt when the file changes."""
+    return asset_registry.derived(
+        f'backup_corpus:{path}:{field}', (path,), lambda entries: BackupCorpus.from_entries(entries, field)
+    )
+
+
+def search_backup(query: str, modality: str, limit: Optional[int] = None, **overrides: Any) -> List[Dict]:
+    """Fuzzy search in the backup of `modality` with its BACKUP_SEARCH settings (overridable per call)."""
+    settings = {**BACKUP_SEARCH[modality], **overrides}
+    corpus = backup_corpus(settings['path'], settings['field'])
+    return corpus.search(query, settings['scorer'], settings['threshold'],
+                         BACKUP_SEARCH_LIMIT if limit is None else limit)
@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+
+
+class MicroBatcher:
+    """
+    Collect concurrent single-item calls into one batched call.
+
+    Callers block in `__call__` while a worker thread waits up to `max_wait_ms` for
+    up to `max_batch_size` items, runs `batch_fn` once on all of them and hands each
+    caller its own result. `batch_fn` must return one result per input, in order.
+    Items whose caller cancelled its future before the batch ran are dropped.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = 'batcher', enabled: bool = True):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.enabled = enabled and max_batch_size > 1
+        self.batches = 0
+        self.items = 0
+        self._queue: 'queue.Queue[tuple]' = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def __call__(self, item: Any) -> Any:
+        if not self.enabled:
+            return self.batch_fn([item])[0]
+        return self.submit(item).result()
+
+    def submit(self, item: Any) -> Future:
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> List[tuple]:
+        batch = []
+        self._accept(batch, self._queue.get())
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._accept(batch, self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _accept(batch: List[tuple], entry: tuple) -> None:
+        # False when the caller already cancelled (e.g. its request timed out): skip the item
+        if entry[1].set_running_or_notify_cancel():
+            batch.append(entry)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                batch = self._collect()
+                if batch:
+                    self._run_batch(batch)
+            except Exception as e:
+                # The worker serves every later caller, so nothing may end it
+                print(f"{self.name} worker error: {e!r}")
+
+    def _run_batch(self, batch: List[tuple]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = self.batch_fn(items)
+        except Exception as e:
+            if len(batch) == 1:
+                self._settle(batch[0][1], exception=e)
+            else:
+                # Retry one item at a time so only the items that fail get the exception
+                self._run_each(batch)
+            return
+        self.batches += 1
+        self.items += len(items)
+        for (_, future), result in zip(batch, results):
+            self._settle(future, result)
+
+    def _run_each(self, batch: List[tuple]) -> None:
+        for item, future in batch:
+            try:
+                result = self.batch_fn([item])[0]
+            except Exception as e:
+                self._settle(future, exception=e)
+                continue
+            self.batches += 1
+            self.items += 1
+            self._settle(future, result)
+
+    @staticmethod
+    def _settle(future: Future, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+        }
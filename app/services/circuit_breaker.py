@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from elasticsearch import exceptions
+
+from app.config import ES_FAILURE_THRESHOLD, ES_RESET_TIMEOUT
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker around a remote dependency.
+
+    After `failure_threshold` consecutive failures (or an explicit `trip`) the breaker
+    opens and `allow_request` returns False, so callers go straight to their fallback.
+    Once `reset_timeout` seconds have passed a single probe is let through (half-open);
+    its success closes the breaker again, its failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.short_circuited = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and (self.probe_started is None or now - self.probe_started >= self.reset_timeout):
+                self.probe_started = now  # This caller is the probe; a lost probe is replaced after reset_timeout
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"Circuit '{self.name}' closed")
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = self.probe_started = None
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = None if error is None else str(error)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._open()
+
+    def trip(self, reason: Optional[str] = None) -> None:
+        """Open the breaker immediately, e.g. when a health check fails."""
+        with self._lock:
+            self.failures += 1
+            self.last_error = reason
+            if self.state != OPEN:
+                self._open()
+
+    def _open(self) -> None:
+        if self.state != OPEN:
+            print(f"Circuit '{self.name}' opened: {self.last_error}")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probe_started = None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self.state,
+                'failures': self.failures,
+                'open_for_seconds': None if self.opened_at is None else time.monotonic() - self.opened_at,
+                'last_error': self.last_error,
+                'short_circuited': self.short_circuited,
+            }
+
+
+async def run_health_checks(check: Callable[[], Awaitable[bool]], breaker: CircuitBreaker, interval: float) -> None:
+    """Call `check` every `interval` seconds: a failure opens `breaker`, a success closes it."""
+    while True:
+        try:
+            healthy = await check()
+        except Exception as e:
+            healthy = False
+            breaker.last_error = str(e)
+        if healthy:
+            breaker.record_success()
+        elif breaker.state != OPEN:
+            breaker.trip(breaker.last_error or 'health check failed')
+        await asyncio.sleep(interval)
+
+
+es_breaker = CircuitBreaker('elasticsearch', ES_FAILURE_THRESHOLD, ES_RESET_TIMEOUT)
+
+
+async def es_request(make_request: Callable[[], Awaitable[dict]]) -> Optional[dict]:
+    """
+    Run an Elasticsearch request through `es_breaker`.
+
+    Returns None without touching the network while the breaker is open, and None on
+    errors; only connection errors and timeouts count as failures of the breaker.
+    """
+    if not es_breaker.allow_request():
+        return None
+    try:
+        response = await make_request()
+    except exceptions.ConnectionError as e:
+        print(f"Elasticsearch connection error: {e}")
+        es_breaker.record_failure(e)
+        return None
+    except exceptions.TransportError as e:
+        print(f"Elasticsearch error: {e}")
+        es_breaker.record_success()  # Elasticsearch answered, it is reachable
+        return None
+    es_breaker.record_success()
+    return response
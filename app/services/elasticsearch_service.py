@@ -1,231 +1,192 @@
-from typing import List, Dict, Optional
-from elasticsearch import Elasticsearch, exceptions
-import json
-import os
-from rapidfuzz import fuzz  # type: ignore
-from bisect import bisect_right
-from app.config import ASR_BACKUP_FILE_PATH, OCR_BACKUP_FILE_PATH, OBJECT_BACKUP_FILE_PATH, FILE_LIST, FILE_VIDEO_LIST, FILE_FPS_LIST, FILE_NAME_FRAME
-
-def load_json_file(file_path: str) -> List[Dict]:
-    """Tải dữ liệu từ tệp JSON và trả về dưới dạng danh sách các dictionary."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Error loading JSON file {file_path}: {e}")
-        return []
-
-def load_file_dict(file_list_path: str) -> Dict[str, str]:
-    """Tải danh sách file vào dictionary với key là tên file và value là ID."""
-    file_list = load_json_file(file_list_path)
-    return {item.get('title'): item.get('id') for item in file_list if item.get('title') and item.get('id')}
-
-def construct_paths(file_list: Dict[str, str], file_video_list: Dict[str, str], file_fps_list: Dict[str, float], image_info: Dict[str, str]) -> Dict[str, Optional[str]]:
-    """
-    Xây dựng đường dẫn ảnh và video từ thông tin ảnh sử dụng tệp JSON chứa ID và tên tệp.
-    
-    :param file_list: Dictionary chứa ID và tên tệp ảnh.
-    :param file_video_list: Dictionary chứa ID và tên video.
-    :param file_fps_list: Dictionary chứa FPS của video.
-    :param image_info: Thông tin ảnh bao gồm 'frame_id', 'video_id', và 'video_folder'.
-    :return: Một dictionary chứa đường dẫn ảnh, video và FPS.
-    """
-    base_image_url = "https://drive.google.com/thumbnail?export=view&sz=w160-h160&id="
-    base_video_url = "https://drive.google.com/file/d/"
-    
-    frame_id = image_info.get('frame_id')
-    video_id = image_info.get('video_id')
-    video_folder = image_info.get('video_folder')
-    
-    result = {
-        'image_path': None,
-        'video_path': None,
-        'fps': None
-    }
-
-    if frame_id and video_id and video_folder:
-        file_name = f"{video_id}_{frame_id}.jpg"
-        video_name = f"{video_id}.mp4"
-
-        file_id = file_list.get(file_name)
-        video_file_id = file_video_list.get(video_name)
-        fps = file_fps_list.get(video_name)
-        
-        if file_id:
-            result['image_path'] = f"{base_image_url}{file_id}"
-        if video_file_id:
-            result['video_path'] = f"{base_video_url}{video_file_id}/preview"
-        if fps is not None:
-            result['fps'] = fps
-
-    return result
-
-def search_from_elasticsearch(es: Elasticsearch, index_name: str, query: str, field: str) -> List[Dict]:
-    """Tìm kiếm từ Elasticsearch dựa trên trường và truy vấn cụ thể."""
+import asyncio
+from typing import Awaitable, List, Dict, Optional, Set, Tuple
+from elasticsearch import AsyncElasticsearch
+from app.config import ASR_ALIGNMENT_MODE, ASR_INDEX, LOCAL_TEXT_ENGINE, OBJECT_INDEX, OCR_INDEX, TEXT_SEARCH_SIZE
+from app.services.asset_registry import asset_registry
+from app.services.backup_search import search_backup
+from app.services.circuit_breaker import es_request
+from app.services.executor import run_local_search
+from app.services.filter_object_service import object_backup_results, object_conditions
+from app.services.keyframe_index import KeyframeIndex
+from app.services.object_index import ObjectCondition, object_query_clauses
+from app.services.result_sets import with_paths
+from app.services.text_index import search_local
+
+# Các trường _source mà bộ xử lý kết quả của từng modality thực sự dùng
+SOURCE_FIELDS = {
+    'ocr': ['video_name', 'frame', 'text'],
+    'asr': ['video_id', 'video_folder', 'start_frame', 'end_frame', 'fps', 'text'],
+    'object': ['video_id', 'frame_id', 'video_folder', 'labels', 'label_counts'],
+}
+SEARCH_INDEXES = {'ocr': OCR_INDEX, 'asr': ASR_INDEX, 'object': OBJECT_INDEX}
+
+def text_search_body(query: str, field: str = 'text', source: Optional[List[str]] = None) -> Dict:
+    """Truy vấn match trên một trường, chỉ lấy các trường `source` nếu có."""
     search_query = {
         "query": {
             "match": {
                 field: query
             }
         },
-        "size": 300
+        "size": TEXT_SEARCH_SIZE
     }
-    try:
-        response = es.search(index=index_name, body=search_query)
-        return response['hits']['hits']
-    except (exceptions.ConnectionError, exceptions.TransportError) as e:
-        print(f"Elasticsearch connection error: {e}")
-        return []
-
-def search_in_backup(query: str, backup_data: List[Dict], threshold: int = 70, field: str = 'text') -> List[Dict]:
-    """Tìm kiếm trong dữ liệu backup bằng cách sử dụng fuzzy matching."""
-    results = []
-    for entry in backup_data:
-        text_list = entry.get(field, [])
-        if isinstance(text_list, list):
-            for text in text_list:
-                score = fuzz.partial_ratio(query.lower(), text.lower())
-                if score >= threshold:
-                    results.append(entry)
-                    break
-        if len(results) >= 300:
-            break
-    return results
-
-def search_ocr(es: Elasticsearch, index_name: str, query: str) -> List[Dict]:
-    """Tìm kiếm OCR trong Elasticsearch hoặc trong backup nếu không có kết quả từ Elasticsearch."""
-    file_list = load_file_dict(FILE_LIST)
-    file_video_list = load_file_dict(FILE_VIDEO_LIST)
-    file_fps_list = {item['title']: item['fps'] for item in load_json_file(FILE_FPS_LIST)}
-
-    es_results = search_from_elasticsearch(es, index_name, query, 'text')
-    if es_results:
-        for hit in es_results:
-            video_name = hit['_source'].get('video_name', '')
-            video_folder = f"Videos_{video_name.split('_')[0]}"
-            image_info = {
-                'frame_id': hit['_source'].get('frame', ''),
-                'video_id': video_name,
-                'video_folder': video_folder
+    if source is not None:
+        search_query["_source"] = source
+    return search_query
+
+def object_search_body(conditions: List[ObjectCondition], source: Optional[List[str]] = None) -> Dict:
+    """Truy vấn đối tượng: mọi nhãn phải có mặt và thỏa điều kiện số lượng."""
+    must = object_query_clauses(conditions)
+    for condition in conditions:
+        must.append({"bool": {"must": [{"exists": {"field": f"label_counts.{condition.label}"}}]}})
+    search_body = {
+        "query": {
+            "bool": {
+                "must": must
             }
-            hit['_source'].update(construct_paths(file_list, file_video_list, file_fps_list, image_info))
-            hit['_source']['video_folder'] = video_folder  # Thêm trường video_folder vào kết quả
-        return es_results
+        },
+        "size": TEXT_SEARCH_SIZE
+    }
+    if source is not None:
+        search_body["_source"] = source
+    return search_body
 
+async def multi_search(es: AsyncElasticsearch, queries: Dict[str, str], operator: str = 'gte',
+                       value: Optional[int] = None) -> Dict[str, Optional[List[Dict]]]:
+    """
+    Gửi truy vấn của mọi modality Elasticsearch ('ocr', 'asr', 'object') trong một request _msearch.
 
-    backup_data = load_json_file(OCR_BACKUP_FILE_PATH)
-    return search_in_backup(query, backup_data)
+    Trả về danh sách hit của từng modality, hoặc None nếu truy vấn của modality đó lỗi.
+    """
+    return (await multi_search_batch(es, [(queries, operator, value)]))[0]
 
-def find_closest_frame(start_frame: int, frames_data: List[Dict], video_folder: str, video_id: str) -> Optional[Dict]:
+async def multi_search_batch(es: AsyncElasticsearch,
+                             batch: List[Tuple[Dict[str, str], str, Optional[int]]]) -> List[Dict[str, Optional[List[Dict]]]]:
     """
-    Tìm frame gần nhất với start_frame từ danh sách frame dữ liệu sử dụng tìm kiếm nhị phân.
-    
-    :param start_frame: Khung thời gian bắt đầu.
-    :param frames_data: Danh sách các frame để tìm kiếm.
-    :param video_folder: Thư mục video.
-    :param video_id: ID video.
-    :return: Frame gần nhất, hoặc None nếu không tìm thấy.
+    Như multi_search cho nhiều mục (queries, operator, value) cùng lúc: một request _msearch cho tất cả.
+
+    Trả về kết quả của từng mục theo thứ tự.
     """
-    # Lọc danh sách frame cho video_id và video_folder tương ứng
-    filtered_frames = [
-        frame for frame in frames_data
-        if '_'.join(frame.get('video_id').split('_')[:2]) == video_id
-    ]
-    
-    # Nếu không có frame nào khớp
-    if not filtered_frames:
-        return None
-    
-    # Sắp xếp các frame theo frame_id
-    filtered_frames.sort(key=lambda x: int(x.get('frame_id')))
-    
-    # Danh sách các frame_id để dùng cho tìm kiếm nhị phân
-    frame_ids = [int(frame.get('frame_id')) for frame in filtered_frames]
-    
-    # Sử dụng tìm kiếm nhị phân để tìm vị trí đầu tiên có frame_id lớn hơn start_frame
-    pos = bisect_right(frame_ids, start_frame)
-    
-    # Kiểm tra nếu tồn tại frame lớn hơn start_frame
-    if pos < len(frame_ids):  # Frame ngay sau start_frame
-        return filtered_frames[pos]
-    
-    return None
-
-
-def search_asr(es: Elasticsearch, index_name: str, query: str) -> List[Dict]:
-    """Tìm kiếm ASR trong Elasticsearch hoặc trong backup nếu không có kết quả từ Elasticsearch."""
-    file_list = load_file_dict(FILE_LIST)
-    file_video_list = load_file_dict(FILE_VIDEO_LIST)
-    file_fps_list = {item['title']: item['fps'] for item in load_json_file(FILE_FPS_LIST)}
-    frames_data = load_json_file(FILE_NAME_FRAME)
-    # print("frames_data: ", frames_data)
-    es_results = search_from_elasticsearch(es, index_name, query, 'text')
+    body, owners = [], []
+    for item, (queries, operator, value) in enumerate(batch):
+        for modality in queries:
+            if modality == 'object':
+                search_body = object_search_body(object_conditions(queries[modality], operator, value), SOURCE_FIELDS[modality])
+            else:
+                search_body = text_search_body(queries[modality], 'text', SOURCE_FIELDS[modality])
+            body.extend([{"index": SEARCH_INDEXES[modality]}, search_body])
+            owners.append((item, modality))
+    results = [{modality: None for modality in queries} for queries, _, _ in batch]
+    if not owners:
+        return results
+    # Khi circuit breaker đang mở, không gọi Elasticsearch mà chuyển ngay sang chỉ mục cục bộ
+    response = await es_request(lambda: es.msearch(body=body))
+    if response is None:
+        return results
 
-    results = []
+    for (item, modality), response_item in zip(owners, response['responses']):
+        if 'error' in response_item:
+            print(f"Elasticsearch error for {modality}: {response_item['error']}")
+        else:
+            results[item][modality] = response_item['hits']['hits']
+    return results
 
-    if es_results:
-        for hit in es_results:
-            video_name = hit['_source'].get('video_id', '')
-            video_folder = hit['_source'].get('video_folder', '')
-            start_frame = hit['_source'].get('start_frame', '')
-            
-            # Tìm frame gần nhất
-            closest_frame = find_closest_frame(start_frame, frames_data, video_folder, video_name)
-            # print("closest_frame: ",closest_frame)
-            if closest_frame:
-                image_info = {
-                    'start_frame': closest_frame.get('frame_id', ''),
-                    'video_id': video_name,
-                    'video_folder': video_folder,
-                    'end_frame': hit['_source'].get('end_frame', ''),
-                    'fps': hit['_source'].get('fps', ''),
-                    'text': hit['_source'].get('text', '')
-                }
-                # hit['_source'].update(construct_paths(file_list, file_video_list, file_fps_list, image_info))
-                results.append(image_info)
-        return results
+def search_modalities(es: AsyncElasticsearch, queries: Dict[str, str], operator: str = 'gte',
+                      value: Optional[int] = None, alignment: str = ASR_ALIGNMENT_MODE,
+                      enrich: bool = True, degraded: Optional[Set[str]] = None) -> Dict[str, Awaitable[List[Dict]]]:
+    """
+    Tìm kiếm các modality Elasticsearch bằng một lượt _msearch duy nhất.
 
-    backup_data = load_json_file(ASR_BACKUP_FILE_PATH)
-    return search_in_backup(query, backup_data, field='text')
+    Trả về một awaitable cho mỗi modality; chúng dùng chung lượt gọi Elasticsearch nhưng xử lý
+    kết quả (và fallback cục bộ) độc lập, nên mỗi modality vẫn có timeout riêng.
+    Với enrich=False các hit chưa có đường dẫn ảnh/video (xem result_sets.with_paths).
+    Modality nào phải fallback vì Elasticsearch lỗi được thêm vào `degraded`.
+    """
+    round_trip = asyncio.ensure_future(multi_search(es, queries, operator, value))
+
+    async def finish(modality: str) -> List[Dict]:
+        hits = (await asyncio.shield(round_trip))[modality]
+        if hits is None and degraded is not None:
+            degraded.add(modality)
+        return await finish_search(modality, hits, queries[modality], operator, value, alignment, enrich)
+
+    return {modality: finish(modality) for modality in queries}
+
+async def finish_search(modality: str, hits: Optional[List[Dict]], query: str, operator: str = 'gte',
+                        value: Optional[int] = None, alignment: str = ASR_ALIGNMENT_MODE,
+                        enrich: bool = True) -> List[Dict]:
+    """Xử lý các hit Elasticsearch của một modality (None nếu lỗi), kể cả fallback cục bộ."""
+    if modality == 'ocr':
+        return await finish_ocr(hits or [], query, enrich)
+    if modality == 'asr':
+        return await finish_asr(hits or [], query, alignment)
+    return await finish_object(hits, object_conditions(query, operator, value), enrich)
+
+async def finish_ocr(es_results: List[Dict], query: str, enrich: bool = True) -> List[Dict]:
+    """Thêm đường dẫn ảnh/video vào các hit OCR, dùng chỉ mục cục bộ nếu Elasticsearch không có kết quả."""
+    if not es_results:
+        if LOCAL_TEXT_ENGINE != 'bm25':
+            return await run_local_search(search_backup, query, 'ocr')
+        # Chỉ mục BM25 cục bộ trả về hit cùng dạng với Elasticsearch nên xử lý giống hệt bên dưới
+        es_results = await run_local_search(search_local, 'ocr', query, TEXT_SEARCH_SIZE)
+
+    # with_paths cũng thêm trường video_folder vào _source của mỗi hit
+    return with_paths('ocr', es_results) if enrich else es_results
+
+def _frame_number(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
 
-def search_object(es: Elasticsearch, index_name: str, query: str, operator: str, value: int) -> List[Dict]:
-    """Tìm kiếm đối tượng trong Elasticsearch hoặc trong backup nếu không có kết quả từ Elasticsearch."""
-    file_list = load_file_dict(FILE_LIST)
-    file_video_list = load_file_dict(FILE_VIDEO_LIST)
-    file_fps_list = {item['title']: item['fps'] for item in load_json_file(FILE_FPS_LIST)}
 
-    search_body = {
-        "query": {
-            "bool": {
-                "must": [
-                    {"term": {"labels.keyword": query}},
-                    {"bool": {"must": [{"exists": {"field": f"label_counts.{query}"}}]}}
-                ]
-            }
-        },
-        "size": 300
-    }
+def align_asr_hits(es_results: List[Dict], keyframes: KeyframeIndex, mode: str = ASR_ALIGNMENT_MODE) -> List[Dict]:
+    """
+    Gắn mỗi đoạn ASR với keyframe của video tương ứng (mặc định: keyframe đầu tiên sau start_frame).
 
-    # Add the range query only if the value is not None
-    if value is not None:
-        search_body["query"]["bool"]["must"].append({
-            "range": {f"label_counts.{query}": {operator: value}}
+    Toàn bộ các hit được căn chỉnh trong một lần searchsorted trên KeyframeIndex; 'keyframe_span'
+    là keyframe đầu/cuối nằm trong [start_frame, end_frame] của đoạn.
+    """
+    sources = [hit['_source'] for hit in es_results]
+    aligned = keyframes.align(
+        [source.get('video_id', '') for source in sources],
+        [_frame_number(source.get('start_frame')) for source in sources],
+        [_frame_number(source.get('end_frame')) for source in sources],
+        mode=mode,
+    )
+    results = []
+    for hit, source, frame, span_first, span_last, span_count in zip(
+            es_results, sources, aligned['frame'].tolist(), aligned['span_first'].tolist(),
+            aligned['span_last'].tolist(), aligned['span_count'].tolist()):
+        if frame < 0:
+            continue
+        results.append({
+            'start_frame': frame,
+            'video_id': source.get('video_id', ''),
+            'video_folder': source.get('video_folder', ''),
+            'end_frame': source.get('end_frame', ''),
+            'fps': source.get('fps', ''),
+            'text': source.get('text', ''),
+            'keyframe_span': [span_first, span_last] if span_count else None,
+            'score': hit.get('_score'),
         })
+    return results
 
-    try:
-        response = es.search(index=index_name, body=search_body)
-        hits = response['hits']['hits']
-        results = []
-        for hit in hits:
-            image_info = {
-                'frame_id': hit['_source'].get('frame_id', ''),
-                'video_id': hit['_source'].get('video_id', ''),
-                'video_folder': hit['_source'].get('video_folder', '')
-            }
-            hit['_source'].update(construct_paths(file_list, file_video_list, file_fps_list, image_info))
-            results.append(hit['_source'])
-        return results
-    except (exceptions.ConnectionError, exceptions.TransportError) as e:
-        print(f"Elasticsearch connection error: {e}")
-        backup_data = load_json_file(OBJECT_BACKUP_FILE_PATH)
-        return search_in_backup(query, backup_data, threshold=50)
+async def finish_asr(es_results: List[Dict], query: str, alignment: str = ASR_ALIGNMENT_MODE) -> List[Dict]:
+    """Căn chỉnh các hit ASR về keyframe, dùng chỉ mục cục bộ nếu Elasticsearch không có kết quả."""
+    if not es_results:
+        if LOCAL_TEXT_ENGINE != 'bm25':
+            return await run_local_search(search_backup, query, 'asr')
+        es_results = await run_local_search(search_local, 'asr', query, TEXT_SEARCH_SIZE)
+
+    # Việc căn chỉnh frame tốn CPU nên chạy trên thread pool, không chặn event loop
+    return await run_local_search(align_asr_hits, es_results, asset_registry.keyframe_index(), alignment)
+
+async def finish_object(hits: Optional[List[Dict]], conditions: List[ObjectCondition],
+                        enrich: bool = True) -> List[Dict]:
+    """Thêm đường dẫn vào các hit đối tượng; hits=None (Elasticsearch lỗi hoặc breaker mở) chuyển sang chỉ mục đối tượng cục bộ."""
+    if hits is None:
+        rows = await run_local_search(asset_registry.object_index().search, conditions)
+        return await run_local_search(object_backup_results, rows, TEXT_SEARCH_SIZE, enrich)
+    results = [hit['_source'] for hit in hits]
+    return with_paths('object', results) if enrich else results
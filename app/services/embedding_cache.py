@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query the same way the CLIP tokenizer does (case and whitespace)."""
+    return ' '.join(query.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of float32 embeddings with an optional SQLite tier on disk.
+
+    Entries evicted from memory stay on disk, so the persistent tier also survives
+    restarts. `namespace` keeps vectors of different models apart in the same file.
+    With `ttl`, an entry kept in memory expires that many seconds after it was stored.
+    """
+
+    def __init__(self, max_size: int = 4096, persist_path: Optional[str] = None, namespace: str = '',
+                 ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.namespace = namespace
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._db = None
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(embeddings)')]
+            if columns and 'namespace' not in columns:
+                # Older files keyed rows by "namespace:key", where "a:image" + "x" and
+                # "a" + "image:x" collide; they are dropped and rebuilt on demand.
+                self._db.execute('DROP TABLE embeddings')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings '
+                '(namespace TEXT, key TEXT, vector BLOB, PRIMARY KEY (namespace, key))'
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None and self.ttl is not None and self._expires[key] <= time.monotonic():
+                del self._entries[key], self._expires[key]
+                self.expired += 1
+                vector = None
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT vector FROM embeddings WHERE namespace = ? AND key = ?', (self.namespace, key)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        vector = np.ascontiguousarray(vector, dtype=np.float32).ravel()
+        vector.setflags(write=False)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO embeddings (namespace, key, vector) VALUES (?, ?, ?)',
+                    (self.namespace, key, vector.tobytes())
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        if self.ttl is not None:
+            self._expires[key] = time.monotonic() + self.ttl
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._expires.pop(evicted, None)
+
+    def clear(self) -> None:
+        """Forget every entry of this namespace, on disk too; other namespaces in the file are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._expires.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM embeddings WHERE namespace = ?', (self.namespace,))
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'ttl': self.ttl,
+                'persistent': self._db is not None,
+            }
@@ -0,0 +1,59 @@
+"""
+Maintenance tasks for the Elasticsearch indexes.
+
+    python -m app.services.es_maintenance add-frame-keys --index object_detection
+
+add-frame-keys maps FRAME_KEY_FIELD as a keyword and fills it with
+'{video_id}_{frame_id}' on every document, so object_as_filter can look up exact
+CLIP (video, frame) pairs.
+"""
+import argparse
+import time
+from typing import List, Optional
+
+from elasticsearch import Elasticsearch
+
+from app.config import ES_HOST, FRAME_KEY_FIELD, OBJECT_INDEX
+
+# Same format as keyframe_index.frame_key: the frame number is written without padding
+FRAME_KEY_SCRIPT = f"""
+if (ctx._source.video_id != null && ctx._source.frame_id != null) {{
+    ctx._source.{FRAME_KEY_FIELD} = ctx._source.video_id + '_' + Long.parseLong(String.valueOf(ctx._source.frame_id));
+}}
+"""
+
+
+def add_frame_keys(es: Elasticsearch, index: str, only_missing: bool = True, poll_seconds: float = 5.0) -> dict:
+    """Add the frame key field to the mapping of `index` and backfill it with update_by_query."""
+    es.indices.put_mapping(index=index, body={'properties': {FRAME_KEY_FIELD: {'type': 'keyword'}}})
+    query = {'bool': {'must_not': {'exists': {'field': FRAME_KEY_FIELD}}}} if only_missing else {'match_all': {}}
+    task = es.update_by_query(
+        index=index,
+        body={'query': query, 'script': {'source': FRAME_KEY_SCRIPT, 'lang': 'painless'}},
+        conflicts='proceed', wait_for_completion=False, refresh=True,
+    )
+    while True:
+        status = es.tasks.get(task_id=task['task'])
+        progress = status['task']['status']
+        print(f"{index}: {progress.get('updated', 0)} of {progress.get('total', 0)} documents updated")
+        if status.get('completed'):
+            return status.get('response', {})
+        time.sleep(poll_seconds)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=ES_HOST)
+    sub = parser.add_subparsers(dest='command', required=True)
+    frame_keys = sub.add_parser('add-frame-keys', help=f'Backfill the {FRAME_KEY_FIELD} field')
+    frame_keys.add_argument('--index', default=OBJECT_INDEX)
+    frame_keys.add_argument('--all', action='store_true', help='Recompute keys that already exist')
+
+    args = parser.parse_args(argv)
+    es = Elasticsearch([args.host])
+    response = add_frame_keys(es, args.index, only_missing=not args.all)
+    print(f"Done: {response}")
+
+
+if __name__ == '__main__':
+    main()
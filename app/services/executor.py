@@ -0,0 +1,36 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from app.config import LOCAL_SEARCH_WORKERS, SEARCH_WORKERS
+
+# Bounded pool for CLIP inference, FAISS and other CPU-bound work
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix='search')
+# Local full-text/object searches get their own pool: asyncio.wait_for cannot stop a thread, so a
+# slow or timed-out local search must not hold the threads CLIP and FAISS need
+local_search_executor = ThreadPoolExecutor(max_workers=LOCAL_SEARCH_WORKERS, thread_name_prefix='local-search')
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking function on the search thread pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, partial(func, *args, **kwargs))
+
+
+async def run_local_search(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a local OCR/ASR/object search (the Elasticsearch fallbacks) on their own thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(local_search_executor, partial(func, *args, **kwargs))
+
+
+async def run_batched(batcher: Any, item: Any) -> Any:
+    """
+    Hand one item to a MicroBatcher from the event loop and await its result.
+
+    The caller holds no pool thread while the batch fills, so any number of concurrent
+    requests can share a batch. A disabled batcher runs the item on the search pool.
+    """
+    if not batcher.enabled:
+        return await run_blocking(batcher, item)
+    return await asyncio.wrap_future(batcher.submit(item))
@@ -1,18 +1,22 @@
-from typing import List, Dict, Any, Optional
+import hashlib
+from functools import lru_cache
+from typing import List, Dict, Any, NamedTuple, Optional, Set, Tuple
 import torch
 import clip
 import os
 import numpy as np
-import json
 import cv2
 import faiss
-from googletrans import Translator
-from langdetect import detect
-import requests
-from PIL import Image
-from io import BytesIO
 from pydantic import BaseModel
-from app.config import INDEX_FILE_PATH, ID_MAP_FILE_PATH, FILE_LIST, FILE_VIDEO_LIST, FILE_FPS_LIST
+from app.config import INDEX_FILE_PATH, CLIP_MODEL_NAME, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH, IMAGE_EMBEDDING_CACHE_SIZE, IMAGE_URL_CACHE_TTL, BATCHING_ENABLED, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, FAISS_NPROBE, FAISS_EF_SEARCH, FAISS_TOP_K, FRAME_VECTORS_PATH, INDEX_MMAP, GPU_FILTER_OVERSAMPLE
+from app.services.batcher import MicroBatcher
+from app.services.index_store import search_parameters, load_index, reconstruct_row, row_selector
+from app.services.filter_metadata_service import PublishDateFilter, get_metadata_index
+from app.services.embedding_cache import EmbeddingCache, normalize_query
+from app.services.executor import run_batched, run_blocking
+from app.services.frame_catalog import get_frame_catalog
+from app.services.image_fetch import decode_image, image_fetcher
+from app.services import translation
 
 # Kiểm tra xem PyTorch có nhận diện được GPU không
 print("CUDA is available:", torch.cuda.is_available())
@@ -26,15 +30,43 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 device = "cuda" if torch.cuda.is_available() else "cpu"
 print(f"Using device: {device}")
 
-model, preprocess = clip.load("ViT-B/32", device=device)
-translator = Translator()
-index_load = faiss.read_index(INDEX_FILE_PATH)
+model, preprocess = clip.load(CLIP_MODEL_NAME, device=device)
+translator = translation.create_translator()
+# Đọc index bằng mmap để các worker uvicorn dùng chung page cache của hệ điều hành
+index_load, index_stats = load_index(INDEX_FILE_PATH, mmap=INDEX_MMAP)
+cpu_index = index_load  # Bản trên CPU, dùng cho reconstruct kể cả khi tìm kiếm chạy trên GPU
 
 # Nếu GPU có sẵn, chuyển FAISS index sang GPU
-if torch.cuda.is_available():
+use_gpu = torch.cuda.is_available()
+if use_gpu:
     res = faiss.StandardGpuResources()  # Tạo tài nguyên GPU
     index_load = faiss.index_cpu_to_gpu(res, 0, index_load)  # Chuyển index sang GPU
 
+# Tải bản đồ ID và danh sách file một lần duy nhất khi khởi động
+frame_catalog = get_frame_catalog()
+
+def load_frame_vectors(path: Optional[str], ntotal: int) -> Optional[np.ndarray]:
+    """Đọc bản sao vector của index (.npy) bằng mmap; bỏ qua nếu không có hoặc không khớp số dòng của index"""
+    if not path or not os.path.exists(path):
+        return None
+    vectors = np.load(path, mmap_mode='r')
+    if vectors.ndim != 2 or len(vectors) != ntotal:
+        print(f"Ignoring {path}: {vectors.shape} does not match the index ({ntotal} vectors)")
+        return None
+    return vectors
+
+# Vector của các keyframe cho tìm kiếm "giống frame này"; None thì reconstruct trực tiếp từ index
+frame_vectors = load_frame_vectors(FRAME_VECTORS_PATH, index_load.ntotal)
+
+# Cache embedding văn bản theo câu truy vấn đã dịch và chuẩn hóa
+text_embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH, namespace=CLIP_MODEL_NAME)
+# Cache embedding ảnh theo SHA-1 nội dung (ảnh trùng không cần mã hóa lại) và theo URL (không cần tải lại).
+# Nội dung sau một URL có thể đổi nên cache theo URL chỉ giữ trong bộ nhớ, hết hạn sau IMAGE_URL_CACHE_TTL giây
+image_embedding_cache = EmbeddingCache(IMAGE_EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH, namespace=f"{CLIP_MODEL_NAME}:image")
+image_url_cache = EmbeddingCache(IMAGE_EMBEDDING_CACHE_SIZE, namespace=f"{CLIP_MODEL_NAME}:url", ttl=IMAGE_URL_CACHE_TTL)
+# Cạnh ảnh đầu vào của CLIP; ảnh JPEG được giải mã ở độ phân giải nhỏ nhất không dưới cạnh này
+CLIP_INPUT_SIZE = getattr(getattr(model, 'visual', None), 'input_resolution', 224)
+
 class SearchResult(BaseModel):
     frame_id: int
     video_id: str
@@ -43,228 +75,325 @@ class SearchResult(BaseModel):
     video_path: str
     fps: int
 
-def translate_query(query: str) -> str:
-    """Dịch câu truy vấn từ tiếng Việt sang tiếng Anh"""
-    translated_query = translator.translate(query, src='vi', dest='en').text
+def translate_query(query: str, degraded: Optional[Set[str]] = None) -> str:
+    """Dịch câu truy vấn từ tiếng Việt sang tiếng Anh; nếu phải dùng câu gốc thì thêm 'translation' vào degraded"""
+    translated_query, translated = translator.translate_checked(query)
+    if not translated and degraded is not None:
+        degraded.add('translation')
     print(f"Translated query: {translated_query}")
     return translated_query
 
 def detect_language(query: str) -> Optional[str]:
     """Nhận diện ngôn ngữ của câu truy vấn"""
     try:
-        lang = detect(query)
+        lang = translation.detect_language(query)
         print(f"Detected language: {lang}")
         return lang
     except Exception as e:
         print(f"Language detection failed: {e}")
         return None
 
-def process_image(image_path: str) -> torch.Tensor:
-    """Tải và tiền xử lý hình ảnh cho mô hình CLIP, hỗ trợ URL"""
-    
-    if image_path.startswith("http"):
-        # Nếu image_path là URL của Google Drive, chuyển đổi nó thành URL tải về trực tiếp
-        if "drive.google.com" in image_path:
-            file_id = image_path.split("id=")[-1]
-            image_path = f"https://drive.google.com/uc?export=download&id={file_id}"
-            print(f"Download URL: {image_path}")
-        # Tải ảnh về từ URL
-        response = requests.get(image_path)
-        if response.status_code != 200:
-            raise ValueError(f"Unable to download image from {image_path}")
-        image = Image.open(BytesIO(response.content))
-    else:
-        # Nếu image_path là đường dẫn file local
-        image = Image.open(image_path)
+def process_image(data: bytes) -> torch.Tensor:
+    """Giải mã (draft mode, không giải mã ở độ phân giải gốc) và tiền xử lý ảnh cho mô hình CLIP"""
+    image = decode_image(data, CLIP_INPUT_SIZE)
 
     # Tiền xử lý ảnh cho CLIP
     image = preprocess(image).unsqueeze(0).to(device)
     return image
 
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
 
-def search_text(text_query: str, top_k: int = 300) -> List[int]:
-    """Tìm kiếm văn bản, dịch nếu cần thiết và thực hiện tìm kiếm"""
+async def encode_image_bytes(data: bytes) -> np.ndarray:
+    """Mã hóa ảnh bằng CLIP, dùng lại embedding nếu đã gặp ảnh có cùng nội dung (SHA-1)"""
+    cache_key = await run_blocking(content_hash, data)
+    image_features = image_embedding_cache.get(cache_key)
+    if image_features is None:
+        # Giải mã trên thread pool, mã hóa qua micro-batcher mà không giữ thread nào trong lúc chờ lô
+        image_features = await run_batched(image_encoder, await run_blocking(process_image, data))
+        image_embedding_cache.put(cache_key, image_features)
+    return image_features
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def encode_text_batch(queries: List[str]) -> np.ndarray:
+    """Mã hóa một lô câu truy vấn (đã dịch) bằng CLIP trong một lần forward"""
+    # Câu dài hơn 77 token bị cắt bớt thay vì làm lỗi cả lô
+    text = clip.tokenize(queries, truncate=True).to(device)
+    with torch.no_grad():
+        text_features = model.encode_text(text)
+    return text_features.cpu().numpy().astype('float32')
+
+def encode_image_batch(images: List[torch.Tensor]) -> np.ndarray:
+    """Mã hóa một lô ảnh đã tiền xử lý (mỗi ảnh có dạng 1xCxHxW) trong một lần forward"""
+    with torch.no_grad():
+        image_features = model.encode_image(torch.cat(images))
+    return image_features.cpu().numpy().astype('float32')
+
+class FaissQuery(NamedTuple):
+    """Một truy vấn của search_faiss_batch: câu truy vấn đã dịch (text) hoặc vector ảnh (image_features)"""
+    text: Optional[str] = None
+    image_features: Optional[np.ndarray] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    date_filter: Optional[PublishDateFilter] = None
+
+class SearchRequest(NamedTuple):
+    """Một truy vấn FAISS cùng các tham số tìm kiếm riêng (nprobe cho IVF, efSearch cho HNSW, lọc ngày đăng)"""
+    vector: np.ndarray
+    top_k: int
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    date_filter: Optional[PublishDateFilter] = None
+
+def allowed_row_mask(date_filter: PublishDateFilter) -> np.ndarray:
+    """Mặt nạ các dòng FAISS thuộc những video có ngày đăng khớp bộ lọc"""
+    # Khóa cache gồm cả fingerprint metadata và số dòng catalog, nên mặt nạ được tính lại khi chúng đổi
+    return cached_row_mask(date_filter, get_metadata_index().fingerprint, len(frame_catalog))
+
+@lru_cache(maxsize=64)
+def cached_row_mask(date_filter: PublishDateFilter, metadata_fingerprint: str, catalog_rows: int) -> np.ndarray:
+    return frame_catalog.video_row_mask(date_filter.video_ids())
+
+def search_filtered_on_gpu(vectors: np.ndarray, top_k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Index GPU không hỗ trợ IDSelector: lấy nhiều ứng viên hơn rồi lọc theo mặt nạ"""
+    k = min(index_load.ntotal, top_k * GPU_FILTER_OVERSAMPLE)
+    distances, indices = index_load.search(vectors, k)
+    keep = (indices >= 0) & mask[np.clip(indices, 0, len(mask) - 1)]
+    out_distances = np.full((len(vectors), top_k), -np.inf, dtype='float32')
+    out_indices = np.full((len(vectors), top_k), -1, dtype=indices.dtype)
+    for row in range(len(vectors)):
+        kept = np.flatnonzero(keep[row])[:top_k]
+        out_distances[row, :len(kept)] = distances[row, kept]
+        out_indices[row, :len(kept)] = indices[row, kept]
+    return out_distances, out_indices
+
+def search_index_batch(requests: List[SearchRequest]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Tìm kiếm nhiều vector, mỗi nhóm tham số một lần gọi index.search với top_k lớn nhất của nhóm"""
+    groups: Dict[Tuple, List[int]] = {}
+    for i, request in enumerate(requests):
+        groups.setdefault((request.nprobe, request.ef_search, request.date_filter), []).append(i)
+
+    results: List[Tuple[np.ndarray, np.ndarray]] = [None] * len(requests)
+    for (nprobe, ef_search, date_filter), members in groups.items():
+        vectors = np.stack([requests[i].vector for i in members]).astype('float32')
+        top_k = max(requests[i].top_k for i in members)
+        # Chỉ lấy top-k trong các frame có ngày đăng hợp lệ, ngay trong lần tìm kiếm FAISS
+        mask = allowed_row_mask(date_filter) if date_filter is not None else None
+        if mask is not None and not mask.any():
+            distances = np.empty((len(members), 0), dtype='float32')
+            indices = np.empty((len(members), 0), dtype=np.int64)
+        elif use_gpu:
+            if mask is None:
+                distances, indices = index_load.search(vectors, top_k)
+            else:
+                distances, indices = search_filtered_on_gpu(vectors, top_k, mask)
+        else:
+            selector = row_selector(mask) if mask is not None else None
+            params = search_parameters(index_load, nprobe, ef_search, selector)
+            distances, indices = index_load.search(vectors, top_k, params=params)
+        for row, i in enumerate(members):
+            k = requests[i].top_k
+            results[i] = (distances[row, :k], indices[row, :k])
+    return results
+
+# Gom các yêu cầu đồng thời thành lô trong vài mili giây
+text_encoder = MicroBatcher(encode_text_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, 'clip-text', BATCHING_ENABLED)
+image_encoder = MicroBatcher(encode_image_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, 'clip-image', BATCHING_ENABLED)
+index_searcher = MicroBatcher(search_index_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, 'faiss-search', BATCHING_ENABLED)
+
+def prepare_text_query(text_query: str, degraded: Optional[Set[str]] = None) -> str:
+    """Câu truy vấn đưa vào CLIP: dịch sang tiếng Anh nếu là tiếng Việt (xem translate_query về degraded)"""
     lang = detect_language(text_query)
 
     if lang == "vi":
         # Dịch tiếng Việt sang tiếng Anh
-        translated_query = translate_query(text_query)
-    else:
-        # Sử dụng văn bản gốc nếu không phải tiếng Việt
-        translated_query = text_query
+        return translate_query(text_query, degraded)
+    # Sử dụng văn bản gốc nếu không phải tiếng Việt
+    return text_query
 
-    text = clip.tokenize([translated_query]).to(device)
-    with torch.no_grad():
-        text_features = model.encode_text(text)
-    text_features = text_features.cpu().numpy().astype('float32').flatten()
-    distances, indices = index_load.search(np.expand_dims(text_features, axis=0), top_k)
+async def encode_text(text_query: str, degraded: Optional[Set[str]] = None) -> np.ndarray:
+    """Dịch nếu cần thiết và mã hóa câu truy vấn bằng CLIP, dùng cache nếu đã có"""
+    translated_query = await run_blocking(prepare_text_query, text_query, degraded)
+
+    cache_key = normalize_query(translated_query)
+    text_features = text_embedding_cache.get(cache_key)
+    if text_features is not None:
+        return text_features
+
+    text_features = await run_batched(text_encoder, translated_query)
+    text_embedding_cache.put(cache_key, text_features)
+    return text_features
+
+def encode_texts(translated_queries: List[str], return_exceptions: bool = False) -> List[Any]:
+    """
+    Mã hóa nhiều câu truy vấn đã dịch (xem prepare_text_query), theo thứ tự.
+
+    Các câu chưa có trong cache (trùng nhau chỉ tính một lần) được mã hóa trực tiếp theo lô
+    BATCH_MAX_SIZE câu mỗi lần forward, không qua micro-batcher. Nếu một lô lỗi, các câu của lô
+    được mã hóa lại từng câu một; với `return_exceptions`, câu lỗi nhận exception thay cho vector.
+    """
+    keys = [normalize_query(query) for query in translated_queries]
+    vectors = {}
+    missing = {}
+    for key, query in zip(keys, translated_queries):
+        if key not in vectors:
+            vectors[key] = text_embedding_cache.get(key)
+            if vectors[key] is None:
+                missing[key] = query
+    missing_keys = list(missing)
+    for start in range(0, len(missing_keys), BATCH_MAX_SIZE):
+        chunk = missing_keys[start:start + BATCH_MAX_SIZE]
+        try:
+            encoded = list(encode_text_batch([missing[key] for key in chunk]))
+        except Exception:
+            if len(chunk) == 1 and not return_exceptions:
+                raise
+            encoded = []
+            for key in chunk:
+                try:
+                    encoded.append(encode_text_batch([missing[key]])[0])
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    encoded.append(e)
+        for key, vector in zip(chunk, encoded):
+            if not isinstance(vector, BaseException):
+                text_embedding_cache.put(key, vector)
+            vectors[key] = vector
+    return [vectors[key] for key in keys]
+
+async def search_text(text_query: str, top_k: int = 300, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      date_filter: Optional[PublishDateFilter] = None, degraded: Optional[Set[str]] = None) -> List[int]:
+    """Tìm kiếm văn bản, dịch nếu cần thiết và thực hiện tìm kiếm"""
+    text_features = await encode_text(text_query, degraded)
+    distances, indices = await run_batched(index_searcher, SearchRequest(text_features, top_k, nprobe, ef_search, date_filter))
     # print(f"Search distances (text): {distances}")
     # print(f"Search indices (text): {indices}")
-    return indices[0]
+    return indices
 
-def search_image(image_path: str, top_k: int = 300) -> List[int]:
-    """Tìm kiếm bằng hình ảnh"""
-    image = process_image(image_path)
-    with torch.no_grad():
-        image_features = model.encode_image(image)
-    image_features = image_features.cpu().numpy().astype('float32').flatten()
-    distances, indices = index_load.search(np.expand_dims(image_features, axis=0), top_k)
-    return indices[0]
-
-def load_file_list(file_list_path: str) -> Dict[str, str]:
-    """Tải tệp JSON chứa ID và tên tệp vào một dictionary."""
-    with open(file_list_path, 'r') as f:
-        file_list = json.load(f)
-    
-    # Kiểm tra cấu trúc của file_list và xây dựng dictionary
-    file_dict = {}
-    for item in file_list:
-        title = item.get('title')
-        file_id = item.get('id')  # Hoặc tên trường chứa ID
-        if title and file_id:
-            file_dict[title] = file_id
-    
-    return file_dict
-
-def load_fps_list(fps_list_path: str) -> Dict[str, float]:
-    """Tải tệp JSON chứa FPS vào một dictionary."""
-    with open(fps_list_path, 'r') as f:
-        fps_list = json.load(f)
-    
-    # Xây dựng dictionary từ danh sách FPS
-    fps_dict = {}
-    for item in fps_list:
-        title = item.get('title')
-        fps = item.get('fps')
-        if title and fps is not None:
-            fps_dict[title] = fps
-    
-    return fps_dict
-
-def get_fps(video_name: str, file_fps_list: Dict[str, float]) -> Optional[float]:
-    """Lấy FPS từ từ điển dựa trên video_name."""
-    return file_fps_list.get(video_name, None)
-
-def construct_image_path_and_video_path(file_list: Dict[str, str], file_video_list: Dict[str, str], file_fps_list: Dict[str, int], image_info: Dict[str, str]) -> Dict[str, Optional[str]]:
+def frame_vector(row: int) -> np.ndarray:
+    """Vector đã lưu của một dòng FAISS: từ frame_vectors nếu có, nếu không thì reconstruct từ index"""
+    if frame_vectors is not None:
+        return np.array(frame_vectors[row], dtype='float32')
+    return reconstruct_row(cpu_index, row)
+
+def indexed_image_row(image_path: str) -> Optional[int]:
+    """Dòng FAISS của ảnh nếu image_path là URL Google Drive của một keyframe đã có trong index"""
+    if "drive.google.com" not in image_path or "id=" not in image_path:
+        return None
+    return frame_catalog.find_image(image_path.split("id=")[-1])
+
+async def image_query_features(image_path: str) -> np.ndarray:
     """
-    Xây dựng đường dẫn ảnh và video từ thông tin ảnh sử dụng tệp JSON chứa ID và tên tệp.
-    
-    :param file_list: Dictionary chứa ID và tên tệp.
-    :param file_video_list: Dictionary chứa ID và tên video.
-    :param image_info: Thông tin ảnh bao gồm 'frame_id', 'video_id', và 'video_folder'.
-    :return: Một dictionary chứa đường dẫn ảnh và video.
+    Vector truy vấn của một ảnh (URL hoặc file local), trên event loop.
+
+    Keyframe đã index dùng vector đã lưu; URL gặp trong IMAGE_URL_CACHE_TTL giây gần đây dùng
+    cache theo URL; còn lại ảnh được tải qua image_fetcher (bất đồng bộ, có timeout và giới
+    hạn dung lượng) rồi mã hóa, với cache theo nội dung.
     """
-    base_image_url = "https://drive.google.com/thumbnail?export=view&sz=w160-h160&id="
-    base_video_url = "https://drive.google.com/file/d/"  # Base URL for video
-    
-    # Extract information from image_info
-    frame_id = image_info.get('frame_id')
-    video_id = image_info.get('video_id')
-    video_folder = image_info.get('video_folder')
-    
-    result = {}
-    
-    if frame_id and video_id and video_folder:
-        # Build the file name for the image
-        file_name = f"{video_id}_{frame_id}.jpg"
-        video_name = f"{video_id}.mp4"
-        file_id = file_list.get(file_name)
-        video_file_id = file_video_list.get(video_name)  # Get video file ID using video_id
-        fps = file_fps_list.get(video_name, None)
-
-        if file_id:
-            # Build the image path from file_id
-            image_path = f"{base_image_url}{file_id}"
-            result['image_path'] = image_path
-        else:
-            print(f"File ID not found for file: {file_name}")
-            result['image_path'] = None
-        
-        if video_file_id:
-            # Construct the video path from video_id
-            video_path = f"{base_video_url}{video_file_id}/preview"
-            result['video_path'] = video_path
-        else:
-            print(f"Video ID not found for video: {video_id}")
-            result['video_path'] = None
+    if not image_path.startswith("http"):
+        return await encode_image_bytes(await run_blocking(read_file, image_path))
+    row = indexed_image_row(image_path)
+    if row is not None:
+        # Ảnh là một keyframe đã index: dùng vector đã lưu, không tải, giải mã hay mã hóa lại ảnh
+        return await run_blocking(frame_vector, row)
+    image_features = image_url_cache.get(image_path)
+    if image_features is None:
+        data = await image_fetcher.fetch(image_path)
+        image_features = await encode_image_bytes(data)
+        image_url_cache.put(image_path, image_features)
+    return image_features
 
-        if fps:
-            result['fps'] = fps
-    else:
-        print(f"Required information not found in image_info: {image_info}")
-        result['image_path'] = None
-        result['video_path'] = None
-        result['fps'] = None
-        
-    return result
-
-
-def search_faiss(query: Optional[str] = None, image_path: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Tìm kiếm trong FAISS dựa trên văn bản hoặc hình ảnh và trả về kết quả dưới dạng danh sách từ điển"""
-    # Tải chỉ mục FAISS và bản đồ ID
-    print("Loading FAISS index and ID map...")
-    # Đọc bản đồ ID từ tệp
-    try:
-        with open(ID_MAP_FILE_PATH, 'r') as f:
-            id_map_load = json.load(f)
-        
-        # Đảm bảo id_map_load là một dictionary
-        if isinstance(id_map_load, list):
-            id_map_load = {str(i): item for i, item in enumerate(id_map_load)}        
-        
-    except Exception as e:
-        print(f"Error loading ID map file: {e}")
-        return []
+async def search_image(image_path: Optional[str], top_k: int = 300, nprobe: Optional[int] = None,
+                       ef_search: Optional[int] = None, date_filter: Optional[PublishDateFilter] = None,
+                       image_features: Optional[np.ndarray] = None) -> List[int]:
+    """Tìm kiếm bằng hình ảnh; vector ảnh có thể truyền sẵn vào image_features (xem image_query_features)"""
+    if image_features is None:
+        image_features = await image_query_features(image_path)
+    distances, indices = await run_batched(index_searcher, SearchRequest(image_features, top_k, nprobe, ef_search, date_filter))
+    return indices
 
-    file_list = load_file_list(FILE_LIST) 
-    file_video_list = load_file_list(FILE_VIDEO_LIST)    
-    file_fps_list = load_fps_list(FILE_FPS_LIST)
+async def search_faiss(query: Optional[str] = None, image_path: Optional[str] = None,
+                       nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                       date_filter: Optional[PublishDateFilter] = None, enrich: bool = True,
+                       image_features: Optional[np.ndarray] = None,
+                       degraded: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Tìm kiếm trong FAISS dựa trên văn bản hoặc hình ảnh và trả về kết quả dưới dạng danh sách từ điển.
+    Chạy trên event loop: CLIP và FAISS đi qua các micro-batcher, chỉ phần tính toán CPU dùng thread pool.
+    Ảnh có thể được truyền dưới dạng vector đã mã hóa (image_features, xem image_query_features).
+    Nếu có date_filter, top-k chỉ được lấy trong các frame của video có ngày đăng phù hợp.
+    Với enrich=False kết quả chưa có image_path/fps (được thêm sau cho từng trang kết quả).
+    Nếu không dịch được câu truy vấn, 'translation' được thêm vào degraded.
+    """
+    nprobe = FAISS_NPROBE if nprobe is None else nprobe
+    ef_search = FAISS_EF_SEARCH if ef_search is None else ef_search
+    if date_filter is not None and date_filter.is_empty():
+        date_filter = None
     if query:
         # Tìm kiếm theo văn bản
-        result_indices = search_text(query, 400)
-    elif image_path:
+        result_indices = await search_text(query, FAISS_TOP_K, nprobe, ef_search, date_filter, degraded)
+    elif image_path or image_features is not None:
         # Tìm kiếm theo hình ảnh
-        result_indices = search_image(image_path, 400)
+        result_indices = await search_image(image_path, FAISS_TOP_K, nprobe, ef_search, date_filter, image_features)
     else:
         raise ValueError("Either query or image_path must be provided.")
 
-    # Chuyển đổi các chỉ số thành kết quả và xây dựng đường dẫn hình ảnh
-    results = []
-    for idx in result_indices:
-        image_info = id_map_load.get(str(idx), None)
-        if image_info:
-            # Sử dụng hàm construct_image_path_and_video_path để tạo đường dẫn hình ảnh
-            paths = construct_image_path_and_video_path(file_list, file_video_list, file_fps_list, image_info)
-            img_path = paths.get('image_path')
-            # video_path = paths.get('video_path')
-            fps = paths.get('fps')
-            
-            # if img_path and video_path:
-            # if img_path:
-            #     # Thêm thông tin hình ảnh, video, và FPS vào kết quả
-            #     results.append({
-            #         'frame_id': image_info['frame_id'],
-            #         'video_id': image_info['video_id'], 
-            #         'video_folder': image_info['video_folder'],
-            #         # 'image_path': img_path,
-            #         # 'video_path': video_path,
-            #         'fps': fps  # Thêm FPS vào kết quả
-            #     })
-            # else:
-            #     if not img_path:
-            #         print(f"Failed to construct image path for index { idx }: Image path not found")
-            #     if not video_path:
-            #         print(f"Failed to construct video path for index {idx}: Video path not found")
-
-            results.append({
-                    'frame_id': image_info['frame_id'],
-                    'video_id': image_info['video_id'], 
-                    'video_folder': image_info['video_folder'],
-                    'image_path': img_path,
-                    # 'video_path': video_path,
-                    'fps': fps  # Thêm FPS vào kết quả
-                })
-        else:
-            print(f"Video ID not found for index {idx}")
+    # Chuyển đổi các chỉ số FAISS thành kết quả bằng một lần gather trên catalog
+    return await run_blocking(frame_catalog.gather, result_indices, with_paths=enrich)
+
+async def search_similar_frame(row: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                         date_filter: Optional[PublishDateFilter] = None, enrich: bool = True,
+                         top_k: int = FAISS_TOP_K) -> List[Dict[str, Any]]:
+    """
+    Tìm các keyframe giống một keyframe đã có trong index ("more like this frame").
+
+    Vector truy vấn là vector đã lưu của dòng `row`, nên không cần tải ảnh hay chạy CLIP.
+    Bản thân frame truy vấn không có trong kết quả.
+    """
+    if not 0 <= row < index_load.ntotal:
+        raise ValueError(f"Row {row} is not in the index ({index_load.ntotal} vectors).")
+    nprobe = FAISS_NPROBE if nprobe is None else nprobe
+    ef_search = FAISS_EF_SEARCH if ef_search is None else ef_search
+    if date_filter is not None and date_filter.is_empty():
+        date_filter = None
+    vector = await run_blocking(frame_vector, row)
+    distances, indices = await run_batched(index_searcher, SearchRequest(vector, top_k + 1, nprobe, ef_search, date_filter))
+    return await run_blocking(frame_catalog.gather, indices[indices != row][:top_k], with_paths=enrich)
 
-    return results   
\ No newline at end of file
+def search_faiss_batch(queries: List[FaissQuery], enrich: bool = True) -> List[Any]:
+    """
+    Tìm kiếm nhiều truy vấn CLIP/ảnh cùng lúc, trả về kết quả theo đúng thứ tự.
+
+    Các câu truy vấn được mã hóa theo lô (encode_texts) và mọi vector được tìm kiếm trong
+    một lần gọi search_index_batch (một lần index.search cho mỗi nhóm tham số). Truy vấn không
+    mã hóa được nhận exception của nó thay cho kết quả, các truy vấn khác vẫn được tìm kiếm.
+    """
+    text_vectors = iter(encode_texts([query.text for query in queries if query.text], return_exceptions=True))
+    results: List[Any] = [None] * len(queries)
+    requests, owners = [], []
+    for i, query in enumerate(queries):
+        if query.text:
+            vector = next(text_vectors)
+        elif query.image_features is not None:
+            vector = query.image_features
+        else:
+            vector = ValueError("Either text or image_features must be provided.")
+        if isinstance(vector, BaseException):
+            results[i] = vector
+            continue
+        date_filter = query.date_filter if query.date_filter is not None and not query.date_filter.is_empty() else None
+        requests.append(SearchRequest(
+            vector, FAISS_TOP_K,
+            FAISS_NPROBE if query.nprobe is None else query.nprobe,
+            FAISS_EF_SEARCH if query.ef_search is None else query.ef_search,
+            date_filter,
+        ))
+        owners.append(i)
+    for i, (_, indices) in zip(owners, search_index_batch(requests) if requests else []):
+        results[i] = frame_catalog.gather(indices, with_paths=enrich)
+    return results
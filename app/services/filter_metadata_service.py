@@ -1,12 +1,18 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-from app.config import META_DATA
+import threading
+import time
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+from datetime import date, datetime
+import numpy as np
+from app.config import META_DATA, META_DATA_CHECK_INTERVAL, META_DATA_SNAPSHOT
 # META_DATA = "E:\\CODE\\AIC_2024\\Fastapi\\app\\data\\metadata"
 
 def load_all_metadata() -> Dict[str, Any]:
     all_metadata = {}
+    if not os.path.isdir(META_DATA):
+        print(f"Warning: metadata directory {META_DATA} not found, no video has a publish date")
+        return all_metadata
     try:
         for filename in os.listdir(META_DATA):
             if filename.endswith('.json'):
@@ -19,11 +25,176 @@ def load_all_metadata() -> Dict[str, Any]:
         raise ValueError(f"Error loading all metadata: {str(e)}")
     return all_metadata
 
+def metadata_fingerprint() -> str:
+    """Cheap fingerprint of the metadata directory (file count and newest mtime), 'missing' without one."""
+    count, newest = 0, 0
+    try:
+        with os.scandir(META_DATA) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json'):
+                    count += 1
+                    newest = max(newest, entry.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return 'missing'
+    return f"{count}:{newest}"
+
+class MetadataIndex:
+    """
+    Columnar view of every video's metadata, sorted by video_id.
+
+    The publish date is stored as an ordinal plus year/month/day columns; other scalar
+    metadata fields become extra columns that `mask` can match exactly.
+    """
+
+    def __init__(self, video_ids: np.ndarray, publish_ordinal: np.ndarray, columns: Dict[str, np.ndarray],
+                 fingerprint: str = ''):
+        self.video_ids = video_ids
+        self.publish_ordinal = publish_ordinal
+        self.columns = columns
+        valid = publish_ordinal > 0
+        dates = [date.fromordinal(int(o)) if o > 0 else None for o in publish_ordinal]
+        self.year = np.array([d.year if d else 0 for d in dates], dtype=np.int16)
+        self.month = np.array([d.month if d else 0 for d in dates], dtype=np.int8)
+        self.day = np.array([d.day if d else 0 for d in dates], dtype=np.int8)
+        self.has_date = valid
+        self.fingerprint = fingerprint  # metadata_fingerprint() of the directory it was built from
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    @classmethod
+    def from_metadata(cls, all_metadata: Dict[str, Dict[str, Any]], fingerprint: str = '') -> 'MetadataIndex':
+        video_ids = sorted(all_metadata)
+        ordinals = np.zeros(len(video_ids), dtype=np.int32)
+        fields: Dict[str, list] = {}
+        for i, video_id in enumerate(video_ids):
+            metadata = all_metadata[video_id]
+            try:
+                ordinals[i] = datetime.strptime(metadata['publish_date'], "%d/%m/%Y").toordinal()
+            except (KeyError, TypeError, ValueError):
+                print(f"Invalid publish_date in metadata of {video_id}")
+            for key, value in metadata.items():
+                if key != 'publish_date' and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                    fields.setdefault(key, [None] * len(video_ids))[i] = value
+
+        columns = {}
+        for key, values in fields.items():
+            if all(isinstance(v, (int, float)) for v in values if v is not None):
+                columns[key] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                columns[key] = np.array(['' if v is None else str(v) for v in values], dtype=str)
+        return cls(np.array(video_ids, dtype=str), ordinals, columns, fingerprint)
+
+    @classmethod
+    def load(cls, snapshot_path: Optional[str] = META_DATA_SNAPSHOT) -> 'MetadataIndex':
+        """Load from the binary snapshot if it matches the metadata directory, else rebuild it."""
+        fingerprint = metadata_fingerprint()
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                with np.load(snapshot_path, allow_pickle=False) as snapshot:
+                    if str(snapshot['fingerprint']) == fingerprint:
+                        columns = {key[4:]: snapshot[key] for key in snapshot.files if key.startswith('col:')}
+                        return cls(snapshot['video_ids'], snapshot['publish_ordinal'], columns, fingerprint)
+            except Exception as e:
+                print(f"Ignoring metadata snapshot {snapshot_path}: {e}")
+
+        index = cls.from_metadata(load_all_metadata(), fingerprint)
+        if snapshot_path:
+            try:
+                np.savez(snapshot_path, fingerprint=np.array(fingerprint), video_ids=index.video_ids,
+                         publish_ordinal=index.publish_ordinal,
+                         **{f'col:{key}': values for key, values in index.columns.items()})
+            except OSError as e:
+                print(f"Could not write metadata snapshot {snapshot_path}: {e}")
+        return index
+
+    def mask(self, publish_day: Optional[int] = None, publish_month: Optional[int] = None,
+             publish_year: Optional[int] = None, date_from: Optional[date] = None,
+             date_to: Optional[date] = None, **equals: Any) -> np.ndarray:
+        """Boolean mask over videos matching every given date component, the inclusive date range and field values."""
+        mask = np.ones(len(self), dtype=bool)
+        if any(v is not None for v in (publish_day, publish_month, publish_year, date_from, date_to)):
+            mask &= self.has_date
+        if publish_year is not None:
+            mask &= self.year == publish_year
+        if publish_month is not None:
+            mask &= self.month == publish_month
+        if publish_day is not None:
+            mask &= self.day == publish_day
+        if date_from is not None:
+            mask &= self.publish_ordinal >= date_from.toordinal()
+        if date_to is not None:
+            mask &= self.publish_ordinal <= date_to.toordinal()
+        for key, value in equals.items():
+            column = self.columns.get(key)
+            mask &= False if column is None else np.broadcast_to(column == value, mask.shape)
+        return mask
+
+    def positions(self, video_ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Row of each video_id in the index and whether it was found."""
+        if not len(self):
+            return np.zeros(len(video_ids), dtype=np.int64), np.zeros(len(video_ids), dtype=bool)
+        ids = np.array(video_ids, dtype=str)
+        pos = np.clip(np.searchsorted(self.video_ids, ids), 0, len(self) - 1)
+        return pos, self.video_ids[pos] == ids
+
+_metadata_index: Optional[MetadataIndex] = None
+_metadata_checked = 0.0
+_metadata_lock = threading.Lock()
+
+def get_metadata_index() -> MetadataIndex:
+    """
+    Return the process-wide metadata index, compiling it on first use.
+
+    The metadata directory is fingerprinted again at most every META_DATA_CHECK_INTERVAL
+    seconds and the index reloaded when it changed.
+    """
+    global _metadata_index, _metadata_checked
+    if _metadata_index is not None and time.monotonic() - _metadata_checked < META_DATA_CHECK_INTERVAL:
+        return _metadata_index
+    with _metadata_lock:
+        if _metadata_index is None or time.monotonic() - _metadata_checked >= META_DATA_CHECK_INTERVAL:
+            if _metadata_index is None or _metadata_index.fingerprint != metadata_fingerprint():
+                _metadata_index = MetadataIndex.load()
+                print(f"Loaded metadata index with {len(_metadata_index)} videos")
+            _metadata_checked = time.monotonic()
+    return _metadata_index
+
+def videos_published_on(publish_day: Optional[int] = None,
+                        publish_month: Optional[int] = None,
+                        publish_year: Optional[int] = None,
+                        date_from: Optional[date] = None,
+                        date_to: Optional[date] = None) -> List[str]:
+    """Return the video_ids whose publish date matches every given component and the date range."""
+    index = get_metadata_index()
+    return index.video_ids[index.mask(publish_day, publish_month, publish_year, date_from, date_to)].tolist()
+
+class PublishDateFilter(NamedTuple):
+    """Hashable publish date filter; None components match any value."""
+    publish_day: Optional[int] = None
+    publish_month: Optional[int] = None
+    publish_year: Optional[int] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self)
+
+    def video_ids(self) -> List[str]:
+        return videos_published_on(*self)
+
+def result_video_id(info: Dict[str, Any]) -> str:
+    """video_id of a result from any modality (CLIP dicts, ES hits, flattened ES sources or backup entries)."""
+    source = info.get('_source', info)
+    return source.get('video_id') or source.get('video_name') or ''
+
 def filter_by_metadata(search_results: Dict[str, List[Dict[str, Any]]], 
                        search_type: str, 
                        publish_day: Optional[int] = None,
                        publish_month: Optional[int] = None,
-                       publish_year: Optional[int] = None) -> List[Dict[str, Any]]:
+                       publish_year: Optional[int] = None,
+                       date_from: Optional[date] = None,
+                       date_to: Optional[date] = None) -> List[Dict[str, Any]]:
     """
     Filter search results based on publish_date from metadata of each video for a specific search type.
 
@@ -33,41 +204,20 @@ def filter_by_metadata(search_results: Dict[str, List[Dict[str, Any]]],
     - publish_day: Optional day of the publish date to filter results.
     - publish_month: Optional month of the publish date to filter results.
     - publish_year: Optional year of the publish date to filter results.
+    - date_from, date_to: Optional inclusive publish date range.
 
     Returns:
     - Filtered results based on publish_date for the specified search_type.
     """
-    filtered_results = []
-
-    if search_type in search_results:
-        # Load all metadata
-        all_metadata = load_all_metadata()
-
-        # Filter results based on publish_date for the selected search type
-        for info in search_results[search_type]:
-            # Extract video_id depending on the search type
-            if search_type == "clip":
-                video_id = info['video_id']
-            elif search_type == "ocr" or search_type == "asr":
-                video_id = info['_source']['video_name']
-            elif search_type == "object":
-                video_id = info['_source']['video_id']
-
-            # Check if video_id exists in metadata
-            if video_id in all_metadata:
-                metadata = all_metadata[video_id]
-                video_publish_date = datetime.strptime(metadata['publish_date'], "%d/%m/%Y")
-                
-                # Check the filtering conditions based on day, month, and year
-                if ((publish_year is None or video_publish_date.year == publish_year) and
-                    (publish_month is None or video_publish_date.month == publish_month) and
-                    (publish_day is None or video_publish_date.day == publish_day)):
-                    print("publish_year: ", publish_year)
-                    print("publish_month: ", publish_month)
-                    print("publish_day: ", publish_day)
-                    filtered_results.append(info)
-
-    return filtered_results
+    results = search_results.get(search_type) or []
+    if not results:
+        return []
+
+    index = get_metadata_index()
+    video_mask = index.mask(publish_day, publish_month, publish_year, date_from, date_to)
+    pos, found = index.positions([result_video_id(info) for info in results])
+    keep = found & video_mask[pos]
+    return [info for info, kept in zip(results, keep) if kept]
 
 
 # # Ví dụ sử dụng hàm
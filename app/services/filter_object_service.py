@@ -1,77 +1,73 @@
-from typing import List, Dict, Optional
-from elasticsearch import Elasticsearch, exceptions
-import json
-from app.config import OBJECT_BACKUP_FILE_PATH, FILE_LIST, FILE_VIDEO_LIST, FILE_FPS_LIST
-from rapidfuzz import fuzz  # type: ignore
-
-def load_json_file(file_path: str) -> List[Dict]:
-    """Load data from a JSON file and return it as a list of dictionaries."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Error loading JSON file {file_path}: {e}")
-        return []
-
-def load_file_dict(file_list_path: str) -> Dict[str, str]:
-    """Load a file list into a dictionary with filenames as keys and IDs as values."""
-    file_list = load_json_file(file_list_path)
-    return {item.get('title'): item.get('id') for item in file_list if item.get('title') and item.get('id')}
-
-def construct_paths(file_list: Dict[str, str], file_video_list: Dict[str, str], file_fps_list: Dict[str, float], image_info: Dict[str, str]) -> Dict[str, Optional[str]]:
+from typing import List, Dict, Optional, Set
+import numpy as np
+from elasticsearch import AsyncElasticsearch
+from app.config import FRAME_KEY_FIELD, OBJECT_FILTER_BATCH_SIZE, OBJECT_FILTER_MODE
+from app.services.asset_registry import asset_registry
+from app.services.circuit_breaker import es_request
+from app.services.executor import run_local_search
+from app.services.keyframe_index import frame_key
+from app.services.object_index import ObjectCondition, object_query_clauses, parse_object_query
+from app.services.result_sets import with_paths
+
+# Mode in use: 'terms' until detect_object_filter_mode confirms FRAME_KEY_FIELD is mapped
+object_filter_mode = 'terms'
+
+async def detect_object_filter_mode(es: AsyncElasticsearch, index_name: str) -> str:
     """
-    Construct image and video paths from image information using JSON files containing IDs and filenames.
-    
-    :param file_list: Dictionary containing image IDs and filenames.
-    :param file_video_list: Dictionary containing video IDs and filenames.
-    :param file_fps_list: Dictionary containing FPS of videos.
-    :param image_info: Image information including 'frame_id', 'video_id', and 'video_folder'.
-    :return: A dictionary containing image path, video path, and FPS.
-    """
-    base_image_url = "https://drive.google.com/thumbnail?export=view&sz=w160-h160&id="
-    base_video_url = "https://drive.google.com/file/d/"
-    
-    frame_id = image_info.get('frame_id')
-    video_id = image_info.get('video_id')
-    video_folder = image_info.get('video_folder')
-    
-    result = {
-        'image_path': None,
-        'video_path': None,
-        'fps': None
-    }
+    Switch to OBJECT_FILTER_MODE 'frame_key' only if FRAME_KEY_FIELD is mapped in `index_name`.
 
-    if frame_id and video_id and video_folder:
-        file_name = f"{video_id}_{frame_id}.jpg"
-        video_name = f"{video_id}.mp4"
-
-        file_id = file_list.get(file_name)
-        video_file_id = file_video_list.get(video_name)
-        fps = file_fps_list.get(video_name)
-        
-        if file_id:
-            result['image_path'] = f"{base_image_url}{file_id}"
-        if video_file_id:
-            result['video_path'] = f"{base_video_url}{video_file_id}/preview"
-        if fps is not None:
-            result['fps'] = fps
-
-    return result
-
-def search_filter_object_from_elasticsearch(
-    es: Elasticsearch, 
+    On an index without frame keys every lookup would match nothing and fall back to the
+    local object index, so the 'terms' mode is kept, with a warning, when the field is
+    missing or the mapping cannot be read.
+    """
+    global object_filter_mode
+    if OBJECT_FILTER_MODE != 'frame_key':
+        object_filter_mode = OBJECT_FILTER_MODE
+        return object_filter_mode
+    response = await es_request(lambda: es.indices.get_field_mapping(index=index_name, fields=FRAME_KEY_FIELD))
+    field_types = [
+        field.get('mapping', {}).get(FRAME_KEY_FIELD, {}).get('type')
+        for mapping in (response or {}).values()
+        for field in [mapping.get('mappings', {}).get(FRAME_KEY_FIELD, {})]
+    ]
+    if field_types and all(field_type == 'keyword' for field_type in field_types):
+        object_filter_mode = 'frame_key'
+    else:
+        reason = "is not mapped as a keyword" if response is not None else "could not be checked"
+        print(f"Warning: {FRAME_KEY_FIELD} of index {index_name} {reason}, the object filter uses the 'terms' mode "
+              f"(run `python -m app.services.es_maintenance add-frame-keys`)")
+    return object_filter_mode
+
+def object_conditions(query: str, operator: str, value: Optional[int]) -> List[ObjectCondition]:
+    """Parse an object query, mapping labels to the spelling used by the object index ('cars' -> 'car')."""
+    object_index = asset_registry.object_index()
+    return [
+        condition._replace(label=object_index.canonical_label(condition.label))
+        for condition in parse_object_query(query, operator, value)
+    ]
+
+def object_backup_results(rows: np.ndarray, top: int, enrich: bool = True) -> List[Dict]:
+    """Backup entries of the first `top` rows, with their image/video paths added unless `enrich` is False."""
+    object_index = asset_registry.object_index()
+    entries = [object_index.entries[row] for row in rows[:top].tolist()]
+    # with_paths copies: backup entries are shared through the asset registry
+    return with_paths('object', entries) if enrich else [dict(entry) for entry in entries]
+
+async def search_filter_object_from_elasticsearch(
+    es: AsyncElasticsearch, 
     index_name: str, 
-    query: str, 
     top: int, 
-    operator: str, 
-    value: Optional[int], 
+    conditions: List[ObjectCondition], 
     clip_results: List[Dict]
-) -> List[Dict]:
-    """Search for objects in Elasticsearch with filters based on provided query and clip results."""
-    file_list = load_file_dict(FILE_LIST)
-    file_video_list = load_file_dict(FILE_VIDEO_LIST)
-    file_fps_list = {item['title']: item['fps'] for item in load_json_file(FILE_FPS_LIST)}
-    
+) -> Optional[List[Dict]]:
+    """
+    Search for objects in Elasticsearch with filters based on the parsed query conditions and clip results.
+
+    Returns None when Elasticsearch is unavailable or the circuit breaker is open.
+    """
+    if object_filter_mode == 'frame_key':
+        return await search_filter_object_by_frame_key(es, index_name, top, conditions, clip_results)
+
     # Extract frame_ids and video_ids from clip results
     frame_ids = [clip['frame_id'] for clip in clip_results]
     video_ids = [clip['video_id'] for clip in clip_results]
@@ -82,8 +78,7 @@ def search_filter_object_from_elasticsearch(
     search_body = {
         "query": {
             "bool": {
-                "must": [
-                    {"term": {"labels.keyword": query}},  # Tìm các đối tượng liên quan tới query
+                "must": object_query_clauses(conditions) + [   # Các nhãn và số lượng đối tượng của query
                     {"terms": {"frame_id.keyword": frame_ids}},   # Chỉ tìm trong frame_id được trả về từ CLIP
                     {"terms": {"video_id.keyword": video_ids}}    # Chỉ tìm trong video_id được trả về từ CLIP
                 ]
@@ -92,120 +87,94 @@ def search_filter_object_from_elasticsearch(
         "size": top  # Số lượng kết quả tối đa
     }
 
-    # Define range operators mapping
-    range_operators = {
-        "gt": "gt",
-        "lt": "lt",
-        "gte": "gte",
-        "lte": "lte",
-        "eq": "eq"
-    }
-    
-    # Add the range query only if the value is not None and operator is valid
-    if value is not None and operator in range_operators:
-        op = range_operators[operator]
-        search_body["query"]["bool"]["must"].append({
-            "range": {f"label_counts.{query}": {op: value}}
-        })
-
-    try:
-        response = es.search(index=index_name, body=search_body)
-        hits = response['hits']['hits']
-        results = []
-        for hit in hits:
-            image_info = {
-                'frame_id': hit['_source'].get('frame_id', ''),
-                'video_id': hit['_source'].get('video_id', ''),
-                'video_folder': hit['_source'].get('video_folder', '')
-            }
-            hit['_source'].update(construct_paths(file_list, file_video_list, file_fps_list, image_info))
-            results.append(hit['_source'])
-        return results
-
-    except (exceptions.ConnectionError, exceptions.TransportError) as e:
-        print(f"Error searching Elasticsearch: {str(e)}")
-        return []
-
-
+    response = await es_request(lambda: es.search(index=index_name, body=search_body))
+    if response is None:
+        return None
+    return [hit['_source'] for hit in response['hits']['hits']]
 
-def search_filter_object_in_backup(
-    query: str, 
-    backup_data: List[Dict], 
+async def search_filter_object_by_frame_key(
+    es: AsyncElasticsearch, 
+    index_name: str, 
     top: int, 
-    operator: str, 
-    value: int, 
+    conditions: List[ObjectCondition], 
     clip_results: List[Dict]
-) -> List[Dict]:
-    """Search for objects in the backup data with filters based on provided query and clip results."""
+) -> Optional[List[Dict]]:
+    """
+    Look up only the exact (video_id, frame_id) pairs of the CLIP results through their frame key.
+
+    Candidates are sent in CLIP rank order, OBJECT_FILTER_BATCH_SIZE keys per request, until
+    `top` matches are found; the results keep the CLIP rank order. Returns None when
+    Elasticsearch is unavailable.
+    """
+    keys = list(dict.fromkeys(
+        key for key in (frame_key(clip.get('video_id'), clip.get('frame_id')) for clip in clip_results) if key
+    ))
     results = []
-    file_list = load_file_dict(FILE_LIST)
-    file_video_list = load_file_dict(FILE_VIDEO_LIST)
-    file_fps_list = {item['title']: item['fps'] for item in load_json_file(FILE_FPS_LIST)}
-    
-    allowed_pairs = {(clip['frame_id'], clip['video_id']) for clip in clip_results}
-    
-    for entry in backup_data:
-        entry_frame_id = entry.get('frame_id')
-        entry_video_id = entry.get('video_id')
-        
-        if (entry_frame_id, entry_video_id) in allowed_pairs:
-            if query.lower() in [name.lower() for name in entry.get('labels', [])]:
-                count_value = entry['label_counts'].get(query, 0)
-
-                # Apply the operator to filter based on the count_value
-                if operator == 'lt' and count_value < value:
-                    results.append(entry)
-                elif operator == 'lte' and count_value <= value:
-                    results.append(entry)
-                elif operator == 'gt' and count_value > value:
-                    results.append(entry)
-                elif operator == 'gte' and count_value >= value:
-                    results.append(entry)
-                elif operator == 'eq' and count_value == value:
-                    results.append(entry)
-
-                # Add image path information
-                frame_id = entry.get('frame_id', '')
-                video_id = entry.get('video_id', '')
-                video_folder = entry.get('video_folder', '')
-                image_info = {
-                    'frame_id': frame_id,
-                    'video_id': video_id,
-                    'video_folder': video_folder
+    for start in range(0, len(keys), OBJECT_FILTER_BATCH_SIZE):
+        batch = keys[start:start + OBJECT_FILTER_BATCH_SIZE]
+        search_body = {
+            "query": {
+                "bool": {
+                    "must": object_query_clauses(conditions),
+                    "filter": [{"terms": {FRAME_KEY_FIELD: batch}}]
                 }
-                image_info.update(construct_paths(file_list, file_video_list, file_fps_list, image_info))
-                entry.update(image_info)
-
-                # Append the entry to the results
-                results.append(entry)
-        
-        # Break when enough results are found
-        if len(results) >= top:
-            break
-
+            },
+            "size": len(batch)
+        }
+        response = await es_request(lambda: es.search(index=index_name, body=search_body))
+        if response is None:
+            return None
+
+        found = {}
+        for hit in response['hits']['hits']:
+            source = hit['_source']
+            found.setdefault(frame_key(source.get('video_id'), source.get('frame_id')), source)
+        for key in batch:
+            source = found.get(key)
+            if source is None:
+                continue
+            results.append(source)
+            if len(results) >= top:
+                return results
     return results
 
-def search_filter_object(
-    es: Elasticsearch, 
+def search_filter_object_in_backup(
+    conditions: List[ObjectCondition], 
+    top: int, 
+    clip_results: List[Dict],
+    enrich: bool = True
+) -> List[Dict]:
+    """Search the object index for CLIP results satisfying every condition, in CLIP rank order."""
+    object_index = asset_registry.object_index()
+    rows = object_index.filter_candidates(object_index.search(conditions), clip_results)
+    return object_backup_results(rows, top, enrich)
+
+async def search_filter_object(
+    es: AsyncElasticsearch, 
     index_name: str, 
     query: str, 
     operator: str, 
     value: Optional[int], 
-    clip_results: List[Dict]
+    clip_results: List[Dict],
+    enrich: bool = True,
+    degraded: Optional[Set[str]] = None
 ) -> List[Dict]:
-    """Search for objects either from Elasticsearch or backup data based on query and filters."""
+    """
+    Search for objects either from Elasticsearch or backup data based on query and filters.
+
+    With `enrich` False the image/video paths are left out (see result_sets.with_paths).
+    'object' is added to `degraded` when Elasticsearch failed and the local index answered instead.
+    """
     top = 200
-    
-    try:
-        es_results = search_filter_object_from_elasticsearch(es, index_name, query, top, operator, value, clip_results)
-        if es_results:
-            print("Successfully connected to Elasticsearch server")
-            return es_results
-        else:
-            raise Exception("No results from Elasticsearch.")
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        print("Attempting to load data from backup...")
-        backup_data = load_json_file(OBJECT_BACKUP_FILE_PATH)
-        backup_results = search_filter_object_in_backup(query, backup_data, top, operator, value, clip_results)
-        return backup_results
+    conditions = object_conditions(query, operator, value)
+
+    es_results = await search_filter_object_from_elasticsearch(es, index_name, top, conditions, clip_results)
+    if es_results:
+        return with_paths('object', es_results) if enrich else es_results
+    if es_results is None:
+        print("Elasticsearch unavailable, searching the local object index")
+        if degraded is not None:
+            degraded.add('object')
+    else:
+        print("No results from Elasticsearch, searching the local object index")
+    return await run_local_search(search_filter_object_in_backup, conditions, top, clip_results, enrich)
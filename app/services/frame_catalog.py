@@ -0,0 +1,187 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import ID_MAP_FILE_PATH, FILE_LIST, FILE_FPS_LIST
+from app.services.asset_registry import BASE_IMAGE_URL, asset_registry, title_map
+
+
+def _load_json(file_path: str) -> Any:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FrameCatalog:
+    """
+    Column store of every keyframe in the FAISS index, addressed by FAISS row id.
+
+    Per-row columns hold the frame number, a code into the per-video columns and the
+    Drive image id; per-video columns hold the video id, folder and fps. Dictionaries
+    built once map a (video, frame) pair and an image id back to their row.
+    """
+
+    def __init__(self, frame_ids: np.ndarray, video_codes: np.ndarray, image_ids: np.ndarray,
+                 video_ids: np.ndarray, video_folders: np.ndarray, video_fps: np.ndarray):
+        self.frame_ids = frame_ids
+        self.video_codes = video_codes
+        self.image_ids = image_ids
+        self.video_ids = video_ids
+        self.video_folders = video_folders
+        self.video_fps = video_fps
+        self._video_codes = {video_id: code for code, video_id in reversed(list(enumerate(video_ids.tolist())))}
+        # Reversed so that the first row wins when a keyframe or image appears twice
+        rows = np.flatnonzero(video_codes >= 0)[::-1]
+        self._frame_rows = dict(zip(zip(video_codes[rows].tolist(), frame_ids[rows].tolist()), rows.tolist()))
+        rows = np.flatnonzero(image_ids != b'')[::-1]
+        self._image_rows = dict(zip(image_ids[rows].tolist(), rows.tolist()))
+
+    def __len__(self) -> int:
+        return len(self.frame_ids)
+
+    @classmethod
+    def empty(cls) -> 'FrameCatalog':
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype='S1'),
+                   np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty(0, dtype=np.float64))
+
+    @classmethod
+    def from_records(cls, id_map: Sequence[Dict[str, Any]], file_list: Dict[str, str],
+                     fps_list: Dict[str, float]) -> 'FrameCatalog':
+        """Compile the id map records (ordered by FAISS row id) into columns."""
+        n = len(id_map)
+        frame_ids = np.full(n, -1, dtype=np.int64)
+        video_codes = np.full(n, -1, dtype=np.int32)
+        image_ids = [b''] * n
+        video_index: Dict[str, int] = {}
+        video_folders: List[str] = []
+
+        for row, info in enumerate(id_map):
+            if not info:
+                continue
+            frame_id = info.get('frame_id')
+            video_id = info.get('video_id')
+            if frame_id in (None, '') or not video_id:
+                continue
+            code = video_index.get(video_id)
+            if code is None:
+                code = video_index[video_id] = len(video_folders)
+                video_folders.append(info.get('video_folder', ''))
+            frame_ids[row] = int(frame_id)
+            video_codes[row] = code
+            file_id = file_list.get(f"{video_id}_{frame_id}.jpg")
+            if file_id:
+                image_ids[row] = file_id.encode('ascii')
+
+        video_ids = np.array(list(video_index), dtype=object)
+        video_fps = np.array(
+            [fps_list.get(f"{video_id}.mp4", np.nan) for video_id in video_index], dtype=np.float64
+        )
+        return cls(frame_ids, video_codes, np.array(image_ids, dtype='S'),
+                   video_ids, np.array(video_folders, dtype=object), video_fps)
+
+    @classmethod
+    def load(cls, id_map_path: str = ID_MAP_FILE_PATH, file_list_path: str = FILE_LIST,
+             fps_list_path: str = FILE_FPS_LIST) -> 'FrameCatalog':
+        id_map = _load_json(id_map_path)
+        if isinstance(id_map, dict):
+            # {"0": {...}, "1": {...}} -> list ordered by FAISS row id
+            records = [None] * (max((int(k) for k in id_map), default=-1) + 1)
+            for key, info in id_map.items():
+                records[int(key)] = info
+            id_map = records
+        if file_list_path == FILE_LIST and fps_list_path == FILE_FPS_LIST:
+            file_list, fps_list = asset_registry.file_dict(), asset_registry.fps_dict()
+        else:
+            file_list = title_map(_load_json(file_list_path), 'id')
+            fps_list = title_map(_load_json(fps_list_path), 'fps')
+        return cls.from_records(id_map, file_list, fps_list)
+
+    def valid_rows(self, rows: Sequence[int]) -> np.ndarray:
+        """Drop FAISS padding (-1) and rows that have no id map entry."""
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        rows = rows[(rows >= 0) & (rows < len(self))]
+        return rows[self.video_codes[rows] >= 0]
+
+    def find_row(self, video_id: str, frame_id: Any) -> Optional[int]:
+        """FAISS row of a keyframe, or None if it is not in the index."""
+        try:
+            frame_id = int(frame_id)
+        except (TypeError, ValueError):
+            return None
+        code = self._video_codes.get(video_id)
+        return None if code is None else self._frame_rows.get((code, frame_id))
+
+    def find_image(self, image_id: str) -> Optional[int]:
+        """FAISS row of the keyframe stored under a Drive file id, or None."""
+        try:
+            image_id = image_id.encode('ascii')
+        except UnicodeEncodeError:
+            return None
+        return self._image_rows.get(image_id) if image_id else None
+
+    def video_row_mask(self, video_ids: Sequence[str]) -> np.ndarray:
+        """Boolean mask over FAISS rows that belong to any of the given videos."""
+        allowed = np.zeros(len(self.video_ids) + 1, dtype=bool)  # Last slot: rows without a video (-1)
+        allowed[:-1] = np.isin(self.video_ids, np.asarray(list(video_ids), dtype=object))
+        return allowed[self.video_codes]
+
+    def gather(self, rows: Sequence[int], with_paths: bool = True) -> List[Dict[str, Any]]:
+        """
+        Build result dictionaries for the given FAISS rows, preserving their order.
+
+        Without `with_paths` only the frame, video and folder are filled in; the image
+        path and fps are added later, e.g. for the page of results actually returned.
+        """
+        rows = self.valid_rows(rows)
+        codes = self.video_codes[rows]
+        if not with_paths:
+            return [
+                {'frame_id': frame_id, 'video_id': video_id, 'video_folder': video_folder}
+                for frame_id, video_id, video_folder in zip(
+                    self.frame_ids[rows].tolist(),
+                    self.video_ids[codes].tolist(),
+                    self.video_folders[codes].tolist(),
+                )
+            ]
+        image_ids = self.image_ids[rows]
+        fps = self.video_fps[codes]
+
+        image_paths = np.where(
+            image_ids != b'', np.char.add(BASE_IMAGE_URL.encode('ascii'), image_ids), b''
+        )
+        return [
+            {
+                'frame_id': frame_id,
+                'video_id': video_id,
+                'video_folder': video_folder,
+                'image_path': image_path.decode('ascii') or None,
+                'fps': None if f != f else f,
+            }
+            for frame_id, video_id, video_folder, image_path, f in zip(
+                self.frame_ids[rows].tolist(),
+                self.video_ids[codes].tolist(),
+                self.video_folders[codes].tolist(),
+                image_paths.tolist(),
+                fps.tolist(),
+            )
+        ]
+
+
+_catalog: Optional[FrameCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_frame_catalog() -> FrameCatalog:
+    """Return the process-wide frame catalog, loading it on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                try:
+                    _catalog = FrameCatalog.load()
+                    print(f"Loaded frame catalog with {len(_catalog)} frames")
+                except Exception as e:
+                    print(f"Error loading frame catalog: {e}")
+                    _catalog = FrameCatalog.empty()
+    return _catalog
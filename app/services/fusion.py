@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import DEFAULT_FPS, FUSION_RRF_K, FUSION_TOP_K, FUSION_WEIGHTS, FUSION_WINDOW_SECONDS
+from app.services.asset_registry import asset_registry
+from app.services.result_sets import with_paths
+
+FUSION_METHODS = ('rrf', 'score')
+# Modalities whose hits are matched to keyframes within a time window instead of exactly
+WINDOWED_MODALITIES = ('ocr', 'asr')
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def hit_frames(modality: str, hits: List[Dict]) -> Tuple[List[str], List[int], List[int], List[Optional[float]]]:
+    """
+    Normalize one modality's hits to (video_id, first frame, last frame, score) columns.
+
+    CLIP/image/object hits name one frame. OCR hits may be Elasticsearch hits or flat
+    backup entries. An ASR hit covers the keyframes of its segment (keyframe_span).
+    Hits without a usable frame are dropped.
+    """
+    video_ids, starts, ends, scores = [], [], [], []
+    for hit in hits:
+        source = hit.get('_source', hit)
+        score = hit.get('_score', source.get('score'))
+        if modality == 'ocr':
+            video_id, start = source.get('video_name') or source.get('video_id'), _as_int(source.get('frame'))
+            end = start
+        elif modality == 'asr':
+            video_id, start = source.get('video_id'), _as_int(source.get('start_frame'))
+            span = source.get('keyframe_span') or [start, start]
+            start, end = (start, start) if start is None else (min(start, span[0]), max(start, span[1]))
+        else:
+            video_id, start = source.get('video_id'), _as_int(source.get('frame_id'))
+            end = start
+        if not video_id or start is None:
+            continue
+        video_ids.append(video_id)
+        starts.append(start)
+        ends.append(end)
+        scores.append(score)
+    return video_ids, starts, ends, scores
+
+
+def contributions(method: str, scores: List[Optional[float]], rrf_k: float) -> np.ndarray:
+    """Per-hit contribution of one modality: 1/(k + rank) for RRF, min-max normalized scores otherwise."""
+    ranks = np.arange(1, len(scores) + 1, dtype=np.float64)
+    if method == 'rrf':
+        return 1.0 / (rrf_k + ranks)
+    if scores and all(score is not None for score in scores):
+        values = np.array(scores, dtype=np.float64)
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 0 else np.ones(len(values))
+    # Hits without scores (CLIP, image, object) are scored by rank
+    return 1.0 - (ranks - 1.0) / max(len(scores), 1)
+
+
+def _expand_ranges(start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions covered by the half-open ranges [start, end) and the range each belongs to."""
+    lengths = np.maximum(end - start, 0)
+    owner = np.repeat(np.arange(len(start)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return start[owner] + offsets, owner
+
+
+def fuse_results(results: Dict[str, List[Dict]], method: str = 'rrf', weights: Optional[Dict[str, float]] = None,
+                 window_seconds: float = FUSION_WINDOW_SECONDS, rrf_k: float = FUSION_RRF_K,
+                 top_k: int = FUSION_TOP_K, enrich: bool = True) -> List[Dict]:
+    """
+    Merge the per-modality result lists into one ranked list of distinct keyframes.
+
+    Every hit votes for keyframes: CLIP/image/object hits for their own frame, OCR/ASR
+    hits for every candidate keyframe of the same video within `window_seconds` of
+    their frame (or segment). A modality contributes its best vote per keyframe,
+    weighted by `weights`; keyframes are ranked by the weighted sum. With `enrich` False
+    the fused keyframes come without their image/video paths and fps.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method '{method}', expected one of {', '.join(FUSION_METHODS)}")
+    weights = FUSION_WEIGHTS if weights is None else weights
+    columns = {}
+    for modality, hits in results.items():
+        if hits and weights.get(modality, 0) > 0:
+            video_ids, starts, ends, scores = hit_frames(modality, hits)
+            if video_ids:
+                columns[modality] = (video_ids, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64),
+                                     contributions(method, scores, rrf_k))
+    if not columns:
+        return []
+
+    videos, codes = np.unique(np.concatenate([np.array(c[0], dtype=str) for c in columns.values()]),
+                              return_inverse=True)
+    videos = videos.tolist()
+    path_lookup = asset_registry.path_lookup()
+    fps = np.array([path_lookup.videos.get(v, (None, None))[1] or DEFAULT_FPS for v in videos], dtype=np.float64)
+    window = np.rint(window_seconds * fps).astype(np.int64)
+    all_frames = np.concatenate([np.concatenate([c[1], c[2]]) for c in columns.values()])
+    stride = int(max(all_frames.max(), 0) + window.max()) + 2
+
+    # Candidates are the distinct frames the hits point at, keyed by (video code, frame)
+    offset = 0
+    keyed = {}
+    for modality, (video_ids, starts, ends, contrib) in columns.items():
+        modality_codes = codes[offset:offset + len(video_ids)]
+        offset += len(video_ids)
+        keyed[modality] = (modality_codes, starts, ends, contrib)
+    candidates = np.unique(np.concatenate([c * stride + np.maximum(s, 0) for c, s, _, _ in keyed.values()]))
+
+    total = np.zeros(len(candidates))
+    matched = np.zeros((len(candidates), len(keyed)), dtype=bool)
+    for column, (modality, (modality_codes, starts, ends, contrib)) in enumerate(keyed.items()):
+        base = modality_codes * stride
+        if modality in WINDOWED_MODALITIES:
+            lo = base + np.maximum(starts - window[modality_codes], 0)
+            hi = base + np.minimum(ends + window[modality_codes], stride - 1)
+        else:
+            lo = hi = base + np.maximum(starts, 0)
+        positions, owner = _expand_ranges(np.searchsorted(candidates, lo, side='left'),
+                                          np.searchsorted(candidates, hi, side='right'))
+        best = np.zeros(len(candidates))
+        np.maximum.at(best, positions, contrib[owner])
+        total += weights.get(modality, 0) * best
+        matched[positions, column] = True
+
+    order = np.arange(len(candidates))
+    if len(order) > top_k:
+        order = np.argpartition(-total, top_k - 1)[:top_k]
+    order = order[np.lexsort((candidates[order], -total[order]))]
+
+    modalities = list(keyed)
+    fused = []
+    for key, score, row in zip(candidates[order].tolist(), total[order].tolist(), matched[order]):
+        code, frame_id = divmod(key, stride)
+        video_id = videos[code]
+        fused.append({
+            'frame_id': frame_id,
+            'video_id': video_id,
+            'video_folder': f"Videos_{video_id.split('_')[0]}",
+            'score': score,
+            'modalities': [name for name, hit in zip(modalities, row.tolist()) if hit],
+        })
+    return with_paths('fused', fused) if enrich else fused
@@ -0,0 +1,103 @@
+from io import BytesIO
+from typing import Optional
+
+import httpx
+from PIL import Image
+
+from app.config import IMAGE_FETCH_MAX_BYTES, IMAGE_FETCH_MAX_CONNECTIONS, IMAGE_FETCH_TIMEOUT
+
+
+class ImageFetchError(ValueError):
+    """
+    An image URL could not be downloaded: HTTP error, timeout or too large.
+
+    `status_code` is the HTTP status an API answer should carry: 404 when the image
+    does not exist, 400 when it is too large and 502 when the remote host failed.
+    """
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def download_url(url: str) -> str:
+    """Direct download URL of an image; Google Drive view/thumbnail links are rewritten."""
+    if "drive.google.com" in url and "id=" in url:
+        return f"https://drive.google.com/uc?export=download&id={url.split('id=')[-1]}"
+    return url
+
+
+def decode_image(data: bytes, size: Optional[int] = None) -> Image.Image:
+    """
+    Decode image bytes to RGB.
+
+    With `size`, JPEGs are decoded in draft mode at the smallest DCT scale that stays
+    at least `size` pixels on each side, instead of at full resolution.
+    """
+    image = Image.open(BytesIO(data))
+    if size:
+        image.draft('RGB', (size, size))
+    return image.convert('RGB')
+
+
+class ImageFetcher:
+    """
+    Downloads query images through one pooled async HTTP client.
+
+    Every request has a timeout, and bodies larger than `max_bytes` are rejected while
+    streaming, before they are fully read. Pass `client` to use another client, e.g.
+    one pointed at a local stand-in server.
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, timeout: float = IMAGE_FETCH_TIMEOUT,
+                 max_bytes: int = IMAGE_FETCH_MAX_BYTES, max_connections: int = IMAGE_FETCH_MAX_CONNECTIONS):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_connections = max_connections
+        self._client = client
+        self.fetched = 0
+        self.fetched_bytes = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def fetch(self, url: str) -> bytes:
+        """Body of `url` (Drive links rewritten), or ImageFetchError."""
+        url = download_url(url)
+        try:
+            async with self.client.stream('GET', url) as response:
+                if response.status_code != 200:
+                    raise ImageFetchError(f"Unable to download image from {url}: HTTP {response.status_code}",
+                                          404 if response.status_code in (404, 410) else 502)
+                length = response.headers.get('content-length')
+                if length and length.isdigit() and int(length) > self.max_bytes:
+                    raise ImageFetchError(f"Image at {url} is larger than {self.max_bytes} bytes", 400)
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+                    if len(body) > self.max_bytes:
+                        raise ImageFetchError(f"Image at {url} is larger than {self.max_bytes} bytes", 400)
+        except httpx.HTTPError as e:
+            raise ImageFetchError(f"Unable to download image from {url}: {e!r}") from e
+        self.fetched += 1
+        self.fetched_bytes += len(body)
+        return bytes(body)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {'fetched': self.fetched, 'fetched_bytes': self.fetched_bytes}
+
+
+image_fetcher = ImageFetcher()
@@ -0,0 +1,179 @@
+"""
+Offline tool to rebuild the CLIP keyframe index as IVF-Flat, IVF-PQ or HNSW and to
+benchmark the variants against the exact index.
+
+    python -m app.services.index_builder build --kind ivf_pq --output app/data/final_index_ivfpq.faiss
+    python -m app.services.index_builder benchmark --kinds flat,ivf_flat,ivf_pq,hnsw --nprobe 8,32 --ef-search 64,128
+    python -m app.services.index_builder export-vectors --output app/data/frame_vectors.npy
+"""
+import argparse
+import json
+import math
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from app.config import FRAME_VECTORS_PATH, INDEX_FILE_PATH
+from app.services.index_store import search_parameters
+
+INDEX_KINDS = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+
+def extract_vectors(index: faiss.Index) -> np.ndarray:
+    """Read every stored vector back out of an index (exact for flat indexes)."""
+    if isinstance(faiss.downcast_index(index), faiss.IndexIVF):
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def default_nlist(n: int) -> int:
+    """Common IVF rule of thumb: about 4 * sqrt(n) lists, at least 39 points per list to train."""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def index_description(kind: str, n: int, d: int, nlist: Optional[int] = None, pq_m: Optional[int] = None,
+                      pq_bits: int = 8, hnsw_m: int = 32) -> str:
+    """Translate an index kind and its parameters into a faiss.index_factory string."""
+    nlist = nlist or default_nlist(n)
+    if kind == 'flat':
+        return 'Flat'
+    if kind == 'ivf_flat':
+        return f'IVF{nlist},Flat'
+    if kind == 'ivf_pq':
+        pq_m = pq_m or next(m for m in (64, 32, 16, 8, 4, 2, 1) if d % m == 0)
+        # Each PQ codebook needs about 39 training points per centroid
+        pq_bits = max(1, min(pq_bits, int(math.log2(max(n // 39, 2)))))
+        return f'IVF{nlist},PQ{pq_m}x{pq_bits}'
+    if kind == 'hnsw':
+        return f'HNSW{hnsw_m},Flat'
+    raise ValueError(f"Unknown index kind '{kind}', expected one of {', '.join(INDEX_KINDS)}")
+
+
+def build_index(kind: str, vectors: np.ndarray, metric: int = faiss.METRIC_INNER_PRODUCT,
+                ef_construction: int = 200, **params) -> faiss.Index:
+    """Build and fill an index of the given kind; row ids stay identical to the input order."""
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    n, d = vectors.shape
+    description = index_description(kind, n, d, **params)
+    print(f"Building {description} over {n} vectors of dimension {d}")
+    index = faiss.index_factory(d, description, metric)
+    if kind == 'hnsw':
+        faiss.downcast_index(index).hnsw.efConstruction = ef_construction
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Size of the serialized index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def sample_queries(vectors: np.ndarray, n_queries: int, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Perturbed copies of stored vectors, standing in for real CLIP queries."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    queries = vectors[picks] + rng.normal(scale=noise, size=(len(picks), vectors.shape[1])).astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def benchmark_index(index: faiss.Index, queries: np.ndarray, ground_truth: np.ndarray, k: int,
+                    nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict[str, float]:
+    """Recall@k against exact neighbours plus single-query p50/p99 latency."""
+    params = search_parameters(index, nprobe, ef_search)
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, indices = index.search(query[None, :], k, params=params)
+        latencies.append(time.perf_counter() - start)
+        found[i] = indices[0]
+    hits = sum(len(np.intersect1d(f, g)) for f, g in zip(found, ground_truth))
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        f'recall@{k}': hits / ground_truth.size,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def run_benchmark(vectors: np.ndarray, kinds: List[str], k: int = 100, n_queries: int = 200,
+                  nprobes: List[int] = (), ef_searches: List[int] = (), metric: int = faiss.METRIC_INNER_PRODUCT,
+                  **params) -> List[Dict]:
+    queries = sample_queries(vectors, n_queries)
+    exact = build_index('flat', vectors, metric)
+    _, ground_truth = exact.search(queries, k)
+
+    report = []
+    for kind in kinds:
+        start = time.perf_counter()
+        index = exact if kind == 'flat' else build_index(kind, vectors, metric, **params)
+        build_s = time.perf_counter() - start
+        if kind.startswith('ivf'):
+            settings = [{'nprobe': nprobe} for nprobe in nprobes] or [{}]
+        elif kind == 'hnsw':
+            settings = [{'ef_search': ef} for ef in ef_searches] or [{}]
+        else:
+            settings = [{}]
+        for setting in settings:
+            row = {'kind': kind, **setting, 'build_s': build_s, 'memory_mb': index_memory_bytes(index) / 2 ** 20}
+            row.update(benchmark_index(index, queries, ground_truth, k, **setting))
+            print(json.dumps(row))
+            report.append(row)
+    return report
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=INDEX_FILE_PATH, help='Index whose stored vectors are used')
+    parser.add_argument('--nlist', type=int, help='IVF lists (default: about 4*sqrt(n))')
+    parser.add_argument('--pq-m', type=int, help='PQ sub-quantizers for ivf_pq')
+    parser.add_argument('--pq-bits', type=int, default=8)
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build one index variant and write it to disk')
+    build.add_argument('--kind', choices=INDEX_KINDS, required=True)
+    build.add_argument('--output', required=True)
+
+    bench = sub.add_parser('benchmark', help='Compare index variants against the exact index')
+    bench.add_argument('--kinds', default=','.join(INDEX_KINDS))
+    bench.add_argument('--k', type=int, default=100)
+    bench.add_argument('--queries', type=int, default=200)
+    bench.add_argument('--nprobe', type=_int_list, default=[8, 16, 32, 64])
+    bench.add_argument('--ef-search', type=_int_list, default=[32, 64, 128, 256])
+    bench.add_argument('--output', help='Write the report as JSON')
+
+    export = sub.add_parser('export-vectors', help='Write the stored vectors as a .npy file, memory-mapped by the server')
+    export.add_argument('--output', default=FRAME_VECTORS_PATH)
+
+    args = parser.parse_args(argv)
+    source = faiss.read_index(args.source)
+    vectors = extract_vectors(source)
+    params = {'nlist': args.nlist, 'pq_m': args.pq_m, 'pq_bits': args.pq_bits, 'hnsw_m': args.hnsw_m}
+
+    if args.command == 'export-vectors':
+        np.save(args.output, np.ascontiguousarray(vectors, dtype='float32'))
+        print(f"Wrote {len(vectors)} vectors of dimension {vectors.shape[1]} to {args.output}")
+    elif args.command == 'build':
+        index = build_index(args.kind, vectors, source.metric_type, **params)
+        faiss.write_index(index, args.output)
+        print(f"Wrote {args.kind} index with {index.ntotal} vectors to {args.output}")
+    else:
+        report = run_benchmark(vectors, args.kinds.split(','), args.k, args.queries, args.nprobe, args.ef_search,
+                               source.metric_type, **params)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """Return the concrete index, unwrapping IndexIDMap/IndexPreTransform style wrappers."""
+    index = faiss.downcast_index(index)
+    while hasattr(index, 'index') and isinstance(getattr(index, 'index'), faiss.Index):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Build per-query FAISS search parameters for the index type.
+
+    `nprobe` applies to IVF indexes and `ef_search` to HNSW indexes; a knob that does
+    not match the index type is ignored. `selector` restricts the search to some row
+    ids. Returns None when nothing needs overriding.
+    """
+    inner = base_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        if nprobe is not None:
+            params.nprobe = int(nprobe)
+    elif isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        if ef_search is not None:
+            params.efSearch = int(ef_search)
+    else:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    elif (nprobe is None or not isinstance(inner, faiss.IndexIVF)) and \
+            (ef_search is None or not isinstance(inner, faiss.IndexHNSW)):
+        return None
+    return params
+
+
+_direct_map_lock = threading.Lock()
+
+
+def reconstruct_row(index: faiss.Index, row: int) -> np.ndarray:
+    """
+    Stored vector of one row (approximate for PQ indexes).
+
+    IVF indexes need a direct map from row to inverted list; it is built on first use.
+    """
+    if isinstance(base_index(index), faiss.IndexIVF):
+        ivf = faiss.extract_index_ivf(index)
+        with _direct_map_lock:
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
+    return np.asarray(index.reconstruct(int(row)), dtype='float32')
+
+
+def row_selector(mask: np.ndarray) -> faiss.IDSelector:
+    """ID selector over the rows set in `mask`: a range when they are contiguous, a bitmap otherwise."""
+    rows = np.flatnonzero(mask)
+    if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+        return faiss.IDSelectorRange(int(rows[0]), int(rows[-1]) + 1)
+    bitmap = np.packbits(mask, bitorder='little')
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    selector.bitmap_array = bitmap  # FAISS only keeps a raw pointer to the bitmap
+    return selector
+
+
+def mmap_flags() -> int:
+    """FAISS I/O flags that map the index file instead of copying it into private memory."""
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    # Flat/HNSW code storage is only mapped with IO_FLAG_MMAP_IFC (faiss >= 1.8)
+    return flags | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+
+
+def rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (Linux), or None if unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def load_index(path: str, mmap: bool = False) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Read a FAISS index, memory-mapped when `mmap` is set.
+
+    A mapped index is served from the OS page cache, which every uvicorn worker
+    shares. Index types that cannot be mapped fall back to a regular load. Returns
+    the index and a small report of the load mode, time and RSS growth.
+    """
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    mode = 'memory'
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(path, mmap_flags())
+            mode = 'mmap'
+        except RuntimeError as e:
+            print(f"Index {path} cannot be memory-mapped ({e}), loading it into memory")
+    if index is None:
+        index = faiss.read_index(path)
+    rss_after = rss_mb()
+    stats = {
+        'path': path,
+        'mode': mode,
+        'ntotal': int(index.ntotal),
+        'file_mb': os.path.getsize(path) / 2 ** 20,
+        'load_seconds': time.perf_counter() - start,
+        'rss_delta_mb': None if rss_before is None or rss_after is None else rss_after - rss_before,
+        'pid': os.getpid(),
+    }
+    print(f"Loaded FAISS index: {stats}")
+    return index, stats
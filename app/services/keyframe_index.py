@@ -0,0 +1,98 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ALIGNMENT_MODES = ('after', 'before', 'nearest')
+
+
+def normalize_video_id(video_id: str) -> str:
+    """'L01_V001_xxx' -> 'L01_V001', the form used by the ASR and metadata indexes."""
+    return '_'.join(video_id.split('_')[:2])
+
+
+def frame_key(video_id: Any, frame_id: Any) -> Optional[str]:
+    """Composite key of one keyframe, '{video_id}_{frame_id}' with an unpadded frame number."""
+    try:
+        return f"{video_id}_{int(frame_id)}" if video_id else None
+    except (TypeError, ValueError):
+        return None
+
+
+class KeyframeIndex:
+    """
+    Sorted keyframe ids of every video, packed into one array of composite keys
+    (video code * stride + frame id) so a whole batch of lookups is one searchsorted.
+    """
+
+    def __init__(self, video_ids: np.ndarray, keys: np.ndarray, stride: int):
+        self.video_ids = video_ids
+        self.keys = keys
+        self.stride = stride
+        self._video_codes = {video_id: code for code, video_id in enumerate(video_ids.tolist())}
+
+    @classmethod
+    def from_frames(cls, frames_data: List[Dict]) -> 'KeyframeIndex':
+        """Build from file_name_frame.json entries ({'video_id': ..., 'frame_id': ...})."""
+        video_index: Dict[str, int] = {}
+        codes, frames = [], []
+        for frame in frames_data:
+            video_id, frame_id = frame.get('video_id'), frame.get('frame_id')
+            if not video_id or frame_id in (None, ''):
+                continue
+            video_id = normalize_video_id(video_id)
+            codes.append(video_index.setdefault(video_id, len(video_index)))
+            frames.append(int(frame_id))
+
+        codes = np.array(codes, dtype=np.int64)
+        frames = np.array(frames, dtype=np.int64)
+        stride = int(frames.max()) + 1 if len(frames) else 1
+        keys = np.unique(codes * stride + frames)
+        return cls(np.array(list(video_index), dtype=object), keys, stride)
+
+    def _codes(self, video_ids: Sequence[str]) -> np.ndarray:
+        lookup = self._video_codes
+        return np.array([lookup.get(video_id, -1) for video_id in video_ids], dtype=np.int64)
+
+    def align(self, video_ids: Sequence[str], start_frames: Sequence[int],
+              end_frames: Optional[Sequence[int]] = None, mode: str = 'after') -> Dict[str, np.ndarray]:
+        """
+        Align segments to keyframes of their own video in one vectorized pass.
+
+        mode 'after' takes the first keyframe strictly after start_frame, 'before' the last
+        keyframe at or before it and 'nearest' the closer of the two. Returns arrays of
+        the aligned keyframe and the first/last keyframe inside [start_frame, end_frame]
+        plus their count; -1 marks "no keyframe".
+        """
+        if mode not in ALIGNMENT_MODES:
+            raise ValueError(f"Unknown alignment mode '{mode}', expected one of {', '.join(ALIGNMENT_MODES)}")
+        codes = self._codes(video_ids)
+        known = codes >= 0
+        base = np.where(known, codes, 0) * self.stride
+        # Frames are clipped to [-1, stride - 1] so a probe never lands inside a neighbouring video;
+        # lo/hi bound the keys of each segment's own video.
+        raw_starts = np.asarray(start_frames, dtype=np.int64)
+        starts = np.clip(raw_starts, -1, self.stride - 1)
+        ends = starts if end_frames is None else np.clip(np.asarray(end_frames, dtype=np.int64), -1, self.stride - 1)
+        lo = np.searchsorted(self.keys, base, side='left')
+        hi = np.searchsorted(self.keys, base + self.stride, side='left')
+        last_key = len(self.keys) - 1
+
+        after = np.searchsorted(self.keys, base + starts, side='right')
+        before = after - 1
+        after_frame = np.where(known & (after < hi), self.keys[np.minimum(after, last_key)] - base, -1)
+        before_frame = np.where(known & (before >= lo), self.keys[np.clip(before, 0, last_key)] - base, -1)
+        if mode == 'after':
+            frame = after_frame
+        elif mode == 'before':
+            frame = before_frame
+        else:
+            use_after = (after_frame >= 0) & ((before_frame < 0) | (after_frame - starts < starts - before_frame))
+            frame = np.where(use_after, after_frame, before_frame)
+
+        first = np.maximum(np.searchsorted(self.keys, base + np.clip(raw_starts, -1, self.stride), side='left'), lo)
+        last = np.minimum(np.searchsorted(self.keys, base + ends, side='right') - 1, hi - 1)
+        count = np.where(known, np.maximum(last - first + 1, 0), 0)
+        has_span = count > 0
+        span_first = np.where(has_span, self.keys[np.minimum(first, last_key)] - base, -1)
+        span_last = np.where(has_span, self.keys[np.clip(last, 0, last_key)] - base, -1)
+        return {'frame': frame, 'span_first': span_first, 'span_last': span_last, 'span_count': count}
@@ -0,0 +1,176 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+OPERATORS = ('gt', 'gte', 'lt', 'lte', 'eq')
+_OPERATOR_SYMBOLS = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte', '=': 'eq', '==': 'eq'}
+_CONJUNCTION_RE = re.compile(r'\s*(?:,|&|\+|\band\b|\bvà\b)\s*', re.IGNORECASE)
+_COUNT_FIRST_RE = re.compile(r'^(\d+)\s+(.+)$')
+_COUNT_LAST_RE = re.compile(r'^(.+?)\s*(gte|gt|lte|lt|eq|>=|<=|==|>|<|=)\s*(\d+)$', re.IGNORECASE)
+
+
+class ObjectCondition(NamedTuple):
+    label: str
+    operator: str
+    value: Optional[int]
+
+
+def parse_object_query(query: str, operator: str = 'gte', value: Optional[int] = None) -> List[ObjectCondition]:
+    """
+    Parse an object query into label conditions that must all hold.
+
+    "person" uses the request's operator/value, "person gte 3" or "person >= 3" carry
+    their own, and "2 cars and 1 person" means count(car) <operator> 2 and
+    count(person) <operator> 1.
+    """
+    conditions = []
+    for part in _CONJUNCTION_RE.split(query.strip()):
+        part = ' '.join(part.split()).lower()
+        if not part:
+            continue
+        match = _COUNT_LAST_RE.match(part)
+        if match:
+            label, op, count = match.groups()
+            conditions.append(ObjectCondition(label, _OPERATOR_SYMBOLS.get(op, op), int(count)))
+            continue
+        match = _COUNT_FIRST_RE.match(part)
+        if match:
+            conditions.append(ObjectCondition(match.group(2), operator, int(match.group(1))))
+        else:
+            conditions.append(ObjectCondition(part, operator, value))
+    return conditions
+
+
+class ObjectIndex:
+    """
+    Per-label object counts of the object backup, for binary-search count queries.
+
+    For label i, `counts[offsets[i]:offsets[i + 1]]` is sorted ascending and `rows`
+    holds the matching backup entries. `frame_keys` is the composite
+    (video, frame) key of each backup entry, used to intersect with CLIP results.
+    """
+
+    def __init__(self, entries: List[Dict], labels: np.ndarray, offsets: np.ndarray, counts: np.ndarray,
+                 rows: np.ndarray, video_ids: Dict[str, int], frame_keys: np.ndarray, stride: int):
+        self.entries = entries
+        self.labels = labels
+        self.offsets = offsets
+        self.counts = counts
+        self.rows = rows
+        self.video_ids = video_ids
+        self.frame_keys = frame_keys
+        self.stride = stride
+
+    @classmethod
+    def from_entries(cls, entries: List[Dict]) -> 'ObjectIndex':
+        label_names, counts, rows = [], [], []
+        video_ids: Dict[str, int] = {}
+        video_codes = np.full(len(entries), -1, dtype=np.int64)
+        frames = np.zeros(len(entries), dtype=np.int64)
+        for row, entry in enumerate(entries):
+            try:
+                frames[row] = int(entry.get('frame_id'))
+                video_codes[row] = video_ids.setdefault(entry.get('video_id') or '', len(video_ids))
+            except (TypeError, ValueError):
+                pass
+            label_counts = {str(k).lower(): v for k, v in (entry.get('label_counts') or {}).items()}
+            for label in {str(label).lower() for label in entry.get('labels') or []}:
+                label_names.append(label)
+                counts.append(int(label_counts.get(label, 0) or 0))
+                rows.append(row)
+
+        labels, label_ids = np.unique(np.array(label_names, dtype=str), return_inverse=True)
+        counts = np.array(counts, dtype=np.int32)
+        rows = np.array(rows, dtype=np.int64)
+        order = np.lexsort((rows, counts, label_ids))
+        offsets = np.searchsorted(label_ids[order], np.arange(len(labels) + 1)).astype(np.int64)
+        stride = int(frames.max()) + 1 if len(frames) else 1
+        frame_keys = np.where(video_codes >= 0, video_codes * stride + frames, -1)
+        return cls(entries, labels, offsets, counts[order], rows[order], video_ids, frame_keys, stride)
+
+    def resolve_label(self, label: str) -> Optional[int]:
+        """Index of `label`, also accepting simple English plurals ('cars' -> 'car')."""
+        candidates = [label]
+        if label.endswith('es'):
+            candidates.append(label[:-2])
+        if label.endswith('s'):
+            candidates.append(label[:-1])
+        for candidate in candidates:
+            pos = int(np.searchsorted(self.labels, candidate))
+            if pos < len(self.labels) and self.labels[pos] == candidate:
+                return pos
+        return None
+
+    def canonical_label(self, label: str) -> str:
+        label_id = self.resolve_label(label)
+        return label if label_id is None else str(self.labels[label_id])
+
+    def match(self, condition: ObjectCondition) -> np.ndarray:
+        """Sorted backup rows whose count of `condition.label` satisfies the condition."""
+        label_id = self.resolve_label(condition.label)
+        if label_id is None:
+            return np.empty(0, dtype=np.int64)
+        start, end = self.offsets[label_id], self.offsets[label_id + 1]
+        counts = self.counts[start:end]
+        value, op = condition.value, condition.operator
+        if value is not None:
+            if op in ('gte', 'eq'):
+                start += np.searchsorted(counts, value, side='left')
+            elif op == 'gt':
+                start += np.searchsorted(counts, value, side='right')
+            if op in ('lte', 'eq'):
+                end = self.offsets[label_id] + np.searchsorted(counts, value, side='right')
+            elif op == 'lt':
+                end = self.offsets[label_id] + np.searchsorted(counts, value, side='left')
+        return np.sort(self.rows[start:max(start, end)])
+
+    def search(self, conditions: Sequence[ObjectCondition]) -> np.ndarray:
+        """Sorted backup rows satisfying every condition."""
+        rows = None
+        for condition in conditions:
+            matched = self.match(condition)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            if not len(rows):
+                break
+        return np.empty(0, dtype=np.int64) if rows is None else rows
+
+    def candidate_keys(self, clip_results: List[Dict]) -> np.ndarray:
+        """Composite frame keys of CLIP results, in rank order (-2 for frames unknown to the backup)."""
+        keys = np.full(len(clip_results), -2, dtype=np.int64)
+        for i, clip in enumerate(clip_results):
+            code = self.video_ids.get(clip.get('video_id'))
+            try:
+                frame = int(clip.get('frame_id'))
+            except (TypeError, ValueError):
+                continue
+            if code is not None and 0 <= frame < self.stride:
+                keys[i] = code * self.stride + frame
+        return keys
+
+    def filter_candidates(self, rows: np.ndarray, clip_results: List[Dict]) -> np.ndarray:
+        """Rows among `rows` that are CLIP results, ordered by CLIP rank."""
+        row_keys = self.frame_keys[rows]
+        order = np.argsort(row_keys, kind='stable')
+        row_keys, rows = row_keys[order], rows[order]
+        keys = self.candidate_keys(clip_results)
+        pos = np.clip(np.searchsorted(row_keys, keys), 0, max(len(row_keys) - 1, 0))
+        found = (row_keys[pos] == keys) if len(row_keys) else np.zeros(len(keys), dtype=bool)
+        matched = rows[pos[found]]
+        _, first = np.unique(matched, return_index=True)  # A frame listed twice by CLIP is kept once
+        return matched[np.sort(first)]
+
+
+def object_query_clauses(conditions: Sequence[ObjectCondition]) -> List[Dict]:
+    """Elasticsearch bool/must clauses equivalent to ObjectIndex.search(conditions)."""
+    clauses = []
+    for condition in conditions:
+        clauses.append({"term": {"labels.keyword": condition.label}})
+        if condition.value is None:
+            continue
+        field = f"label_counts.{condition.label}"
+        if condition.operator == 'eq':  # Not a range operator in Elasticsearch
+            clauses.append({"term": {field: condition.value}})
+        else:
+            clauses.append({"range": {field: {condition.operator: condition.value}}})
+    return clauses
@@ -0,0 +1,195 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+from app.services.asset_registry import asset_registry
+
+Results = Union[Dict[str, List[Dict]], List[Dict]]
+
+# Types of every search parameter a cursor carries (the keys of main.search_params); None is always allowed
+CURSOR_PARAM_TYPES = {
+    'queries': dict,
+    'operator': str,
+    'value': int,
+    'publish_day': int,
+    'publish_month': int,
+    'publish_year': int,
+    'publish_date_from': str,
+    'publish_date_to': str,
+    'object_as_filter': bool,
+    'nprobe': int,
+    'ef_search': int,
+    'asr_alignment': str,
+    'fusion': str,
+}
+
+
+class ResultSetCache:
+    """
+    Bounded LRU cache of full ranked result sets, each entry expiring `ttl` seconds after it was stored.
+
+    Entries hold the results before enrichment, so serving another page of a cached
+    search only enriches that page.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, Results]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: str) -> Optional[Results]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, results: Results, ttl: Optional[float] = None) -> None:
+        """Store `results`, expiring after `ttl` seconds (default: the cache's own ttl)."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+            }
+
+
+result_cache = ResultSetCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+
+def result_set_key(params: Dict[str, Any]) -> str:
+    """Cache key of a search: a hash of its queries and filters (JSON-serializable values)."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def encode_cursor(params: Dict[str, Any], offset: int, limit: int) -> str:
+    """
+    Opaque cursor to the page at `offset`.
+
+    The cursor carries the search parameters themselves, not only the cache key, so a
+    cursor whose result set was evicted (or that lands on another worker) is recomputed.
+    """
+    payload = json.dumps({'p': params, 'o': offset, 'l': limit}, sort_keys=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Dict[str, Any], int, int]:
+    """(search parameters, offset, limit) of a cursor; ValueError if it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        params, offset, limit = payload['p'], int(payload['o']), int(payload['l'])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}") from e
+    if not isinstance(params, dict) or offset < 0 or limit < 1:
+        raise ValueError("Invalid cursor")
+    if params.keys() != CURSOR_PARAM_TYPES.keys():
+        raise ValueError("Invalid cursor: unexpected search parameters")
+    for name, kind in CURSOR_PARAM_TYPES.items():
+        value = params[name]
+        # bool is an int subclass: only object_as_filter may be one
+        if value is not None and (not isinstance(value, kind) or (kind is int and isinstance(value, bool))):
+            raise ValueError(f"Invalid cursor: bad value for {name}")
+    queries = params['queries']
+    if queries is None or not all(isinstance(query, str) or query is None for query in queries.values()):
+        raise ValueError("Invalid cursor: bad value for queries")
+    if params['object_as_filter'] is None or params['asr_alignment'] is None:
+        raise ValueError("Invalid cursor: missing search parameters")
+    return params, offset, limit
+
+
+def _image_info(source: Dict) -> Dict[str, Any]:
+    return {
+        'frame_id': source.get('frame_id', ''),
+        'video_id': source.get('video_id', ''),
+        'video_folder': source.get('video_folder', '')
+    }
+
+
+def with_paths(modality: str, items: List[Dict]) -> List[Dict]:
+    """
+    Copies of `items` with the image/video paths and fps of their frames added.
+
+    `modality` is a search modality or 'fused'. ASR segments and flat OCR backup
+    entries carry no paths and are returned as they are.
+    """
+    if modality == 'asr':
+        return items
+    path_lookup = asset_registry.path_lookup()
+    enriched = []
+    for item in items:
+        if modality == 'ocr':
+            source = item.get('_source')
+            if source is None:
+                enriched.append(item)
+                continue
+            video_name = source.get('video_name', '')
+            video_folder = f"Videos_{video_name.split('_')[0]}"
+            paths = path_lookup.construct_paths(
+                {'frame_id': source.get('frame', ''), 'video_id': video_name, 'video_folder': video_folder}
+            )
+            enriched.append({**item, '_source': {**source, **paths, 'video_folder': video_folder}})
+        elif modality in ('clip', 'image'):
+            # Same fields as FrameCatalog.gather; every catalog row has a frame, including frame 0
+            fps = path_lookup.videos.get(item['video_id'], (None, None))[1]
+            enriched.append({
+                **item,
+                'image_path': path_lookup.image_path(f"{item['video_id']}_{item['frame_id']}.jpg"),
+                'fps': None if fps is None else float(fps),
+            })
+        elif modality == 'fused':
+            image_info = _image_info(item)
+            enriched.append({**image_info, **path_lookup.construct_paths(image_info),
+                             'score': item.get('score'), 'modalities': item.get('modalities', [])})
+        else:
+            enriched.append({**item, **path_lookup.construct_paths(_image_info(item))})
+    return enriched
+
+
+def page_of(results: Results, modality: str, offset: int, limit: Optional[int]) -> Dict[str, Any]:
+    """
+    The `limit` results from `offset` on, enriched with their paths.
+
+    A per-modality dict is paged modality by modality with the same offset and limit;
+    `modality` names the results of a single ranked list. `has_more` tells whether any
+    list continues past this page.
+    """
+    end = None if limit is None else offset + limit
+    if isinstance(results, dict):
+        page = {key: with_paths(key, items[offset:end]) for key, items in results.items()}
+        total = {key: len(items) for key, items in results.items()}
+        has_more = end is not None and any(count > end for count in total.values())
+    else:
+        page = with_paths(modality, results[offset:end])
+        total = len(results)
+        has_more = end is not None and total > end
+    return {'results': page, 'total': total, 'has_more': has_more}
@@ -0,0 +1,126 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from app.config import DEFAULT_FPS, FAISS_EF_SEARCH, FAISS_NPROBE, TEMPORAL_MAX_GAP_SECONDS, TEMPORAL_RESULT_SIZE, TEMPORAL_TOP_K
+from app.services.faiss_service import SearchRequest, encode_texts, frame_catalog, index_load, search_index_batch
+from app.services.filter_metadata_service import PublishDateFilter
+from app.services.frame_catalog import FrameCatalog
+
+
+def window_best(keys: np.ndarray, lo: np.ndarray, hi: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """
+    For each window [lo, hi) of key values, the position in the sorted `keys` of the best score
+    inside it, or -1 when the window holds no key.
+
+    Windows become position ranges with searchsorted; one maximum.reduceat over the score
+    ranks then finds every window's best element at once.
+    """
+    if not len(keys):
+        return np.full(len(lo), -1, dtype=np.int64)
+    start = np.searchsorted(keys, lo, side='left')
+    end = np.searchsorted(keys, hi, side='left')
+    order = np.argsort(scores, kind='stable')
+    ranks = np.empty(len(order) + 1, dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    ranks[-1] = -1  # Sentinel, so a window may end at len(keys)
+    best = np.maximum.reduceat(ranks, np.column_stack([start, end]).ravel())[::2]
+    return np.where(end > start, order[np.maximum(best, 0)], -1)
+
+
+def join_steps(catalog: FrameCatalog, steps: Sequence[Tuple[np.ndarray, np.ndarray]], max_gap_seconds: float,
+               top_k: int = TEMPORAL_RESULT_SIZE) -> List[Tuple[float, List[int], List[float]]]:
+    """
+    Chain the candidates of consecutive steps into segments and rank them.
+
+    `steps` holds each step's (similarity, FAISS row) candidates. A segment takes one
+    keyframe per step, in order, all from one video and each at most `max_gap_seconds`
+    (converted to frames with the video's fps) after the previous one. A segment scores
+    the sum of its similarities; the best chain ending at each last-step keyframe is kept
+    by dynamic programming, and of segments starting at the same keyframe only the best.
+
+    Returns (score, rows per step, similarity per step) of the best `top_k` segments.
+    """
+    fps = np.where(np.isnan(catalog.video_fps), DEFAULT_FPS, catalog.video_fps)
+    gap = np.rint(max_gap_seconds * fps).astype(np.int64)
+    stride = int(max(catalog.frame_ids.max(initial=0), 0) + gap.max(initial=0)) + 2
+
+    columns = []
+    for scores, rows in steps:
+        rows, scores = np.asarray(rows, dtype=np.int64), np.asarray(scores, dtype=np.float64)
+        keep = (rows >= 0) & (rows < len(catalog)) & np.isfinite(scores)
+        rows, scores = rows[keep], scores[keep]
+        keep = catalog.video_codes[rows] >= 0
+        rows, scores = rows[keep], scores[keep]
+        keys = catalog.video_codes[rows].astype(np.int64) * stride + catalog.frame_ids[rows]
+        order = np.argsort(keys, kind='stable')
+        columns.append((keys[order], rows[order], scores[order]))
+
+    # total[s][j]: best chain score ending at candidate j of step s; back[s][j]: its candidate at step s - 1
+    total, back = [columns[0][2]], [np.full(len(columns[0][1]), -1, dtype=np.int64)]
+    for step in range(1, len(columns)):
+        keys, _, scores = columns[step]
+        codes = keys // stride
+        # The previous step's keyframe lies in the same video, at most `gap` frames before this one
+        lo = codes * stride + np.maximum(keys % stride - gap[codes], 0)
+        best = window_best(columns[step - 1][0], lo, keys, total[-1])
+        chained = np.where(best >= 0, scores + total[-1][np.maximum(best, 0)], -np.inf)
+        total.append(chained)
+        back.append(best)
+
+    ends = np.flatnonzero(np.isfinite(total[-1]))
+    ends = ends[np.argsort(-total[-1][ends], kind='stable')]
+    # Follow the back pointers of every segment at once, from the last step to the first
+    path = np.empty((len(columns), len(ends)), dtype=np.int64)
+    path[-1] = ends
+    for step in range(len(columns) - 1, 0, -1):
+        path[step - 1] = back[step][path[step]]
+    _, first_of_start = np.unique(path[0], return_index=True)
+    ranked = np.sort(first_of_start)[:top_k]
+
+    segments = []
+    for i in ranked.tolist():
+        step_rows = [int(columns[step][1][path[step, i]]) for step in range(len(columns))]
+        step_scores = [float(columns[step][2][path[step, i]]) for step in range(len(columns))]
+        segments.append((float(total[-1][ends[i]]), step_rows, step_scores))
+    return segments
+
+
+def temporal_search(texts: List[str], max_gap_seconds: float = TEMPORAL_MAX_GAP_SECONDS,
+                    nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                    date_filter: Optional[PublishDateFilter] = None, candidates: int = TEMPORAL_TOP_K,
+                    top_k: int = TEMPORAL_RESULT_SIZE) -> List[Dict[str, Any]]:
+    """
+    Ranked video segments matching an ordered list of CLIP text queries (already translated).
+
+    Each step retrieves its `candidates` best keyframes; all steps are encoded in one
+    batch and searched in one multi-query FAISS search, then joined with join_steps.
+    """
+    date_filter = date_filter if date_filter is not None and not date_filter.is_empty() else None
+    requests = [
+        SearchRequest(vector, candidates, FAISS_NPROBE if nprobe is None else nprobe,
+                      FAISS_EF_SEARCH if ef_search is None else ef_search, date_filter)
+        for vector in encode_texts(texts)
+    ]
+    steps = []
+    for distances, rows in search_index_batch(requests):
+        # Higher is better for every step score; L2 indexes return distances
+        similarity = -distances if index_load.metric_type == faiss.METRIC_L2 else distances
+        steps.append((similarity, rows))
+
+    results = []
+    for score, step_rows, step_scores in join_steps(frame_catalog, steps, max_gap_seconds, top_k):
+        frames = frame_catalog.gather(step_rows)
+        for frame, step_score in zip(frames, step_scores):
+            frame['score'] = step_score
+        results.append({
+            'video_id': frames[0]['video_id'],
+            'video_folder': frames[0]['video_folder'],
+            'start_frame': frames[0]['frame_id'],
+            'end_frame': frames[-1]['frame_id'],
+            'fps': frames[0]['fps'],
+            'score': score,
+            'frames': frames,
+        })
+    return results
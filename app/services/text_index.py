@@ -0,0 +1,175 @@
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import BM25_B, BM25_K1, TEXT_INDEXES
+from app.services.asset_registry import asset_registry
+
+TOKENIZER_VERSION = 1  # Bump when tokenize() changes so old snapshots are rebuilt
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def fold_diacritics(text: str) -> str:
+    """Lowercase and strip Vietnamese tone/vowel marks: 'Đường phố' -> 'duong pho'."""
+    text = unicodedata.normalize('NFD', text.lower()).replace('đ', 'd')
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+
+
+def tokenize(text: str) -> List[str]:
+    """Accent-insensitive word tokens, so accented and unaccented queries match the same terms."""
+    return _TOKEN_RE.findall(fold_diacritics(text))
+
+
+def entry_text(entry: Dict, field: str) -> str:
+    value = entry.get(field, '')
+    if isinstance(value, list):
+        return ' '.join(text for text in value if isinstance(text, str))
+    return value if isinstance(value, str) else ''
+
+
+def source_fingerprint(path: str, field: str) -> str:
+    try:
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}:{field}:{TOKENIZER_VERSION}"
+    except OSError:
+        return ''
+
+
+class TextIndex:
+    """
+    BM25 inverted index over one backup file, one document per entry.
+
+    Terms are sorted so lookups are a searchsorted. The posting list of term t is
+    `doc_deltas[offsets[t]:offsets[t + 1]]` (gaps between ascending doc ids, decoded
+    with cumsum) with matching term frequencies in `tfs`.
+    """
+
+    def __init__(self, name: str, entries: List[Dict], terms: np.ndarray, offsets: np.ndarray,
+                 doc_deltas: np.ndarray, tfs: np.ndarray, doc_lengths: np.ndarray,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.name = name
+        self.entries = entries
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_deltas = doc_deltas
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) and doc_lengths.mean() > 0 else 1.0
+        self._norm = k1 * (1.0 - b + b * doc_lengths / avgdl)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, name: str, entries: List[Dict], field: str) -> 'TextIndex':
+        tokens, docs = [], []
+        doc_lengths = np.zeros(len(entries), dtype=np.int32)
+        for doc, entry in enumerate(entries):
+            entry_tokens = tokenize(entry_text(entry, field))
+            doc_lengths[doc] = len(entry_tokens)
+            tokens.extend(entry_tokens)
+            docs.extend([doc] * len(entry_tokens))
+
+        terms, term_ids = np.unique(np.array(tokens, dtype=str), return_inverse=True)
+        # One (term, doc) key per occurrence; sorting groups postings by term, then by doc
+        keys, tfs = np.unique(term_ids.astype(np.int64) * max(len(entries), 1) + np.array(docs, dtype=np.int64),
+                              return_counts=True)
+        posting_terms, posting_docs = np.divmod(keys, max(len(entries), 1))
+        offsets = np.searchsorted(posting_terms, np.arange(len(terms) + 1)).astype(np.int64)
+        doc_deltas = np.diff(posting_docs, prepend=0)
+        first = offsets[:-1][offsets[:-1] < offsets[1:]]  # Each term's first posting stores its absolute doc id
+        doc_deltas[first] = posting_docs[first]
+        return cls(name, entries, terms, offsets, doc_deltas.astype(np.uint32),
+                   np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16), doc_lengths)
+
+    @classmethod
+    def load(cls, name: str, entries: List[Dict], source_path: str, field: str,
+             snapshot_path: Optional[str] = None) -> 'TextIndex':
+        """Load from the compressed snapshot if it matches the source file, else rebuild and save it."""
+        fingerprint = source_fingerprint(source_path, field)
+        if snapshot_path and fingerprint and os.path.exists(snapshot_path):
+            try:
+                with np.load(snapshot_path, allow_pickle=False) as snapshot:
+                    if str(snapshot['fingerprint']) == fingerprint and len(snapshot['doc_lengths']) == len(entries):
+                        return cls(name, entries, snapshot['terms'], snapshot['offsets'], snapshot['doc_deltas'],
+                                   snapshot['tfs'], snapshot['doc_lengths'])
+            except Exception as e:
+                print(f"Ignoring text index snapshot {snapshot_path}: {e}")
+
+        start = time.perf_counter()
+        index = cls.build(name, entries, field)
+        print(f"Built {name} text index: {len(index)} documents, {len(index.terms)} terms "
+              f"in {time.perf_counter() - start:.2f}s")
+        if snapshot_path and fingerprint:
+            try:
+                np.savez_compressed(snapshot_path, fingerprint=np.array(fingerprint), terms=index.terms,
+                                    offsets=index.offsets, doc_deltas=index.doc_deltas, tfs=index.tfs,
+                                    doc_lengths=index.doc_lengths)
+            except OSError as e:
+                print(f"Could not write text index snapshot {snapshot_path}: {e}")
+        return index
+
+    def postings(self, term_id: int):
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return np.cumsum(self.doc_deltas[start:end], dtype=np.int64), self.tfs[start:end]
+
+    def score(self, query: str):
+        """BM25 score of every document matching at least one query term: (doc ids, scores)."""
+        query_terms = np.unique(np.array(tokenize(query), dtype=str))
+        if not len(query_terms) or not len(self.terms):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        pos = np.clip(np.searchsorted(self.terms, query_terms), 0, len(self.terms) - 1)
+        term_ids = pos[self.terms[pos] == query_terms]
+        docs_parts, score_parts = [], []
+        for term_id in term_ids.tolist():
+            docs, tfs = self.postings(term_id)
+            idf = np.log1p((len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            tfs = tfs.astype(np.float64)
+            docs_parts.append(docs)
+            score_parts.append(idf * tfs * (self.k1 + 1.0) / (tfs + self._norm[docs]))
+        if not docs_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        docs, inverse = np.unique(np.concatenate(docs_parts), return_inverse=True)
+        return docs, np.bincount(inverse, weights=np.concatenate(score_parts))
+
+    def search(self, query: str, size: int = 300) -> Dict[str, Any]:
+        """Top `size` documents for `query`, shaped like an Elasticsearch search response."""
+        start = time.perf_counter()
+        docs, scores = self.score(query)
+        top = np.arange(len(docs))
+        if len(top) > size:
+            top = np.argpartition(-scores, size - 1)[:size]
+        top = top[np.lexsort((docs[top], -scores[top]))]
+        hits = [
+            {'_index': self.name, '_type': '_doc', '_id': str(doc), '_score': score,
+             '_source': dict(self.entries[doc])}
+            for doc, score in zip(docs[top].tolist(), scores[top].tolist())
+        ]
+        return {
+            'took': int((time.perf_counter() - start) * 1000),
+            'timed_out': False,
+            'hits': {
+                'total': {'value': len(docs), 'relation': 'eq'},
+                'max_score': hits[0]['_score'] if hits else None,
+                'hits': hits,
+            },
+        }
+
+
+def text_index(modality: str) -> TextIndex:
+    """Local BM25 index of the `modality` backup file, rebuilt when the file changes."""
+    settings = TEXT_INDEXES[modality]
+    return asset_registry.derived(
+        f'text_index:{modality}', (settings['path'],),
+        lambda entries: TextIndex.load(modality, entries, settings['path'], settings['field'], settings.get('snapshot'))
+    )
+
+
+def search_local(modality: str, query: str, size: int = 300) -> List[Dict]:
+    """Elasticsearch-style hits of the local BM25 engine."""
+    return text_index(modality).search(query, size)['hits']['hits']
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import TRANSLATOR_BACKEND, TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_SIZE, TRANSLATION_TIMEOUT
+
+# Letters that only Vietnamese uses: breve/horn vowels, đ and the tone marks
+# that do not occur in French, Spanish or Portuguese.
+VIETNAMESE_ONLY_CHARS = set(
+    'ăđơư'
+    'ạảấầẩẫậắằẳẵặẹẻẽếềểễệỉĩịọỏốồổỗộớờởỡợụủũứừửữựỳỵỷỹ'
+)
+# Accented letters Vietnamese shares with other Latin-script languages.
+SHARED_ACCENT_CHARS = set('àáâãèéêìíòóôõùúý')
+# Word onsets that are common in unaccented Vietnamese but rare in English.
+VIETNAMESE_ONSETS = ('ng', 'nh')
+
+
+def detect_vietnamese(text: str) -> Optional[bool]:
+    """
+    Decide from the character set whether `text` is Vietnamese.
+
+    Returns True/False when the text is unambiguous and None when only a statistical
+    detector can tell (shared accents only, or unaccented text with Vietnamese onsets).
+    """
+    letters = set(text.lower())
+    if letters & VIETNAMESE_ONLY_CHARS:
+        return True
+    if letters & SHARED_ACCENT_CHARS:
+        return None
+    if any(not ch.isascii() for ch in letters if ch.isalpha()):
+        return False
+    if any(word.startswith(VIETNAMESE_ONSETS) for word in text.lower().split()):
+        return None
+    return False
+
+
+def detect_language(text: str) -> Optional[str]:
+    """Return 'vi' for Vietnamese text, falling back to langdetect only for ambiguous input."""
+    is_vietnamese = detect_vietnamese(text)
+    if is_vietnamese is not None:
+        return 'vi' if is_vietnamese else 'en'
+    from langdetect import DetectorFactory, detect
+    DetectorFactory.seed = 0  # Make langdetect deterministic
+    return detect(text)
+
+
+class QueryTranslator:
+    """Interface of the Vietnamese -> English translators used for CLIP queries."""
+
+    name = 'base'
+
+    def translate(self, text: str, src: str = 'vi', dest: str = 'en') -> str:
+        raise NotImplementedError
+
+
+class IdentityTranslator(QueryTranslator):
+    """Local stub that returns the query unchanged."""
+
+    name = 'identity'
+
+    def translate(self, text: str, src: str = 'vi', dest: str = 'en') -> str:
+        return text
+
+
+class GoogleTranslator(QueryTranslator):
+    """Online translation through googletrans."""
+
+    name = 'google'
+
+    def __init__(self):
+        from googletrans import Translator
+        self._translator = Translator()
+
+    def translate(self, text: str, src: str = 'vi', dest: str = 'en') -> str:
+        return self._translator.translate(text, src=src, dest=dest).text
+
+
+class MarianTranslator(QueryTranslator):
+    """Offline translation with a MarianMT model from `transformers` (optional dependency)."""
+
+    name = 'marian'
+
+    def __init__(self, model_name: str = 'Helsinki-NLP/opus-mt-vi-en'):
+        from transformers import MarianMTModel, MarianTokenizer
+        self._tokenizer = MarianTokenizer.from_pretrained(model_name)
+        self._model = MarianMTModel.from_pretrained(model_name)
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, src: str = 'vi', dest: str = 'en') -> str:
+        with self._lock:
+            batch = self._tokenizer([text], return_tensors='pt', truncation=True)
+            output = self._model.generate(**batch, max_new_tokens=128)
+        return self._tokenizer.decode(output[0], skip_special_tokens=True)
+
+
+TRANSLATORS = {
+    IdentityTranslator.name: IdentityTranslator,
+    GoogleTranslator.name: GoogleTranslator,
+    MarianTranslator.name: MarianTranslator,
+}
+
+
+class TranslationCache:
+    """Bounded in-memory LRU backed by an optional SQLite table, keyed by (backend, text)."""
+
+    def __init__(self, persist_path: Optional[str] = None, max_size: int = TRANSLATION_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, text TEXT)')
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute('SELECT text FROM translations WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    text = row[0]
+                    self._remember(key, text)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._remember(key, text)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO translations (key, text) VALUES (?, ?)', (key, text))
+                self._db.commit()
+
+    def _remember(self, key: str, text: str) -> None:
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every translation, on disk too."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM translations')
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                    'persistent': self._db is not None}
+
+
+class CachedTranslator:
+    """
+    Cache-first wrapper around a QueryTranslator.
+
+    A cache miss waits at most `timeout` seconds for the backend. If it is slower the
+    untranslated query is returned and the translation lands in the cache once ready.
+    """
+
+    def __init__(self, backend: QueryTranslator, cache: TranslationCache, timeout: Optional[float] = None):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='translate')
+
+    def _translate_and_store(self, key: str, text: str) -> str:
+        translated = self.backend.translate(text)
+        self.cache.put(key, translated)
+        return translated
+
+    def translate(self, text: str) -> str:
+        return self.translate_checked(text)[0]
+
+    def translate_checked(self, text: str) -> Tuple[str, bool]:
+        """(translation, True), or (the original text, False) when the backend timed out or failed."""
+        key = f"{self.backend.name}:{' '.join(text.split())}"
+        translated = self.cache.get(key)
+        if translated is not None:
+            return translated, True
+        future = self._executor.submit(self._translate_and_store, key, text)
+        try:
+            return future.result(timeout=self.timeout), True
+        except FutureTimeoutError:
+            print(f"Translation timed out after {self.timeout}s, using the original query")
+        except Exception as e:
+            print(f"Translation failed: {e}")
+        return text, False
+
+
+def create_translator(backend: str = TRANSLATOR_BACKEND) -> CachedTranslator:
+    """Build the configured translator, falling back to the identity stub if it is unavailable."""
+    try:
+        translator = TRANSLATORS[backend]()
+    except Exception as e:
+        print(f"Translator '{backend}' unavailable ({e}), queries will not be translated")
+        translator = IdentityTranslator()
+    return CachedTranslator(translator, TranslationCache(TRANSLATION_CACHE_PATH), TRANSLATION_TIMEOUT)
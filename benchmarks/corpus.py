@@ -0,0 +1,209 @@
+"""
+Generate a synthetic corpus laid out like app/data, for benchmarking the service at any scale.
+
+    python -m benchmarks.corpus --output /tmp/aic_bench --videos 200 --frames-per-video 300
+    python -m benchmarks.corpus --output /tmp/aic_bench --index ivf_flat --es-host http://localhost:9200
+
+The corpus holds random CLIP-sized vectors in a FAISS index (plus frame_vectors.npy), the
+id map, file/video/fps lists, per-video metadata, OCR/ASR/object backup data and a few
+query images. With --es-host the OCR/ASR/object data is also bulk-loaded into
+Elasticsearch. Point the service at it with AIC_DATA_DIR=<output>.
+"""
+import argparse
+import json
+import os
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import ASR_INDEX, FRAME_KEY_FIELD, OBJECT_INDEX, OCR_INDEX
+from app.services.index_builder import INDEX_KINDS, build_index
+
+MANIFEST = 'benchmark_manifest.json'
+# Small vocabularies the generated texts and the benchmark queries are drawn from
+CAPTION_WORDS = ['man', 'woman', 'child', 'dog', 'car', 'bicycle', 'street', 'river', 'boat', 'stage', 'crowd',
+                 'flag', 'building', 'market', 'rain', 'night', 'beach', 'football', 'helmet', 'bridge']
+OCR_WORDS = ['tin', 'tức', 'thời', 'sự', 'hà', 'nội', 'bóng', 'đá', 'giá', 'vàng', 'thời', 'tiết', 'giao',
+             'thông', 'học', 'sinh', 'bệnh', 'viện', 'kinh', 'tế', 'du', 'lịch', 'lũ', 'lụt', 'xăng', 'dầu']
+ASR_WORDS = ['người', 'đàn', 'ông', 'phụ', 'nữ', 'nói', 'chuyện', 'hôm', 'nay', 'thành', 'phố', 'cơn', 'mưa',
+             'lớn', 'cảnh', 'sát', 'điều', 'tra', 'vụ', 'việc', 'khán', 'giả', 'trận', 'đấu', 'chiến', 'thắng']
+OBJECT_LABELS = ['person', 'car', 'motorcycle', 'bicycle', 'bus', 'truck', 'dog', 'boat', 'chair', 'tv']
+
+
+def _dump(path: str, value: Any) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(value, f, ensure_ascii=False)
+
+
+def _words(rng: np.random.Generator, vocabulary: List[str], low: int, high: int) -> str:
+    return ' '.join(rng.choice(vocabulary, size=int(rng.integers(low, high + 1))).tolist())
+
+
+def video_ids(videos: int, videos_per_batch: int = 30) -> List[str]:
+    """Video ids in the corpus naming scheme: L01_V001, L01_V002, ..., L02_V001, ..."""
+    return [f"L{v // videos_per_batch + 1:02d}_V{v % videos_per_batch + 1:03d}" for v in range(videos)]
+
+
+def write_vectors(path: str, videos: int, frames_per_video: int, dim: int, rng: np.random.Generator,
+                  scenes_per_video: int = 8, noise: float = 0.5) -> np.ndarray:
+    """
+    Unit vectors of every keyframe, written as a memory-mapped .npy file.
+
+    Keyframes of a video are noisy copies of a few scene centers, so neighbours cluster
+    like real CLIP embeddings instead of being uniformly spread.
+    """
+    vectors = np.lib.format.open_memmap(path, mode='w+', dtype='float32', shape=(videos * frames_per_video, dim))
+    for v in range(videos):
+        centers = rng.standard_normal((scenes_per_video, dim)).astype('float32')
+        scene = np.minimum(np.arange(frames_per_video) * scenes_per_video // frames_per_video, scenes_per_video - 1)
+        block = centers[scene] + noise * rng.standard_normal((frames_per_video, dim)).astype('float32')
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[v * frames_per_video:(v + 1) * frames_per_video] = block
+    vectors.flush()
+    return vectors
+
+
+def generate(output: str, videos: int = 100, frames_per_video: int = 200, frame_step: int = 50, dim: int = 512,
+             index_kind: str = 'flat', images: int = 16, seed: int = 0) -> Dict[str, Any]:
+    """Write the corpus under `output` and return its manifest."""
+    import faiss
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(output, 'metadata'), exist_ok=True)
+    os.makedirs(os.path.join(output, 'images'), exist_ok=True)
+    ids = video_ids(videos)
+
+    id_map, file_list, file_video_list, file_fps_list, frames = [], [], [], [], []
+    ocr, asr, objects = [], [], []
+    first_day = date(2023, 1, 1)
+    for video_id in ids:
+        folder = f"Videos_{video_id.split('_')[0]}"
+        fps = float(rng.choice([25.0, 30.0]))
+        file_video_list.append({'title': f"{video_id}.mp4", 'id': f"vid_{video_id}"})
+        file_fps_list.append({'title': f"{video_id}.mp4", 'fps': fps})
+        published = first_day + timedelta(days=int(rng.integers(0, 730)))
+        _dump(os.path.join(output, 'metadata', f"{video_id}.json"), {
+            'publish_date': published.strftime('%d/%m/%Y'),
+            'title': f"Bản tin {video_id}",
+            'author': 'benchmark',
+        })
+        for k in range(frames_per_video):
+            frame_id = k * frame_step
+            id_map.append({'frame_id': frame_id, 'video_id': video_id, 'video_folder': folder})
+            file_list.append({'title': f"{video_id}_{frame_id}.jpg", 'id': f"img_{video_id}_{frame_id}"})
+            frames.append({'video_id': video_id, 'frame_id': frame_id})
+            if rng.random() < 0.5:
+                ocr.append({'video_name': video_id, 'frame': frame_id, 'text': [_words(rng, OCR_WORDS, 2, 8)]})
+            labels = rng.choice(OBJECT_LABELS, size=int(rng.integers(1, 4)), replace=False).tolist()
+            counts = {label: int(rng.integers(1, 6)) for label in labels}
+            objects.append({'video_id': video_id, 'frame_id': frame_id, 'video_folder': folder,
+                            'labels': labels, 'label_counts': counts})
+        # About one ASR segment per 10 seconds of video
+        duration = frames_per_video * frame_step
+        segment = int(10 * fps)
+        for start in range(0, duration, segment):
+            asr.append({'video_id': video_id, 'video_folder': folder, 'start_frame': start,
+                        'end_frame': min(start + segment, duration) - 1, 'fps': fps,
+                        'text': [_words(rng, ASR_WORDS, 6, 20)]})
+
+    _dump(os.path.join(output, 'final_id_map.json'), id_map)
+    _dump(os.path.join(output, 'file_list.json'), file_list)
+    _dump(os.path.join(output, 'file_video_list.json'), file_video_list)
+    _dump(os.path.join(output, 'file_fps_list.json'), file_fps_list)
+    _dump(os.path.join(output, 'file_name_frame.json'), frames)
+    _dump(os.path.join(output, 'ocr_backup_merge.json'), ocr)
+    _dump(os.path.join(output, 'asr_backup.json'), asr)
+    _dump(os.path.join(output, 'object_backup_merge.json'), objects)
+    # main.py refuses to start without a client secrets file; the benchmark never uses Drive
+    _dump(os.path.join(output, 'client_secrets.json'), {})
+
+    vectors = write_vectors(os.path.join(output, 'frame_vectors.npy'), videos, frames_per_video, dim, rng)
+    index = build_index(index_kind, vectors)
+    faiss.write_index(index, os.path.join(output, 'final_index.faiss'))
+
+    image_names = []
+    for i in range(images):
+        # Smooth random gradients: cheap to make, realistic JPEG sizes
+        pixels = np.linspace(rng.random(3) * 255, rng.random(3) * 255, 640, dtype='float32')
+        pixels = np.broadcast_to(pixels, (360, 640, 3)) + rng.normal(scale=8, size=(360, 640, 3))
+        name = f"query_{i:03d}.jpg"
+        Image.fromarray(np.clip(pixels, 0, 255).astype('uint8')).save(os.path.join(output, 'images', name), quality=85)
+        image_names.append(name)
+
+    manifest = {
+        'videos': videos,
+        'frames_per_video': frames_per_video,
+        'frame_step': frame_step,
+        'keyframes': len(id_map),
+        'dim': dim,
+        'index': index_kind,
+        'ocr_entries': len(ocr),
+        'asr_segments': len(asr),
+        'object_entries': len(objects),
+        'images': image_names,
+        'seed': seed,
+        'vocabulary': {'caption': CAPTION_WORDS, 'ocr': OCR_WORDS, 'asr': ASR_WORDS, 'object': OBJECT_LABELS},
+    }
+    _dump(os.path.join(output, MANIFEST), manifest)
+    return manifest
+
+
+def load_elasticsearch(output: str, es_host: str, recreate: bool = False, chunk_size: int = 2000) -> Dict[str, int]:
+    """
+    Bulk-load the corpus' OCR, ASR and object data into the Elasticsearch at `es_host`.
+
+    Existing indexes are only replaced with `recreate`; otherwise loading stops before
+    touching them.
+    """
+    from elasticsearch import Elasticsearch
+    from elasticsearch.helpers import bulk
+
+    es = Elasticsearch(es_host)
+    sources = {
+        OCR_INDEX: 'ocr_backup_merge.json',
+        ASR_INDEX: 'asr_backup.json',
+        OBJECT_INDEX: 'object_backup_merge.json',
+    }
+    existing = [index for index in sources if es.indices.exists(index=index)]
+    if existing and not recreate:
+        raise SystemExit(f"Indexes {', '.join(existing)} already exist on {es_host}; pass --recreate to replace them")
+    loaded = {}
+    for index, file_name in sources.items():
+        if index in existing:
+            es.indices.delete(index=index)
+        with open(os.path.join(output, file_name), encoding='utf-8') as f:
+            documents = json.load(f)
+        if index == OBJECT_INDEX:
+            for document in documents:
+                document[FRAME_KEY_FIELD] = f"{document['video_id']}_{document['frame_id']}"
+        loaded[index], _ = bulk(es, ({'_index': index, '_source': document} for document in documents),
+                                chunk_size=chunk_size, refresh=True)
+        print(f"Loaded {loaded[index]} documents into {index}")
+    return loaded
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', required=True, help='Corpus directory (used as AIC_DATA_DIR)')
+    parser.add_argument('--videos', type=int, default=100)
+    parser.add_argument('--frames-per-video', type=int, default=200)
+    parser.add_argument('--frame-step', type=int, default=50, help='Video frames between two keyframes')
+    parser.add_argument('--dim', type=int, default=512, help='Vector dimension (512 for ViT-B/32)')
+    parser.add_argument('--index', choices=INDEX_KINDS, default='flat')
+    parser.add_argument('--images', type=int, default=16, help='Query images for the image modalities')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--es-host', help='Also load the OCR/ASR/object data into this Elasticsearch')
+    parser.add_argument('--recreate', action='store_true', help='Replace existing Elasticsearch indexes')
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.output, args.videos, args.frames_per_video, args.frame_step, args.dim, args.index,
+                        args.images, args.seed)
+    print(json.dumps({key: value for key, value in manifest.items() if key not in ('images', 'vocabulary')}))
+    if args.es_host:
+        load_elasticsearch(args.output, args.es_host, args.recreate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+End-to-end latency benchmark of the search service over a synthetic corpus (see benchmarks.corpus).
+
+    python -m benchmarks.run --data-dir /tmp/aic_bench --requests 200 --concurrency 8 --output bench.json
+    python -m benchmarks.run --data-dir /tmp/aic_bench --baseline bench.json --tolerance 0.15
+
+The app runs in-process behind an ASGI transport, so no server or network is involved;
+query images are served from a local HTTP server. Without --es-host, Elasticsearch points
+at a closed local port: the circuit breaker opens and OCR/ASR/object queries take the
+local backup path. Each stage (one kind of request) reports p50/p95/p99 latency,
+throughput, peak RSS, the cores used (process CPU time over wall time, e.g. by the
+multi-threaded local backup search) and the hit rate of every cache. With --baseline the exit status
+is 1 when a stage regressed.
+
+By default every cache (result sets, text/image embeddings, image URLs, translations) is
+cleared before each request, so the numbers are cold; --caches warm keeps them and
+--caches both runs every stage twice, reporting the warm run as "<stage>:warm".
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import http.server
+import importlib
+import json
+import os
+import platform
+import resource
+import socket
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+# (path, query parameters, JSON body) of one request
+Request = Tuple[str, Dict[str, Any], Any]
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+CACHE_MODES = ('cold', 'warm', 'both')
+
+
+def cpu_seconds() -> float:
+    """User plus system CPU time of this process, all threads included."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def closed_port_url() -> str:
+    """URL of a local port nothing listens on, so every Elasticsearch request fails fast."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def image_server(directory: str):
+    """Serve the corpus' query images over local HTTP; yields the base URL."""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+
+
+def stage_requests(manifest: Dict[str, Any], image_base: str) -> Dict[str, Callable[[np.random.Generator], Request]]:
+    """Request generators of every stage; queries are drawn at random from the corpus vocabulary."""
+    words = manifest['vocabulary']
+    keyframes = manifest['keyframes']
+
+    def caption(rng):
+        a, b, c = rng.choice(words['caption'], size=3, replace=False).tolist()
+        return f"a {a} and a {b} near the {c}"
+
+    def ocr(rng):
+        return ' '.join(rng.choice(words['ocr'], size=int(rng.integers(1, 4))).tolist())
+
+    def asr(rng):
+        return ' '.join(rng.choice(words['asr'], size=int(rng.integers(2, 5))).tolist())
+
+    def label(rng):
+        return str(rng.choice(words['object']))
+
+    def image(rng):
+        return f"{image_base}/{rng.choice(manifest['images'])}"
+
+    def search(queries, **params):
+        return '/app/search', {'operator': 'gte', 'value': 1, **params}, queries
+
+    return {
+        'clip': lambda rng: search({'clip': caption(rng)}),
+        'ocr': lambda rng: search({'ocr': ocr(rng)}),
+        'asr': lambda rng: search({'asr': asr(rng)}),
+        'object': lambda rng: search({'object': label(rng)}),
+        'image': lambda rng: search({'image_url': image(rng)}),
+        'all_modalities': lambda rng: search({'clip': caption(rng), 'ocr': ocr(rng), 'asr': asr(rng), 'object': label(rng)}),
+        'fusion_rrf': lambda rng: search({'clip': caption(rng), 'ocr': ocr(rng), 'asr': asr(rng)}, fusion='rrf'),
+        'object_filter': lambda rng: search({'clip': caption(rng), 'object': label(rng)}, object_as_filter=True),
+        'image_similar_frame': lambda rng: ('/app/search-image-similar', {'row': int(rng.integers(keyframes))}, None),
+        'image_similar_url': lambda rng: ('/app/search-image-similar', {'image_path': image(rng)}, None),
+        'batch': lambda rng: ('/app/search/batch', {}, [{'queries': {'clip': caption(rng), 'ocr': ocr(rng)}} for _ in range(8)]),
+        'temporal': lambda rng: ('/app/search/temporal', {'max_gap': 30}, [caption(rng), caption(rng)]),
+    }
+
+
+def service_caches(service) -> Dict[str, Any]:
+    """The request-level caches of the service, by name; each has clear() and stats()."""
+    faiss_service = importlib.import_module('app.services.faiss_service')
+    return {
+        'result_sets': service.result_cache,
+        'text_embeddings': faiss_service.text_embedding_cache,
+        'image_embeddings': faiss_service.image_embedding_cache,
+        'image_urls': faiss_service.image_url_cache,
+        'translations': faiss_service.translator.cache,
+    }
+
+
+def cache_counts(caches: Dict[str, Any]) -> Dict[str, Tuple[int, int]]:
+    """(hits, misses) of every cache; hits on a disk tier count as hits."""
+    counts = {}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        counts[name] = (stats['hits'] + stats.get('disk_hits', 0), stats['misses'])
+    return counts
+
+
+def hit_rates(before: Dict[str, Tuple[int, int]], after: Dict[str, Tuple[int, int]]) -> Dict[str, Optional[float]]:
+    """Hit rate of every cache between two cache_counts snapshots (None when it was not used)."""
+    rates = {}
+    for name, (hits, misses) in after.items():
+        hits, misses = hits - before[name][0], misses - before[name][1]
+        rates[name] = hits / (hits + misses) if hits + misses else None
+    return rates
+
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    latencies_ms = np.array(latencies) * 1000.0 if latencies else np.zeros(1)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(latencies_ms.mean()),
+        'throughput_rps': len(latencies) / wall_seconds if wall_seconds > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+async def run_stage(client, make_request: Callable[[np.random.Generator], Request], rng: np.random.Generator,
+                    requests: int, warmup: int, concurrency: int, caches: Dict[str, Any],
+                    cold: bool = True) -> Dict[str, Any]:
+    """
+    Send `warmup` untimed requests, then `requests` timed ones from `concurrency` concurrent clients.
+
+    With `cold` every cache is cleared before each request. Concurrent requests can still
+    share entries while they are in flight; the reported hit rates show how often.
+    """
+    async def send(request: Request) -> bool:
+        path, params, body = request
+        if cold:
+            for cache in caches.values():
+                cache.clear()
+        response = await client.post(path, params=params, json=body)
+        return response.status_code == 200
+
+    for _ in range(warmup):
+        await send(make_request(rng))
+
+    pending = [make_request(rng) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while pending:
+            request = pending.pop()
+            start = time.perf_counter()
+            ok = await send(request)
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    counts = cache_counts(caches)
+    cpu_start, start = cpu_seconds(), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_seconds = time.perf_counter() - start
+    result = summarize(latencies, errors, wall_seconds)
+    result['cpu_cores'] = (cpu_seconds() - cpu_start) / wall_seconds if wall_seconds > 0 else 0.0
+    result['caches'] = 'cold' if cold else 'warm'
+    result['cache_hit_rates'] = hit_rates(counts, cache_counts(caches))
+    return result
+
+
+async def run_benchmark(data_dir: str, stages: Optional[List[str]], requests: int, warmup: int, concurrency: int,
+                        seed: int, verbose: bool, cache_mode: str = 'cold') -> Dict[str, Any]:
+    with open(os.path.join(data_dir, 'benchmark_manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    # Importing the app loads the index and CLIP model; it reads AIC_DATA_DIR/AIC_ES_HOST set by main()
+    service = importlib.import_module('main')
+    config = importlib.import_module('app.config')
+    await service.app.router.startup()
+    report: Dict[str, Any] = {
+        'corpus': {key: value for key, value in manifest.items() if key not in ('images', 'vocabulary')},
+        'settings': {'requests': requests, 'warmup': warmup, 'concurrency': concurrency, 'seed': seed,
+                     'es_host': os.environ['AIC_ES_HOST'], 'caches': cache_mode},
+        'environment': {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+                        'search_workers': config.SEARCH_WORKERS, 'batching': config.BATCHING_ENABLED},
+        'startup': {'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb(),
+                    'rss_growth_mb': peak_rss_mb() - rss_before, 'index': service.index_stats},
+        'stages': {},
+    }
+    rng = np.random.default_rng(seed)
+    caches = service_caches(service)
+    runs = [('', True), (':warm', False)] if cache_mode == 'both' else [('', cache_mode == 'cold')]
+    output = sys.stdout if verbose else open(os.devnull, 'w')
+    try:
+        with image_server(os.path.join(data_dir, 'images')) as image_base:
+            generators = stage_requests(manifest, image_base)
+            transport = httpx.ASGITransport(app=service.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+                for name in stages or list(generators):
+                    for suffix, cold in runs:
+                        # Each stage starts from empty caches; a warm run fills them during its warmup
+                        for cache in caches.values():
+                            cache.clear()
+                        with contextlib.redirect_stdout(output):
+                            result = await run_stage(client, generators[name], rng, requests, warmup, concurrency,
+                                                     caches, cold)
+                        report['stages'][name + suffix] = result
+                        print(json.dumps({'stage': name + suffix, **result}))
+    finally:
+        await service.app.router.shutdown()
+        if output is not sys.stdout:
+            output.close()
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Stage metrics that regressed against `baseline`: a latency percentile more than
+    `tolerance` (a fraction) above it, or throughput more than `tolerance` below it.
+    """
+    regressions = []
+    for name, stage in report['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if before is None:
+            continue
+        for metric in LATENCY_METRICS + ('throughput_rps',):
+            if not before.get(metric):
+                continue
+            ratio = stage[metric] / before[metric]
+            print(f"{name:22s} {metric:15s} {before[metric]:10.2f} -> {stage[metric]:10.2f}  ({ratio - 1:+.1%})")
+            worse = ratio > 1 + tolerance if metric in LATENCY_METRICS else ratio < 1 - tolerance
+            if worse:
+                regressions.append({'stage': name, 'metric': metric, 'baseline': before[metric],
+                                    'value': stage[metric], 'ratio': ratio})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', required=True, help='Corpus written by benchmarks.corpus')
+    parser.add_argument('--stages', help='Comma-separated stages to run (default: all)')
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per stage')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per stage')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--caches', choices=CACHE_MODES, default='cold',
+                        help='Clear the caches before every request (cold), keep them (warm) or run both')
+    parser.add_argument('--es-host', help='Elasticsearch holding the corpus (default: none, local backup path)')
+    parser.add_argument('--output', help='Write the report as JSON')
+    parser.add_argument('--baseline', help='Report of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative slowdown before a regression')
+    parser.add_argument('--verbose', action='store_true', help="Keep the service's own log output")
+    args = parser.parse_args(argv)
+
+    # Must be set before the app (and app.config) is imported
+    os.environ['AIC_DATA_DIR'] = os.path.abspath(args.data_dir)
+    os.environ['AIC_ES_HOST'] = args.es_host or closed_port_url()
+
+    report = asyncio.run(run_benchmark(args.data_dir, args.stages.split(',') if args.stages else None,
+                                       args.requests, args.warmup, args.concurrency, args.seed, args.verbose,
+                                       args.caches))
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        print(json.dumps({'regressions': regressions}, indent=2))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,34 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Optional
-from app.services.faiss_service import search_faiss, search_image
-from app.services.elasticsearch_service import search_ocr, search_object, search_asr
-from app.services.filter_metadata_service import filter_by_metadata  # Import directly
-from app.services.filter_object_service import search_filter_object  # Import directly
-from elasticsearch import Elasticsearch
-from datetime import datetime
-from app.config import CLIENT_SECRETS, CREDENTIALS_PATH, FILE_LIST
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Set, Tuple
+from app.services.faiss_service import FaissQuery, prepare_text_query, search_faiss_batch, search_faiss, search_image, search_similar_frame, frame_catalog, image_query_features, text_embedding_cache, image_embedding_cache, image_url_cache, text_encoder, image_encoder, index_searcher, index_stats
+from app.services.index_store import rss_mb
+from app.services.elasticsearch_service import finish_search, multi_search_batch, search_modalities
+from app.services.filter_metadata_service import filter_by_metadata, PublishDateFilter, get_metadata_index  # Import directly
+from app.services.filter_object_service import detect_object_filter_mode, search_filter_object  # Import directly
+from app.services.asset_registry import asset_registry
+from app.services.keyframe_index import ALIGNMENT_MODES
+from app.services.object_index import OPERATORS
+from app.services.text_index import text_index
+from app.services.backup_search import backup_corpus
+from app.services.circuit_breaker import es_breaker, run_health_checks
+from app.services.fusion import FUSION_METHODS, fuse_results
+from app.services.result_sets import result_cache, result_set_key, encode_cursor, decode_cursor, page_of, with_paths
+from app.services.executor import run_blocking
+from app.services.image_fetch import ImageFetchError, image_fetcher
+from app.models.batch_search import BatchSearchItem
+from app.services.temporal_search import temporal_search
+from elasticsearch import AsyncElasticsearch
+from datetime import date, datetime
+from app.config import CLIENT_SECRETS, CREDENTIALS_PATH, FILE_LIST, ES_HOST, ES_MAX_CONNECTIONS, ES_REQUEST_TIMEOUT, ES_HEALTH_INTERVAL, ES_HEALTH_TIMEOUT, BACKUP_SEARCH, MODALITY_TIMEOUTS, MAX_PAGE_SIZE, STREAM_CHUNK_SIZE, BATCH_SEARCH_MAX_ITEMS, DEGRADED_RESULT_CACHE_TTL, TEMPORAL_MAX_GAP_SECONDS, TEMPORAL_MAX_STEPS, TEMPORAL_RESULT_SIZE, ASR_ALIGNMENT_MODE, LOCAL_TEXT_ENGINE, OBJECT_INDEX
 from pydrive.auth import GoogleAuth, RefreshError
 from pydrive.drive import GoogleDrive
 from oauth2client.client import HttpAccessTokenRefreshError
+import asyncio
+import json
 import os
+import time
 import numpy as np 
 app = FastAPI()
 
@@ -56,35 +73,433 @@ app.add_middleware(
 )
 
 # Initialize Elasticsearch
-es = Elasticsearch(['http://localhost:9200'])
+es = AsyncElasticsearch([ES_HOST], maxsize=ES_MAX_CONNECTIONS, timeout=ES_REQUEST_TIMEOUT)
+
+@app.on_event("startup")
+async def warm_up_assets():
+    """Load the shared JSON assets before the first request instead of on it."""
+    await run_blocking(asset_registry.path_lookup)
+    await run_blocking(asset_registry.keyframe_index)
+    await run_blocking(get_metadata_index)
+    await run_blocking(asset_registry.object_index)
+    for modality in ('ocr', 'asr'):
+        if LOCAL_TEXT_ENGINE == 'bm25':
+            await run_blocking(text_index, modality)
+        else:
+            await run_blocking(backup_corpus, BACKUP_SEARCH[modality]['path'], BACKUP_SEARCH[modality]['field'])
+
+health_checker: Optional[asyncio.Task] = None
+object_filter_check: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def check_object_filter_mode():
+    """Check in the background whether the object index has frame keys; the 'terms' object filter is used until then."""
+    global object_filter_check
+    object_filter_check = asyncio.ensure_future(detect_object_filter_mode(es, OBJECT_INDEX))
+
+@app.on_event("startup")
+async def start_health_checks():
+    """Ping Elasticsearch in the background so requests skip it as soon as it goes down."""
+    global health_checker
+    health_checker = asyncio.ensure_future(
+        run_health_checks(lambda: es.ping(request_timeout=ES_HEALTH_TIMEOUT), es_breaker, ES_HEALTH_INTERVAL)
+    )
+
+@app.on_event("shutdown")
+async def close_elasticsearch():
+    for task in (health_checker, object_filter_check):
+        if task is not None:
+            task.cancel()
+    await es.close()
+    await image_fetcher.aclose()
+
+async def run_modality(name: str, search: Awaitable[list], degraded: Optional[Set[str]] = None) -> list:
+    """
+    Await one modality's search, giving up with no results after its own timeout.
+
+    A modality that timed out is added to `degraded`, so its incomplete results are cached only briefly.
+    """
+    try:
+        return await asyncio.wait_for(search, MODALITY_TIMEOUTS.get(name))
+    except asyncio.TimeoutError:
+        print(f"Search for '{name}' timed out after {MODALITY_TIMEOUTS.get(name)}s")
+        if degraded is not None:
+            degraded.add(name)
+        return []
+
+def search_params(
+    queries: Dict[str, Optional[str]],
+    operator: Optional[str],
+    value: Optional[int],
+    publish_day: Optional[int],
+    publish_month: Optional[int],
+    publish_year: Optional[int],
+    publish_date_from: Optional[date],
+    publish_date_to: Optional[date],
+    object_as_filter: Optional[bool],
+    nprobe: Optional[int],
+    ef_search: Optional[int],
+    asr_alignment: str,
+    fusion: Optional[str]
+) -> Dict[str, Any]:
+    """The search parameters of a request as JSON values: the result-set cache key and cursor payload."""
+    return {
+        "queries": queries,
+        "operator": operator,
+        "value": value,
+        "publish_day": publish_day,
+        "publish_month": publish_month,
+        "publish_year": publish_year,
+        "publish_date_from": publish_date_from.isoformat() if publish_date_from else None,
+        "publish_date_to": publish_date_to.isoformat() if publish_date_to else None,
+        "object_as_filter": bool(object_as_filter),
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "asr_alignment": asr_alignment,
+        "fusion": fusion,
+    }
 
 @app.post("/app/search")
 async def search_all(
-    queries: Dict[str, Optional[str]], 
+    queries: Optional[Dict[str, Optional[str]]] = None, 
     operator: Optional[str] = "gte", 
     value: Optional[int] = 1, 
     publish_day: Optional[int] = None,
     publish_month: Optional[int] = None,
     publish_year: Optional[int] = None,
-    object_as_filter: Optional[bool] = False  # Thêm cờ để quyết định cách sử dụng object search
+    publish_date_from: Optional[date] = None,
+    publish_date_to: Optional[date] = None,
+    object_as_filter: Optional[bool] = False,  # Thêm cờ để quyết định cách sử dụng object search
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    asr_alignment: str = ASR_ALIGNMENT_MODE,
+    fusion: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
     """
     Endpoint to perform combined search from multiple sources: CLIP, OCR, Object, ASR, and Image.
 
     Parameters:
-    - queries: Dictionary containing queries for CLIP, OCR, Object, ASR, and Image.
+    - queries: Dictionary containing queries for CLIP, OCR, Object, ASR, and Image; not needed with `cursor`.
     - operator: Comparison operator for the range condition in object queries. Can be "gte", "gt", "lte", "lt", or "eq".
     - value: Value of label_count to compare in the object query.
     - publish_day: Day of the publish date to filter results.
     - publish_month: Month of the publish date to filter results.
     - publish_year: Year of the publish date to filter results.
+    - publish_date_from, publish_date_to: Inclusive publish date range (YYYY-MM-DD) to filter results.
+    - nprobe: IVF lists probed by the FAISS search (IVF indexes only).
+    - ef_search: efSearch of the FAISS search (HNSW indexes only).
+    - asr_alignment: Keyframe an ASR segment maps to: "after" its start frame, "before" it or the "nearest".
+    - fusion: "rrf" or "score" to return one ranked list of distinct keyframes fused across modalities
+      instead of the per-modality lists.
+    - limit, offset: Return one page of every result list instead of the full lists.
+    - cursor: `next_cursor` of a previous page; replaces every other parameter.
 
     Returns:
-    - Combined search results from various sources.
+    - Combined search results from various sources. With `limit` or `cursor`, a page:
+      {"results", "total", "offset", "limit", "has_more", "next_cursor"}.
+    """
+    if cursor is not None:
+        try:
+            params, offset, limit = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+    elif queries is None:
+        raise HTTPException(status_code=422, detail="Send the queries in the body, or a cursor.")
+    else:
+        params = search_params(queries, operator, value, publish_day, publish_month, publish_year,
+                               publish_date_from, publish_date_to, object_as_filter, nprobe, ef_search,
+                               asr_alignment, fusion)
+    if offset < 0 or (limit is not None and not 1 <= limit <= MAX_PAGE_SIZE):
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE} and offset at least 0.")
+
+    # The full ranked lists are cached without paths, so every page after the first is a slice of them
+    key = result_set_key(params)
+    results = result_cache.get(key)
+    if results is None:
+        degraded = set()
+        results = await run_search(degraded, **params)
+        cache_result_set(key, results, degraded)
+
+    list_kind = "fused" if params["fusion"] else "object"
+    if limit is None:
+        return (await run_blocking(page_of, results, list_kind, offset, None))["results"]
+    page = await run_blocking(page_of, results, list_kind, offset, limit)
+    page.update({
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": encode_cursor(params, offset + limit, limit) if page["has_more"] else None,
+    })
+    return page
+
+@app.post("/app/search/stream")
+async def search_stream(
+    queries: Dict[str, Optional[str]],
+    operator: Optional[str] = "gte",
+    value: Optional[int] = 1,
+    publish_day: Optional[int] = None,
+    publish_month: Optional[int] = None,
+    publish_year: Optional[int] = None,
+    publish_date_from: Optional[date] = None,
+    publish_date_to: Optional[date] = None,
+    object_as_filter: Optional[bool] = False,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    asr_alignment: str = ASR_ALIGNMENT_MODE,
+    fusion: Optional[str] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+):
+    """
+    Streaming variant of /app/search: newline-delimited JSON events, sent as each modality finishes.
+
+    Takes the parameters of /app/search (without paging) plus `chunk_size`, the most results per event.
+
+    Events:
+    - {"event": "results", "modality", "offset", "results", "total", "last"}: a chunk of one modality's
+      results. With object_as_filter, "object" is the object-filtered CLIP list. With fusion, the
+      fused list follows the modalities as "fused".
+    - {"event": "error", "modality", "detail"}: a modality failed; the others are still sent.
+    - {"event": "summary", "total", "elapsed_ms", "cached"}: last event of the stream.
+    """
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be at least 1.")
+    params = search_params(queries, operator, value, publish_day, publish_month, publish_year,
+                           publish_date_from, publish_date_to, object_as_filter, nprobe, ef_search,
+                           asr_alignment, fusion)
+    # Invalid parameters are still answered with a 400 before the stream starts
+    date_filter = validate_search(**params)
+    return StreamingResponse(stream_search(params, date_filter, chunk_size), media_type="application/x-ndjson")
+
+def cache_result_set(key: str, results: Any, degraded: Set[str]) -> None:
+    """
+    Cache a full result set for paging. One where a modality timed out or fell back after an
+    error (`degraded`) is kept only DEGRADED_RESULT_CACHE_TTL seconds, so its pages and cursors
+    still resolve while the complete answer is searched for again soon.
+    """
+    if degraded:
+        print(f"Caching results for {DEGRADED_RESULT_CACHE_TTL}s only: {', '.join(sorted(degraded))} degraded")
+        result_cache.put(key, results, DEGRADED_RESULT_CACHE_TTL)
+    else:
+        result_cache.put(key, results)
+
+def stream_event(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+def result_events(modality: str, results: List[Dict], chunk_size: int) -> Iterator[bytes]:
+    """`results` as chunks of at most `chunk_size`, each enriched with paths just before it is sent."""
+    for offset in range(0, max(len(results), 1), chunk_size):
+        yield stream_event({
+            "event": "results",
+            "modality": modality,
+            "offset": offset,
+            "results": with_paths(modality, results[offset:offset + chunk_size]),
+            "total": len(results),
+            "last": offset + chunk_size >= len(results),
+        })
+
+async def stream_search(params: Dict[str, Any], date_filter: PublishDateFilter, chunk_size: int) -> AsyncIterator[bytes]:
+    """Run a search for /app/search/stream, yielding NDJSON events; the complete result set is cached for paging."""
+    started = time.perf_counter()
+    key = result_set_key(params)
+    cached = result_cache.get(key)
+    if cached is not None:
+        lists = cached if isinstance(cached, dict) else {"fused" if params["fusion"] else "object": cached}
+        for modality, results in lists.items():
+            for event in result_events(modality, results, chunk_size):
+                yield event
+        yield stream_event({
+            "event": "summary",
+            "total": {modality: len(results) for modality, results in lists.items()},
+            "elapsed_ms": {"total": (time.perf_counter() - started) * 1000},
+            "cached": True,
+        })
+        return
+
+    degraded = set()
+    tasks, object_filter = start_search(date_filter, degraded, **params)
+    names = {task: name for name, task in tasks.items()}
+    if object_filter is not None:
+        names[object_filter] = "object"
+    results = {name: [] for name in ("clip", "ocr", "object", "asr", "image")}
+    object_filtered = None
+    total, elapsed, failed = {}, {}, False
+    pending = set(names)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = names[task]
+                elapsed[name] = (time.perf_counter() - started) * 1000
+                try:
+                    result = task.result()
+                except Exception as e:
+                    failed = True
+                    yield stream_event({"event": "error", "modality": name, "detail": str(e)})
+                    continue
+                if task is object_filter:
+                    object_filtered = result
+                    if result is None:  # No CLIP candidates to filter
+                        continue
+                else:
+                    results[name] = result
+                total[name] = len(result)
+                for event in result_events(name, result, chunk_size):
+                    yield event
+
+        complete = await assemble_results(results, object_filtered, params["fusion"])
+        if params["fusion"]:
+            total["fused"] = len(complete)
+            for event in result_events("fused", complete, chunk_size):
+                yield event
+        if not failed:
+            cache_result_set(key, complete, degraded)
+    finally:
+        # The client went away or a modality failed: stop the searches still running
+        for task in pending:
+            task.cancel()
+
+    elapsed["total"] = (time.perf_counter() - started) * 1000
+    yield stream_event({"event": "summary", "total": total, "elapsed_ms": elapsed, "cached": False})
+
+def validate_search(
+    queries: Dict[str, Optional[str]],
+    operator: Optional[str] = "gte",
+    value: Optional[int] = 1,
+    publish_day: Optional[int] = None,
+    publish_month: Optional[int] = None,
+    publish_year: Optional[int] = None,
+    publish_date_from: Optional[str] = None,
+    publish_date_to: Optional[str] = None,
+    object_as_filter: bool = False,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    asr_alignment: str = ASR_ALIGNMENT_MODE,
+    fusion: Optional[str] = None
+) -> PublishDateFilter:
+    """Check the search parameters (HTTP 400 if invalid) and return their publish date filter."""
+    # Filter results by publish_date if any date components are provided
+    publish_day = publish_day if publish_day else None
+    publish_month = publish_month if publish_month else None
+    publish_year = publish_year if publish_year else None
+    if publish_day or publish_month or publish_year:
+        # Validate the date components before running any search
+        try:
+            datetime(
+                year=publish_year if publish_year else 2000,  # Leap year, so 29/02 stays valid without a year
+                month=publish_month if publish_month else 1, 
+                day=publish_day if publish_day else 1
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date provided.")
+    try:
+        publish_date_from = date.fromisoformat(publish_date_from) if publish_date_from else None
+        publish_date_to = date.fromisoformat(publish_date_to) if publish_date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date provided.")
+    if operator not in OPERATORS:
+        raise HTTPException(status_code=400, detail=f"operator must be one of {', '.join(OPERATORS)}.")
+    if fusion is not None and fusion not in FUSION_METHODS:
+        raise HTTPException(status_code=400, detail=f"fusion must be one of {', '.join(FUSION_METHODS)}.")
+    if asr_alignment not in ALIGNMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"asr_alignment must be one of {', '.join(ALIGNMENT_MODES)}.")
+    return PublishDateFilter(publish_day, publish_month, publish_year, publish_date_from, publish_date_to)
+
+async def date_filtered(name: str, search: Awaitable[list], date_filter: PublishDateFilter) -> list:
+    """Results of one modality restricted to videos published within `date_filter`."""
+    results = await search
+    if results and not date_filter.is_empty():
+        results = filter_by_metadata({name: results}, name, *date_filter)
+    return results
+
+def elasticsearch_queries(queries: Dict[str, Optional[str]], object_as_filter: bool) -> Dict[str, str]:
+    """The OCR, ASR and object queries that go to Elasticsearch (the object query is not one when it filters CLIP)."""
+    return {
+        key: queries[key] for key in ("ocr", "asr", "object")
+        if queries.get(key) and not (key == "object" and object_as_filter)
+    }
+
+def start_search(
+    date_filter: PublishDateFilter,
+    degraded: Set[str],
+    queries: Dict[str, Optional[str]],
+    operator: Optional[str] = "gte",
+    value: Optional[int] = 1,
+    object_as_filter: bool = False,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    asr_alignment: str = ASR_ALIGNMENT_MODE,
+    **_
+) -> Tuple[Dict[str, asyncio.Future], Optional[asyncio.Future]]:
+    """
+    Start the search of every queried modality and return their tasks, plus the object filter task.
+
+    Each task yields that modality's full ranked results without image/video paths
+    (see result_sets.page_of). The object filter task yields the CLIP results that pass
+    the object query, or None when there is nothing to filter. Modalities that time out or
+    fall back to the local index after an Elasticsearch error are added to `degraded`, and
+    'translation' when the CLIP query had to be searched untranslated.
+    """
+    # Fan out every modality at once; CLIP/FAISS go through the micro-batchers, ES through the async client
+    tasks = {}
+    if "clip" in queries and queries["clip"]:
+        tasks["clip"] = asyncio.ensure_future(run_modality("clip", search_faiss(queries["clip"], None, nprobe, ef_search, date_filter, False, None, degraded), degraded))
+
+    # OCR, ASR and object text queries share a single Elasticsearch _msearch round trip.
+    # CLIP and image results are restricted to the publish date inside FAISS, these afterwards.
+    es_queries = elasticsearch_queries(queries, object_as_filter)
+    if es_queries:
+        for key, search in search_modalities(es, es_queries, operator, value, asr_alignment, False, degraded).items():
+            tasks[key] = asyncio.ensure_future(date_filtered(key, run_modality(key, search, degraded), date_filter))
+
+    if "image_url" in queries and queries["image_url"]:
+        # The image is downloaded on the event loop; only decoding uses the thread pool
+        async def search_by_image():
+            image_features = await image_query_features(queries["image_url"])
+            return await search_faiss(None, None, nprobe, ef_search, date_filter, False, image_features)
+        tasks["image"] = asyncio.ensure_future(run_modality("image", search_by_image(), degraded))
+
+    # Kiểm tra cách sử dụng object search
+    object_filter = None
+    if object_as_filter:
+        if "object" in queries and queries["object"] and "clip" in tasks:
+            # The object filter needs the CLIP candidates, so it chains on the CLIP task
+            async def filter_clip_by_object():
+                clip_results = await asyncio.shield(tasks["clip"])
+                if not clip_results:
+                    return None
+                return await run_modality(
+                    "object",
+                    search_filter_object(es, OBJECT_INDEX, queries["object"], operator, value, clip_results, False, degraded),
+                    degraded
+                )
+            object_filter = asyncio.ensure_future(filter_clip_by_object())
+    return tasks, object_filter
+
+async def assemble_results(results: Dict[str, list], object_filtered: Optional[list], fusion: Optional[str]):
+    """The response of a finished search: the per-modality lists, the object-filtered CLIP list or the fused list."""
+    if object_filtered is not None and not fusion:
+        return object_filtered
+    combined_results = combine_results(results)
+    if object_filtered is not None:
+        # Fuse the object-filtered CLIP list in place of the raw CLIP results
+        combined_results["clip"], combined_results["object"] = object_filtered, []
+    if fusion:
+        return await run_blocking(fuse_results, combined_results, fusion, enrich=False)
+    return combined_results
+
+async def run_search(degraded: Optional[Set[str]] = None, **params):
     """
-    print(f"Queries: {queries}")
-    print(f"Operator: {operator}")
-    print(f"Value: {value}")
+    Run the combined search of /app/search and return its full ranked results, without image/video paths.
+
+    Takes the parameters of /app/search, with the publish date range as ISO strings. Modalities
+    that timed out or fell back after an error are added to `degraded`.
+    """
+    print(f"Queries: {params['queries']}")
+    print(f"Operator: {params['operator']}")
+    print(f"Value: {params['value']}")
+    date_filter = validate_search(**params)
 
     results = {
         "clip": [],
@@ -95,65 +510,231 @@ async def search_all(
     }
 
     try:
-        print("Vô đây")
-        # Perform searches in respective services
-        if "clip" in queries and queries["clip"]:
-            results["clip"] = search_faiss(queries["clip"])
-
-        if "ocr" in queries and queries["ocr"]:
-            results["ocr"] = search_ocr(es, "ocr", queries["ocr"])
-
-        if "asr" in queries and queries["asr"]:
-            results["asr"] = search_asr(es, "asr", queries["asr"])
-
-        if "image_url" in queries and queries["image_url"]:
-            results["image"] = search_image(queries["image_url"])
-
-        # # Ensure operator and value are defined
-        # operator = queries.get("operator")
-        # value = queries.get("value")
-
-        # Ensure results["clip"] is initialized
-        results["clip"] = results.get("clip", [])
-
-        # Kiểm tra cách sử dụng object search
-        if object_as_filter:
-            print("Vô đây")
-            if "object" in queries and queries["object"] and results["clip"]:
-                print("Results clip: ", results["clip"])
-                print("operator: ", operator)
-                print("value: ", value)
-                combined_results = search_filter_object(es, "object_detection", queries["object"], operator, value, results["clip"])
+        tasks, object_filter = start_search(date_filter, set() if degraded is None else degraded, **params)
+        for key, result in zip(tasks, await asyncio.gather(*tasks.values())):
+            results[key] = result
+        object_filtered = await object_filter if object_filter else None
+        return await assemble_results(results, object_filtered, params["fusion"])
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/app/search/batch")
+async def search_batch(items: List[BatchSearchItem]):
+    """
+    Run many /app/search searches in one call.
+
+    All CLIP texts are encoded in batched forward passes and searched in one multi-query
+    FAISS search, and all OCR/ASR/object queries go to Elasticsearch as one _msearch.
+
+    Parameters:
+    - items: List of searches, each with the parameters of /app/search plus an optional `limit`.
+
+    Returns:
+    - One entry per item, in order: {"status": "ok", "results": ...} (a page with "total",
+      "has_more" and "next_cursor" when `limit` is set, continued through /app/search), or
+      {"status": "error", "status_code": ..., "detail": ...}.
+    """
+    if not 1 <= len(items) <= BATCH_SEARCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {BATCH_SEARCH_MAX_ITEMS} searches.")
+
+    responses: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    all_params = [search_params(**item.model_dump(exclude={"limit"})) for item in items]
+    keys = [result_set_key(params) for params in all_params]
+    results: Dict[str, Any] = {}
+    pending: Dict[str, Tuple[Dict[str, Any], PublishDateFilter]] = {}
+    for i, (item, params, key) in enumerate(zip(items, all_params, keys)):
+        try:
+            if item.limit is not None and not 1 <= item.limit <= MAX_PAGE_SIZE:
+                raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+            date_filter = validate_search(**params)
+        except HTTPException as e:
+            responses[i] = batch_error(e)
+            continue
+        if key not in results and key not in pending:
+            cached = result_cache.get(key)
+            if cached is not None:
+                results[key] = cached
             else:
-                combined_results = combine_results(results)
+                pending[key] = (params, date_filter)
+
+    # Identical items are searched once
+    degraded: Dict[int, Set[str]] = {}
+    for j, (key, result) in enumerate(zip(pending, await run_search_batch(list(pending.values()), degraded))):
+        if not isinstance(result, BaseException):
+            cache_result_set(key, result, degraded.get(j, set()))
+        results[key] = result
+
+    for i, (item, params, key) in enumerate(zip(items, all_params, keys)):
+        if responses[i] is not None:
+            continue
+        result = results[key]
+        if isinstance(result, BaseException):
+            responses[i] = batch_error(result)
+            continue
+        list_kind = "fused" if params["fusion"] else "object"
+        page = await run_blocking(page_of, result, list_kind, 0, item.limit)
+        if item.limit is None:
+            responses[i] = {"status": "ok", "results": page["results"]}
+        else:
+            responses[i] = {
+                "status": "ok",
+                **page,
+                "offset": 0,
+                "limit": item.limit,
+                "next_cursor": encode_cursor(params, item.limit, item.limit) if page["has_more"] else None,
+            }
+    return responses
+
+def batch_error(error: BaseException) -> Dict[str, Any]:
+    """The entry of a failed /app/search/batch item."""
+    if isinstance(error, HTTPException):
+        return {"status": "error", "status_code": error.status_code, "detail": error.detail}
+    return {"status": "error", "status_code": 500, "detail": str(error)}
+
+async def run_search_batch(searches: List[Tuple[Dict[str, Any], PublishDateFilter]],
+                           degraded: Optional[Dict[int, Set[str]]] = None) -> List[Any]:
+    """
+    Run many validated searches of /app/search together and return, in order, each one's
+    full ranked results without image/video paths, or the exception it failed with.
+
+    CLIP and image queries go through one search_faiss_batch call and the Elasticsearch
+    queries through one _msearch. Per-modality timeouts do not apply inside a batch.
+    `degraded` receives, by position, the modalities of each search that fell back to the
+    local indexes after an Elasticsearch error, plus 'translation' when its CLIP query had
+    to be searched untranslated.
+    """
+    if not searches:
+        return []
+    clip_texts = list({params["queries"]["clip"] for params, _ in searches if params["queries"].get("clip")})
+    image_urls = list({params["queries"]["image_url"] for params, _ in searches if params["queries"].get("image_url")})
+    # Query translation and image downloads run concurrently; every other step is a single call
+    # 'translation' lands in a text's set when it has to be searched untranslated
+    text_degraded: Dict[str, Set[str]] = {text: set() for text in clip_texts}
+    prepared = await asyncio.gather(
+        *(run_blocking(prepare_text_query, text, text_degraded[text]) for text in clip_texts),
+        *(image_query_features(url) for url in image_urls),
+        return_exceptions=True,
+    )
+    translations = dict(zip(clip_texts, prepared[:len(clip_texts)]))
+    image_features = dict(zip(image_urls, prepared[len(clip_texts):]))
+
+    faiss_queries, faiss_owners = [], []
+    failures: Dict[int, BaseException] = {}
+    for i, (params, date_filter) in enumerate(searches):
+        queries = params["queries"]
+        for key, query in (("clip", queries.get("clip")), ("image", queries.get("image_url"))):
+            if not query:
+                continue
+            prepared_query = translations[query] if key == "clip" else image_features[query]
+            if isinstance(prepared_query, BaseException):
+                failures.setdefault(i, prepared_query)
+                continue
+            faiss_queries.append(FaissQuery(
+                text=prepared_query if key == "clip" else None,
+                image_features=prepared_query if key == "image" else None,
+                nprobe=params["nprobe"],
+                ef_search=params["ef_search"],
+                date_filter=date_filter,
+            ))
+            faiss_owners.append((i, key))
+
+    es_batch = [
+        (elasticsearch_queries(params["queries"], params["object_as_filter"]), params["operator"], params["value"])
+        for params, _ in searches
+    ]
+
+    async def no_faiss_queries():
+        return []
+
+    faiss_results, es_results = await asyncio.gather(
+        run_blocking(search_faiss_batch, faiss_queries, False) if faiss_queries else no_faiss_queries(),
+        multi_search_batch(es, es_batch),
+        return_exceptions=True,
+    )
+    if isinstance(es_results, BaseException):
+        # Every item fails the same way; finish_search falls back per modality on None hits
+        print(f"Batched Elasticsearch search failed: {es_results!r}")
+        es_results = [{modality: None for modality in es_queries} for es_queries, _, _ in es_batch]
+    faiss_by_item: Dict[int, Dict[str, list]] = {}
+    for (i, key), faiss_result in zip(faiss_owners, [] if isinstance(faiss_results, BaseException) else faiss_results):
+        if isinstance(faiss_result, BaseException):
+            # Only the item whose query failed to encode fails
+            failures.setdefault(i, faiss_result)
         else:
-            if "object" in queries and queries["object"]:
-                results["object"] = search_object(es, "object_detection", queries["object"], operator, value)
-            combined_results = combine_results(results)
-
-        # Filter results by publish_date if any date components are provided
-        if publish_day or publish_month or publish_year:
-            # Construct the publish_date to use for filtering
-            try:
-                publish_date = datetime(
-                    year=publish_year if publish_year else 1, 
-                    month=publish_month if publish_month else 1, 
-                    day=publish_day if publish_day else 1
-                ).date()  # Use .date() to get just the date part
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date provided.")
-            
-            publish_day = publish_day if publish_day else None
-            publish_month = publish_month if publish_month else None
-            publish_year = publish_year if publish_year else None
-
-            # Filter results by publish_date
-            for key in combined_results:
-                if queries.get(key):
-                    combined_results[key] = filter_by_metadata(combined_results, key, publish_day, publish_month, publish_year)
-
-        return combined_results
+            faiss_by_item.setdefault(i, {})[key] = faiss_result
+    if isinstance(faiss_results, BaseException):
+        for i, _ in faiss_owners:
+            failures.setdefault(i, faiss_results)
 
+    async def finish(i: int, params: Dict[str, Any], date_filter: PublishDateFilter):
+        if i in failures:
+            raise failures[i]
+        results = {"clip": [], "ocr": [], "object": [], "asr": [], "image": []}
+        results.update(faiss_by_item.get(i, {}))
+        queries = params["queries"]
+        fell_back = set(text_degraded.get(queries.get("clip"), ()))
+        for key, hits in es_results[i].items():
+            if hits is None:
+                fell_back.add(key)
+            search = finish_search(key, hits, queries[key], params["operator"], params["value"],
+                                   params["asr_alignment"], enrich=False)
+            results[key] = await date_filtered(key, search, date_filter)
+        object_filtered = None
+        if params["object_as_filter"] and queries.get("object") and queries.get("clip") and results["clip"]:
+            object_filtered = await search_filter_object(es, OBJECT_INDEX, queries["object"], params["operator"],
+                                                         params["value"], results["clip"], False, fell_back)
+        if fell_back and degraded is not None:
+            degraded[i] = fell_back
+        return await assemble_results(results, object_filtered, params["fusion"])
+
+    return await asyncio.gather(
+        *(finish(i, params, date_filter) for i, (params, date_filter) in enumerate(searches)),
+        return_exceptions=True,
+    )
+
+@app.post("/app/search/temporal")
+async def search_temporal(
+    steps: List[str],
+    max_gap: float = TEMPORAL_MAX_GAP_SECONDS,
+    publish_day: Optional[int] = None,
+    publish_month: Optional[int] = None,
+    publish_year: Optional[int] = None,
+    publish_date_from: Optional[date] = None,
+    publish_date_to: Optional[date] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    limit: int = TEMPORAL_RESULT_SIZE
+):
+    """
+    Search for a sequence of events ("a man opens a door", then "a car drives away").
+
+    Parameters:
+    - steps: Ordered list of CLIP text queries, one per event.
+    - max_gap: Most seconds between the keyframes of two consecutive events.
+    - publish_day, publish_month, publish_year, publish_date_from, publish_date_to: Publish date filter, as in /app/search.
+    - nprobe, ef_search: FAISS search parameters for IVF / HNSW indexes.
+    - limit: Number of segments returned.
+
+    Returns:
+    - {"results": [...]}: video segments ranked by the summed similarity of their events, each with
+      "video_id", "start_frame", "end_frame", "fps", "score" and one keyframe per step in "frames".
+    """
+    if not 1 <= len(steps) <= TEMPORAL_MAX_STEPS or not all(step and step.strip() for step in steps):
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {TEMPORAL_MAX_STEPS} non-empty steps.")
+    if max_gap < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"max_gap must be at least 0 and limit between 1 and {MAX_PAGE_SIZE}.")
+    date_filter = validate_search(
+        {}, publish_day=publish_day, publish_month=publish_month, publish_year=publish_year,
+        publish_date_from=publish_date_from.isoformat() if publish_date_from else None,
+        publish_date_to=publish_date_to.isoformat() if publish_date_to else None,
+    )
+    print(f"Temporal steps: {steps}")
+
+    try:
+        texts = await asyncio.gather(*(run_blocking(prepare_text_query, step) for step in steps))
+        return {"results": await run_blocking(temporal_search, list(texts), max_gap, nprobe, ef_search, date_filter,
+                                              top_k=limit)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -178,21 +759,45 @@ def combine_results(results: Dict[str, list]) -> Dict[str, list]:
 
 
 @app.post("/app/search-image-similar")
-async def search_image_similar(image_path: str):
+async def search_image_similar(
+    image_path: Optional[str] = None,
+    video_id: Optional[str] = None,
+    frame_id: Optional[int] = None,
+    row: Optional[int] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
+):
     """
     Tìm kiếm hình ảnh tương tự sử dụng CLIP và FAISS.
 
     Parameters:
     - image_path: Đường dẫn của hình ảnh cần truy vấn.
+    - video_id, frame_id hoặc row: Keyframe đã có trong index ("more like this frame"); vector của nó
+      được lấy thẳng từ index nên không cần tải ảnh hay chạy CLIP. Frame truy vấn không có trong kết quả.
+    - nprobe, ef_search: Tham số tìm kiếm FAISS cho index IVF / HNSW.
 
     Returns:
     - Danh sách kết quả hình ảnh tương tự.
     """
+    if row is None and video_id is not None and frame_id is not None:
+        row = frame_catalog.find_row(video_id, frame_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"Frame {frame_id} of {video_id} is not in the index.")
+    if row is not None and not 0 <= row < len(frame_catalog):
+        raise HTTPException(status_code=404, detail=f"Row {row} is not in the index.")
+    if row is None and not image_path:
+        raise HTTPException(status_code=400, detail="Provide image_path, video_id and frame_id, or row.")
+
     try:
-        print(f"Searching similar images for: {image_path}")
-        
-        # Tìm kiếm hình ảnh tương tự bằng CLIP qua FAISS
-        similar_images = search_faiss(None,image_path)
+        if row is not None:
+            print(f"Searching frames similar to row {row}")
+            similar_images = await search_similar_frame(row, nprobe, ef_search)
+        else:
+            print(f"Searching similar images for: {image_path}")
+
+            # Tìm kiếm hình ảnh tương tự bằng CLIP qua FAISS; ảnh được tải bất đồng bộ trước
+            image_features = await image_query_features(image_path)
+            similar_images = await search_faiss(None, image_path, nprobe, ef_search, None, True, image_features)
         
         # Chuyển đổi kết quả (nếu là mảng NumPy) thành danh sách Python
         similar_images = similar_images.tolist() if isinstance(similar_images, np.ndarray) else similar_images
@@ -203,5 +808,33 @@ async def search_image_similar(image_path: str):
         
         return {"similar_images": similar_images}
 
+    except HTTPException:
+        raise
+    except ImageFetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/app/cache-stats")
+async def cache_stats():
+    """Hit/miss counters of the in-process caches and micro-batchers."""
+    return {
+        "text_embeddings": text_embedding_cache.stats(),
+        "image_embeddings": image_embedding_cache.stats(),
+        "image_urls": image_url_cache.stats(),
+        "image_fetch": image_fetcher.stats(),
+        "batchers": {batcher.name: batcher.stats() for batcher in (text_encoder, image_encoder, index_searcher)},
+        "result_sets": result_cache.stats(),
+    }
+
+
+@app.get("/app/health")
+async def get_health():
+    """State of the Elasticsearch circuit breaker: 'closed' (ES in use), 'open' (local engines) or 'half_open'."""
+    return {"elasticsearch": es_breaker.snapshot()}
+
+@app.get("/app/index-stats")
+async def get_index_stats():
+    """How this worker loaded the FAISS index (mmap or memory), the load time and its current RSS."""
+    return {**index_stats, "rss_mb": rss_mb()}
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+from app.services.batcher import MicroBatcher
+
+
+def test_cancelled_waiter_does_not_stop_the_worker():
+    release = threading.Event()
+
+    def batch_fn(items):
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=1, name='test-batcher')
+
+    async def scenario():
+        # The first item is running in batch_fn while the second waits in the queue
+        running = asyncio.ensure_future(asyncio.wrap_future(batcher.submit(1)))
+        queued = asyncio.ensure_future(asyncio.wrap_future(batcher.submit(2)))
+        await asyncio.sleep(0.05)
+        running.cancel()
+        queued.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        release.set()
+        return await asyncio.wait_for(asyncio.wrap_future(batcher.submit(3)), 5)
+
+    assert asyncio.run(scenario()) == 6
+    assert batcher._worker.is_alive()
+
+
+def test_failing_item_only_fails_itself():
+    def batch_fn(items):
+        if 'bad' in items:
+            raise ValueError('bad item')
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=50, name='test-batcher')
+    good, bad = batcher.submit('good'), batcher.submit('bad')
+    assert good.result(5) == 'GOOD'
+    assert isinstance(bad.exception(5), ValueError)
+    assert batcher.submit('later').result(5) == 'LATER'